@@ -0,0 +1,154 @@
+# Benchmarks of the pipeline functions on synthetic profiles (python -m benchmarks.run --sizes 100 1000)
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from scripts.synthetic import synthetic_profiles
+from scripts.resampling_fn import resample_dataframes
+from scripts.tables import process_date_range, daily_indicators
+from scripts.create_plots import process_data, plot_electricity_demand_year
+from scripts.process_ueu_df import process_ueu
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.jsonl')
+
+SIZES = (100, 1000, 10000)
+
+# Slower than the baseline by more than this fraction is a regression
+TOLERANCE = 0.2
+
+# The baseline is the median of this many recent runs in the same environment
+BASELINE_RUNS = 5
+
+# Fields of a run that must match for it to be compared (times from other machines or
+# library versions are not comparable)
+ENVIRONMENT_KEYS = ('machine', 'python', 'numpy', 'pandas')
+
+COLORS = ['red', 'blue', 'green', 'orange', 'purple', 'lightseagreen', 'magenta', 'steelblue']
+
+
+def _legacy_frame(df):
+    # Layout of the old normalization stage: the unique_identifier as an extra last row
+    # (process_ueu leaves the rows of its input in place, so the frame can be reused)
+    legacy = pd.concat([df.astype(object), pd.DataFrame([df.columns], columns=df.columns, index=['unique_identifier'])])
+    return lambda: process_ueu(legacy)
+
+
+def _figure(frames, labels):
+    def run():
+        fig = plot_electricity_demand_year(frames, labels, '2100-01-01', '2100-12-31', COLORS, COLORS, show=False)
+        fig.canvas.draw()
+        plt.close(fig)
+    return run
+
+
+def benchmarks(df, ueus):
+    """{name: function without arguments} of every benchmark on a synthetic frame."""
+    classes = sorted(ueus['UEU'].unique())
+    frames = [df.loc[:, (ueus['UEU'] == cls).to_numpy()] for cls in classes]
+    daily = [resample_dataframes(frame)[0] for frame in frames]
+    date_ranges = [('2100-01-01', '2100-01-31'), ('2100-04-01', '2100-04-30'),
+                   ('2100-07-01', '2100-07-31'), ('2100-10-01', '2100-10-31')]
+    return {
+        'resample_dataframes': lambda: resample_dataframes(df),
+        'process_date_range': lambda: process_date_range(frames, classes, '2100-01-01', '2100-12-31 23:00'),
+        'daily_indicators': lambda: daily_indicators(df, 'all', date_ranges),
+        'process_data': lambda: process_data(df, df.columns[0]),
+        'process_ueu': _legacy_frame(df),
+        'figure_year': _figure(daily[:8], classes[:8]),
+    }
+
+
+def measure(func, repeat=3):
+    # Best of repeat runs, as in timeit
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(HISTORY_FILE)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_history(path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=['benchmark', 'size', 'freq', 'seconds'])
+    with open(path) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def baseline(history, name, size, freq, environment, runs=BASELINE_RUNS):
+    """Median time of the last runs of a benchmark in the same environment, NaN without any."""
+    if history.empty:
+        return np.nan
+    same = (history['benchmark'] == name) & (history['size'] == size) & (history['freq'] == freq)
+    for key in ENVIRONMENT_KEYS:
+        same &= history.get(key, pd.Series(None, index=history.index)) == environment[key]
+    previous = history.loc[same, 'seconds'].tail(runs)
+    return previous.median() if len(previous) else np.nan
+
+
+def run(sizes=SIZES, freq='h', names=None, repeat=3, history_path=HISTORY_FILE, seed=0, log=print):
+    """
+    Run the benchmarks at every size, append the results to the history and compare them with it.
+
+    Every result is compared with the median of the last BASELINE_RUNS runs on the same
+    machine with the same Python, numpy and pandas versions.
+
+    Returns:
+        pd.DataFrame: One row per benchmark and size with the time, the baseline time and
+        whether it is a regression.
+    """
+    history = load_history(history_path)
+    environment = {'commit': _commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+                   'pandas': pd.__version__, 'machine': platform.node(), 'date': pd.Timestamp.now().isoformat()}
+    rows = []
+    for size in sizes:
+        df, ueus = synthetic_profiles(size, freq=freq, seed=seed)
+        for name, func in benchmarks(df, ueus).items():
+            if names and name not in names:
+                continue
+            seconds = measure(func, repeat)
+            reference = baseline(history, name, size, freq, environment)
+            row = {'benchmark': name, 'size': size, 'freq': freq, 'seconds': seconds, **environment}
+            rows.append({**row, 'baseline': reference, 'regression': bool(seconds > reference * (1 + TOLERANCE))})
+            with open(history_path, 'a') as f:
+                f.write(json.dumps(row) + '\n')
+            log(f'{name:<22}{size:>8}  {seconds:9.4f} s' + (f'  (baseline {reference:.4f} s)' if not np.isnan(reference) else '')
+                + ('  REGRESSION' if rows[-1]['regression'] else ''))
+        del df
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline functions on synthetic profiles.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='numbers of UEU columns')
+    parser.add_argument('--freq', default='h', help="'h' (8760 rows) or 'min' (525,600 rows)")
+    parser.add_argument('--only', nargs='+', help='benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--history', default=HISTORY_FILE)
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 on a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.freq, args.only, args.repeat, args.history)
+    return int(args.fail_on_regression and results['regression'].any())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
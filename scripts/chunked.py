@@ -0,0 +1,135 @@
+# Out-of-core processing of a profile store, one block of columns at a time
+import os
+import numpy as np
+import pandas as pd
+from scripts.profile_store import open_profile_store, create_profile_store
+from scripts.normalization import normalize_profiles, AREA_UNITS
+from scripts.grouped_stats import grouped_statistics
+from scripts.profile_set import _natural_key
+from scripts.resampling_fn import resample_multi
+from scripts.percentiles import QuantileSketch
+
+# Default memory budget of the chunked stages
+MEMORY_BUDGET = 1024 ** 3
+
+# float64 copies of a chunk alive at the same time (read, normalised, resampling temporaries)
+WORKING_COPIES = 6
+
+
+def chunk_columns(n_steps, memory_budget=MEMORY_BUDGET, itemsize=8, copies=WORKING_COPIES):
+    """Number of columns of n_steps values that fit in the memory budget."""
+    return max(1, int(memory_budget // (n_steps * itemsize * copies)))
+
+
+def iter_chunks(store_path, memory_budget=MEMORY_BUDGET, columns=None):
+    """
+    Read a profile store block by block.
+
+    Parameters:
+        store_path (str): Folder of the store.
+        memory_budget (int): Bytes available to process one block, used to pick the block size.
+        columns (int, optional): Columns per block, overrides the memory budget.
+
+    Yields:
+        tuple: (ueus, values, time_index) with the sidecar rows and the float64 values of the block.
+    """
+    matrix, ueus, time_index = open_profile_store(store_path)
+    columns = columns or chunk_columns(len(time_index), memory_budget)
+    for start in range(0, matrix.shape[1], columns):
+        end = min(start + columns, matrix.shape[1])
+        # The store is column-major, so a block of columns is one contiguous read
+        yield ueus.iloc[start:end], np.asarray(matrix[:, start:end], dtype=np.float64), time_index
+
+
+def process_store_chunked(store_path, output_path=None, memory_budget=MEMORY_BUDGET, columns=None,
+                          class_column='UEU', area_column='area_ha', normalize=True, per='ha',
+                          decimals=None, resolutions=('D', 'W', 'M'), stats=('sum',),
+                          percentiles=None, sketch_size=200):
+    """
+    Normalise, group, resample and export a profile store with bounded peak memory.
+
+    The store is streamed in blocks of columns sized by memory_budget. Per-class
+    statistics and percentile sketches are merged across blocks; the normalised and
+    resampled profiles are written block by block to stores under output_path.
+
+    Parameters:
+        store_path (str): Folder of the input store.
+        output_path (str, optional): Folder of the output stores ('normalized' and one
+            '<resolution>_<stat>' store per resampled table). Nothing is written if None.
+        memory_budget (int): Bytes available to process one block.
+        columns (int, optional): Columns per block, overrides the memory budget.
+        class_column (str): Sidecar column with the class of every UEU.
+        area_column (str): Sidecar column with the area in hectares.
+        normalize (bool): Normalise the profiles (see normalization.normalize_profiles).
+        per (str): Normalisation per 'ha', 'm2' or 'household'.
+        decimals (int, optional): Rounding of the normalised values.
+        resolutions (tuple): Resolutions of resampling_fn.resample_multi, none if empty.
+        stats (tuple): Statistics of the resampled tables.
+        percentiles (tuple, optional): Percentiles of the envelope per class, e.g. PERCENTILES.
+        sketch_size (int): Points per timestep of the percentile sketches.
+
+    Returns:
+        dict: 'statistics' (GroupedStatistics), 'envelope' ({class: DataFrame}, if percentiles)
+        and 'stores' ({name: path} of the written stores).
+    """
+    _, ueus, time_index = open_profile_store(store_path)
+    labels = ueus[class_column].astype(str).to_numpy()
+    classes = sorted(set(labels), key=_natural_key)
+
+    statistics = None
+    sketches = {}
+    rng = np.random.default_rng(0)
+    outputs = {}
+    stores = {}
+
+    for chunk_ueus, values, index in iter_chunks(store_path, memory_budget, columns):
+        chunk_labels = chunk_ueus[class_column].astype(str).to_numpy()
+
+        if normalize:
+            area = chunk_ueus[area_column].to_numpy() if per in AREA_UNITS and area_column in chunk_ueus else None
+            households = chunk_ueus['households'].to_numpy() if 'households' in chunk_ueus else None
+            values = normalize_profiles(values, area=area, per=per, households=households,
+                                        decimals=decimals, copy=False)
+
+        chunk_statistics = grouped_statistics(values, chunk_labels, classes, index)
+        statistics = chunk_statistics if statistics is None else statistics.merge(chunk_statistics)
+
+        if percentiles:
+            for cls in pd.unique(chunk_labels):
+                sketch = QuantileSketch.from_block(values[:, chunk_labels == cls], sketch_size, rng)
+                sketches[cls] = sketch if cls not in sketches else sketches[cls].merge(sketch)
+
+        if output_path is None:
+            continue
+
+        if normalize:
+            if 'normalized' not in outputs:
+                stores['normalized'] = os.path.join(output_path, 'normalized')
+                outputs['normalized'] = create_profile_store(ueus.drop(columns='column'), stores['normalized'], time_index)
+            start = chunk_ueus['column'].iloc[0]
+            outputs['normalized'][:, start:start + values.shape[1]] = values
+
+        if resolutions:
+            frame = pd.DataFrame(values, index=index, columns=chunk_ueus['column'].to_numpy(), copy=False)
+            resampled = resample_multi(frame, resolutions, stats)
+            for resolution in resolutions:
+                for stat in stats:
+                    name = f'{resolution}_{stat}'
+                    # Columns dropped by clean_columns (only NaN or zeros) are left as NaN
+                    table = resampled[resolution][stat].reindex(columns=frame.columns)
+                    if name not in outputs:
+                        stores[name] = os.path.join(output_path, name)
+                        outputs[name] = create_profile_store(ueus.drop(columns='column'), stores[name], table.index)
+                    start = frame.columns[0]
+                    outputs[name][:, start:start + table.shape[1]] = table.to_numpy()
+        del values
+
+    for matrix in outputs.values():
+        matrix.flush()
+
+    result = {'statistics': statistics, 'stores': stores}
+    if percentiles:
+        result['envelope'] = {cls: pd.DataFrame(np.column_stack([sketches[cls].quantile(p / 100) for p in percentiles]),
+                                                index=time_index, columns=[f'P{p}' for p in percentiles])
+                              for cls in classes if cls in sketches}
+    return result
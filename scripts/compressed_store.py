@@ -0,0 +1,152 @@
+# Low-rank compressed profile format
+import os
+import json
+import numpy as np
+import pandas as pd
+from scripts.profile_set import UEUProfileSet
+
+META_FILE = 'compressed.json'
+UEUS_FILE = 'ueus.csv'
+
+
+def _truncated_svd(values, tolerance, max_rank=None):
+    # Basis (time x rank) and coefficients (rank x column) of the smallest rank within the relative error tolerance
+    mean = values.mean(axis=1, keepdims=True)
+    u, s, vt = np.linalg.svd(values - mean, full_matrices=False)
+    energy = np.cumsum(s[::-1] ** 2)[::-1]
+    total = (values ** 2).sum()
+    # Frobenius error left after keeping the first r components is sqrt(energy[r])
+    residual = np.append(energy, 0)
+    rank = int(np.argmax(np.sqrt(residual) <= tolerance * np.sqrt(total))) if total > 0 else 0
+    if max_rank is not None:
+        rank = min(rank, max_rank)
+    error = np.sqrt(residual[rank] / total) if total > 0 else 0.0
+    return mean[:, 0], u[:, :rank] * s[:rank], vt[:rank], error
+
+
+def write_compressed_store(profiles, store_path, tolerance=0.01, max_rank=None, dtype=np.float32):
+    """
+    Write a UEUProfileSet as one truncated SVD basis per class plus coefficients per UEU.
+
+    For every class the profiles are stored as mean + basis @ coefficients, with the
+    smallest rank whose relative Frobenius error is at most tolerance (capped at max_rank).
+
+    Parameters:
+        profiles (UEUProfileSet): Profiles to compress (e.g. the normalised profiles).
+        store_path (str): Folder of the compressed store.
+        tolerance (float): Relative reconstruction error allowed per class.
+        max_rank (int, optional): Largest rank per class.
+
+    Returns:
+        dict: Rank, relative error and compression ratio of every class.
+    """
+    if not os.path.exists(store_path):
+        os.makedirs(store_path)
+
+    report = {}
+    for code, cls in enumerate(profiles.classes):
+        start, end = profiles._bounds[cls]
+        if end == start:
+            continue
+        mean, basis, coefficients, error = _truncated_svd(profiles.values[:, start:end].astype(np.float64),
+                                                           tolerance, max_rank)
+        np.savez(os.path.join(store_path, f'class_{code}.npz'), mean=mean.astype(dtype),
+                 basis=basis.astype(dtype), coefficients=coefficients.astype(dtype))
+        stored = mean.size + basis.size + coefficients.size
+        report[cls] = {'rank': basis.shape[1], 'error': float(error),
+                       'ratio': float(profiles.values[:, start:end].size / stored)}
+
+    pd.DataFrame({'unique_identifier': profiles.ids, 'UEU': profiles.labels,
+                  'area_ha': profiles.areas if profiles.areas is not None else np.nan}
+                 ).to_csv(os.path.join(store_path, UEUS_FILE), index=False)
+
+    meta = {'classes': profiles.classes,
+            'n_steps': len(profiles.index),
+            'start': str(profiles.index[0]),
+            'freq': pd.infer_freq(profiles.index) or 'h',
+            'tolerance': tolerance,
+            'report': report}
+    with open(os.path.join(store_path, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return report
+
+
+class CompressedProfiles:
+    """
+    Reader of a compressed store, reconstructing only what is asked for.
+
+    The factors of a class are loaded on first use; a UEU, a time window or a class
+    mean is rebuilt from them without decompressing the rest.
+    """
+
+    def __init__(self, store_path):
+        with open(os.path.join(store_path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.store_path = store_path
+        self.classes = self.meta['classes']
+        self.index = pd.date_range(start=self.meta['start'], periods=self.meta['n_steps'], freq=self.meta['freq'])
+        self.ueus = pd.read_csv(os.path.join(store_path, UEUS_FILE), dtype={'unique_identifier': str})
+        # Position of every UEU within the columns of its class
+        self.ueus['position'] = self.ueus.groupby('UEU').cumcount()
+        self._factors = {}
+
+    def __repr__(self):
+        return f'CompressedProfiles(steps={len(self.index)}, ueus={len(self.ueus)}, classes={self.classes})'
+
+    def factors(self, cls):
+        """(mean, basis, coefficients) of a class."""
+        if cls not in self._factors:
+            with np.load(os.path.join(self.store_path, f'class_{self.classes.index(cls)}.npz')) as data:
+                self._factors[cls] = data['mean'], data['basis'], data['coefficients']
+        return self._factors[cls]
+
+    def _rows(self, start, end):
+        # Rows of the time window, by binary search on the index
+        return self.index.slice_indexer(start, end)
+
+    def profiles(self, ids=None, cls=None, start=None, end=None):
+        """
+        Rebuild profiles by unique_identifier or all profiles of a class, optionally only a time window.
+
+        Returns:
+            pd.DataFrame: (time x unique_identifier), float32.
+        """
+        rows = self._rows(start, end)
+        if ids is None:
+            selected = self.ueus[self.ueus['UEU'] == cls]
+        else:
+            selected = self.ueus.set_index('unique_identifier').loc[list(ids)].reset_index()
+
+        columns = []
+        for ueu_cls, group in selected.groupby('UEU', sort=False):
+            mean, basis, coefficients = self.factors(ueu_cls)
+            block = basis[rows] @ coefficients[:, group['position'].to_numpy()] + mean[rows, None]
+            columns.append(pd.DataFrame(block, index=self.index[rows], columns=group['unique_identifier'].to_numpy()))
+        df = pd.concat(columns, axis=1)
+        return df[selected['unique_identifier'].to_numpy()]
+
+    def class_mean(self, cls, start=None, end=None):
+        """Mean profile of a class, from the factors only (no profile is rebuilt)."""
+        rows = self._rows(start, end)
+        mean, basis, coefficients = self.factors(cls)
+        return pd.Series(mean[rows] + basis[rows] @ coefficients.mean(axis=1), index=self.index[rows], name=cls)
+
+    def class_sum(self, cls, start=None, end=None):
+        """Summed profile of a class, from the factors only."""
+        _, _, coefficients = self.factors(cls)
+        return self.class_mean(cls, start, end) * coefficients.shape[1]
+
+    def to_profile_set(self):
+        """Decompress everything into a UEUProfileSet."""
+        values = np.empty((len(self.index), len(self.ueus)), dtype=np.float32, order='F')
+        position = 0
+        for cls in self.classes:
+            n = int((self.ueus['UEU'] == cls).sum())
+            if n:
+                mean, basis, coefficients = self.factors(cls)
+                values[:, position:position + n] = basis @ coefficients + mean[:, None]
+            position += n
+        codes = pd.Index(self.classes).get_indexer(self.ueus['UEU'])
+        areas = self.ueus['area_ha'].to_numpy(dtype=np.float64)
+        return UEUProfileSet(values, self.index, codes, self.classes, self.ueus['unique_identifier'].to_numpy(),
+                             None if np.isnan(areas).all() else areas)
@@ -3,8 +3,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import matplotlib.gridspec as gridspec
+from scripts.instrumentation import instrumented
+from scripts.downsampling import plot_line, fill_band
+from scripts.percentiles import row_percentiles
+from scripts.profile_set import as_frames
+from scripts.create_plots import plot_bands, band_percentiles
 
+@instrumented
 def plot_heat_demand_hour(data_frames, labels, target_dates, line_colors, face_colors):
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
     # Convert target dates to datetime objects (remove this line to use the provided target_dates)
     target_dates = pd.to_datetime(target_dates)
 
@@ -69,7 +76,9 @@ def plot_heat_demand_hour(data_frames, labels, target_dates, line_colors, face_c
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
     plt.show()
 
-def plot_heat_demand_month(data_frames, labels, line_colors, face_colors, date_ranges):
+@instrumented
+def plot_heat_demand_month(data_frames, labels, line_colors, face_colors, date_ranges, bands=None, max_points='auto'):
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
     # Check if the number of DataFrames, labels, line_colors, and face_colors match
     if len(data_frames) != len(labels) != len(line_colors) != len(face_colors):
         raise ValueError("The number of DataFrames, labels, line_colors, and face_colors must match.")
@@ -98,13 +107,16 @@ def plot_heat_demand_month(data_frames, labels, line_colors, face_colors, date_r
 
             ax = axs[i, j]  # Get the current subplot
 
-            # Plot min, mean, and max values on the current subplot
-            ax.plot(daily_min.index, daily_min, label='Min', linewidth=0.5, color=line_colors[i])
-            ax.plot(daily_mean.index, daily_mean, label='Mean', linewidth=2, color=line_colors[i])
-            ax.plot(daily_max.index, daily_max, label='Max', linewidth=0.5, color=line_colors[i])
-            
-            ax.fill_between(daily_mean.index, daily_min, daily_mean, facecolor=face_colors[i], alpha=0.2)
-            ax.fill_between(daily_mean.index, daily_mean, daily_max, facecolor=face_colors[i], alpha=0.2)
+            if bands is not None:
+                # Shade the configured percentile bands instead of min-mean-max
+                plot_bands(ax, daily_mean, row_percentiles(df_filtered, band_percentiles(bands)), bands, line_colors[i], face_colors[i], max_points)
+            else:
+                # Plot min, mean, and max values on the current subplot
+                plot_line(ax, daily_min.index, daily_min, max_points, label='Min', linewidth=0.5, color=line_colors[i])
+                plot_line(ax, daily_mean.index, daily_mean, max_points, label='Mean', linewidth=2, color=line_colors[i])
+                plot_line(ax, daily_max.index, daily_max, max_points, label='Max', linewidth=0.5, color=line_colors[i])
+
+                fill_band(ax, daily_mean.index, daily_min, daily_max, max_points, facecolor=face_colors[i], alpha=0.2)
 
             # Set x-axis limits
             ax.set_xlim(start_date, end_date)
@@ -139,7 +151,9 @@ def plot_heat_demand_month(data_frames, labels, line_colors, face_colors, date_r
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
     plt.show()
 
-def plot_heat_demand_year(data_frames, labels, start_date, end_date, line_colors, face_colors):
+@instrumented
+def plot_heat_demand_year(data_frames, labels, start_date, end_date, line_colors, face_colors, bands=None, max_points='auto'):
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
     
     start_date = pd.to_datetime(start_date, format='%Y-%m-%d')
     end_date = pd.to_datetime(end_date, format='%Y-%m-%d')
@@ -167,14 +181,17 @@ def plot_heat_demand_year(data_frames, labels, start_date, end_date, line_colors
             mean_values = filtered_df.mean(axis=1)
             max_values = filtered_df.max(axis=1)
 
-            # Plot min, mean, and max values on the current subplot with specified colors
-            axs[i].plot(filtered_df.index, min_values, label='Min', linewidth=0.5, color=line_color)
-            axs[i].plot(filtered_df.index, mean_values, label='Mean', linewidth=2, color=line_color)
-            axs[i].plot(filtered_df.index, max_values, label='Max', linewidth=0.5, color=line_color)
+            if bands is not None:
+                # Shade the configured percentile bands instead of min-mean-max
+                plot_bands(axs[i], mean_values, row_percentiles(filtered_df, band_percentiles(bands)), bands, line_color, face_color, max_points)
+            else:
+                # Plot min, mean, and max values on the current subplot with specified colors
+                plot_line(axs[i], filtered_df.index, min_values, max_points, label='Min', linewidth=0.5, color=line_color)
+                plot_line(axs[i], filtered_df.index, mean_values, max_points, label='Mean', linewidth=2, color=line_color)
+                plot_line(axs[i], filtered_df.index, max_values, max_points, label='Max', linewidth=0.5, color=line_color)
 
-            # Add shadows between min and mean, and between mean and max with specified facecolor
-            axs[i].fill_between(filtered_df.index, min_values, mean_values, facecolor=face_color, alpha=0.2)
-            axs[i].fill_between(filtered_df.index, mean_values, max_values, facecolor=face_color, alpha=0.2)
+                # Add a shadow between min and max with specified facecolor
+                fill_band(axs[i], filtered_df.index, min_values, max_values, max_points, facecolor=face_color, alpha=0.2)
 
             # Set subplot title and labels
             axs[i].set_title(label, loc='right')
@@ -200,7 +217,9 @@ def plot_heat_demand_year(data_frames, labels, start_date, end_date, line_colors
     plt.tight_layout()
     plt.show()
 
-def create_plots_month(dataframes, start_date, end_date, labels):
+@instrumented
+def create_plots_month(dataframes, start_date, end_date, labels, max_points='auto'):
+    dataframes, labels = as_frames(dataframes, labels)  # a UEUProfileSet gives one DataFrame per class
     # Create empty lists to store minimum, mean, and maximum values for each DataFrame
     min_values = []
     mean_values = []
@@ -235,15 +254,15 @@ def create_plots_month(dataframes, start_date, end_date, labels):
 
     # Plot minimum values with labels
     for min_data, label in zip(min_values, labels):
-        axes[0].plot(min_data.index, min_data, label=f'{label} Monthly Min')
+        plot_line(axes[0], min_data.index, min_data, max_points, label=f'{label} Monthly Min')
 
     # Plot mean values with labels
     for mean_data, label in zip(mean_values, labels):
-        axes[1].plot(mean_data.index, mean_data, label=f'{label} Monthly Mean')
+        plot_line(axes[1], mean_data.index, mean_data, max_points, label=f'{label} Monthly Mean')
 
     # Plot maximum values with labels
     for max_data, label in zip(max_values, labels):
-        axes[2].plot(max_data.index, max_data, label=f'{label} Monthly Max')
+        plot_line(axes[2], max_data.index, max_data, max_points, label=f'{label} Monthly Max')
 
     # Customize the plots and set titles with date range
     for ax, title in zip(axes, titles):
@@ -263,6 +282,7 @@ def create_plots_month(dataframes, start_date, end_date, labels):
     # Display the plots
     plt.show()
 
+@instrumented
 def plot_elect_demand_hour(df, labels, target_dates):
     # Convert target dates to datetime objects (remove this line to use the provided target_dates)
     target_dates = pd.to_datetime(target_dates)
@@ -317,6 +337,7 @@ def plot_elect_demand_hour(df, labels, target_dates):
     plt.subplots_adjust(wspace=0.1)
     plt.show()
 
+@instrumented
 def plot_elect_demand_day(dataframes, start_date, end_date, labels):
     # Convert target dates to datetime objects (remove this line to use the provided target_dates)
     target_dates = pd.to_datetime(target_dates)
@@ -372,6 +393,7 @@ def plot_elect_demand_day(dataframes, start_date, end_date, labels):
     plt.show()
 
 # Define a function to create the plots for a DataFrame
+@instrumented
 def create_plots_day(df, df_name):
     # Process the DataFrame
     df_f = df.apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
@@ -418,7 +440,9 @@ def create_plots_day(df, df_name):
     plt.tight_layout()
     plt.show()
 
-def create_plots_h(dataframes, start_date, end_date, labels):
+@instrumented
+def create_plots_h(dataframes, start_date, end_date, labels, max_points='auto'):
+    dataframes, labels = as_frames(dataframes, labels)  # a UEUProfileSet gives one DataFrame per class
     # Create empty lists to store minimum, mean, and maximum values for each DataFrame
     min_values = []
     mean_values = []
@@ -453,15 +477,15 @@ def create_plots_h(dataframes, start_date, end_date, labels):
 
     # Plot minimum values with labels
     for min_data, label in zip(min_values, labels):
-        axes[0].plot(min_data.index, min_data, label=f'{label} Daily Min')
+        plot_line(axes[0], min_data.index, min_data, max_points, label=f'{label} Daily Min')
 
     # Plot mean values with labels
     for mean_data, label in zip(mean_values, labels):
-        axes[1].plot(mean_data.index, mean_data, label=f'{label} Daily Mean')
+        plot_line(axes[1], mean_data.index, mean_data, max_points, label=f'{label} Daily Mean')
 
     # Plot maximum values with labels
     for max_data, label in zip(max_values, labels):
-        axes[2].plot(max_data.index, max_data, label=f'{label} Daily Max')
+        plot_line(axes[2], max_data.index, max_data, max_points, label=f'{label} Daily Max')
 
     # Customize the plots and set titles with date range
     for ax, title in zip(axes, titles):
@@ -481,7 +505,8 @@ def create_plots_h(dataframes, start_date, end_date, labels):
     # Display the plots
     plt.show()
 
-def create_plots_week_heat(dataframes, labels, date_ranges):
+@instrumented
+def create_plots_week_heat(dataframes, labels, date_ranges, max_points='auto'):
     # Convert date strings to datetime objects
     date_ranges = [(pd.to_datetime(start), pd.to_datetime(end)) for start, end in date_ranges]
 
@@ -503,11 +528,10 @@ def create_plots_week_heat(dataframes, labels, date_ranges):
         ax = axs[i]  # Get the current subplot
 
         # Plot min, mean, and max values on the current subplot
-        ax.plot(daily_min.index, daily_min, label='Min', linewidth=0.5, color='red')
-        ax.plot(daily_mean.index, daily_mean, label='Mean', linewidth=2, color='red')
-        ax.plot(daily_max.index, daily_max, label='Max', linewidth=1, color='red')
-        ax.fill_between(daily_mean.index, daily_min, daily_mean, facecolor='C1', alpha=0.2)
-        ax.fill_between(daily_mean.index, daily_mean, daily_max, facecolor='C1', alpha=0.2)
+        plot_line(ax, daily_min.index, daily_min, max_points, label='Min', linewidth=0.5, color='red')
+        plot_line(ax, daily_mean.index, daily_mean, max_points, label='Mean', linewidth=2, color='red')
+        plot_line(ax, daily_max.index, daily_max, max_points, label='Max', linewidth=1, color='red')
+        fill_band(ax, daily_mean.index, daily_min, daily_max, max_points, facecolor='C1', alpha=0.2)
 
         # Set x-axis limits
         ax.set_xlim(start_date, end_date)
@@ -527,7 +551,8 @@ def create_plots_week_heat(dataframes, labels, date_ranges):
     plt.subplots_adjust(wspace=0.1)
     plt.show()
 
-def create_plots_week_elect(dataframes, labels, date_ranges):
+@instrumented
+def create_plots_week_elect(dataframes, labels, date_ranges, max_points='auto'):
     # Convert date strings to datetime objects
     date_ranges = [(pd.to_datetime(start), pd.to_datetime(end)) for start, end in date_ranges]
 
@@ -549,11 +574,10 @@ def create_plots_week_elect(dataframes, labels, date_ranges):
         ax = axs[i]  # Get the current subplot
 
         # Plot min, mean, and max values on the current subplot
-        ax.plot(daily_min.index, daily_min, label='Min', linewidth=0.5, color='red')
-        ax.plot(daily_mean.index, daily_mean, label='Mean', linewidth=2, color='red')
-        ax.plot(daily_max.index, daily_max, label='Max', linewidth=1, color='red')
-        ax.fill_between(daily_mean.index, daily_min, daily_mean, facecolor='C1', alpha=0.2)
-        ax.fill_between(daily_mean.index, daily_mean, daily_max, facecolor='C1', alpha=0.2)
+        plot_line(ax, daily_min.index, daily_min, max_points, label='Min', linewidth=0.5, color='red')
+        plot_line(ax, daily_mean.index, daily_mean, max_points, label='Mean', linewidth=2, color='red')
+        plot_line(ax, daily_max.index, daily_max, max_points, label='Max', linewidth=1, color='red')
+        fill_band(ax, daily_mean.index, daily_min, daily_max, max_points, facecolor='C1', alpha=0.2)
 
         # Set x-axis limits
         ax.set_xlim(start_date, end_date)
@@ -573,7 +597,9 @@ def create_plots_week_elect(dataframes, labels, date_ranges):
     plt.subplots_adjust(wspace=0.1)
     plt.show()
 
-def plot_electricity_demand_monthly(data_frames, labels, start_date, end_date):
+@instrumented
+def plot_electricity_demand_monthly(data_frames, labels, start_date, end_date, bands=None, max_points='auto'):
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
 
     start_date = pd.to_datetime(start_date, format='%Y-%m-%d')
     end_date = pd.to_datetime(end_date, format='%Y-%m-%d')
@@ -597,14 +623,17 @@ def plot_electricity_demand_monthly(data_frames, labels, start_date, end_date):
             mean_values = filtered_df.mean(axis=1)
             max_values = filtered_df.max(axis=1)
 
-            # Plot min, mean, and max values on the current subplot
-            axs[i].plot(filtered_df.index, min_values, label='Min', linewidth=0.5, color='red')
-            axs[i].plot(filtered_df.index, mean_values, label='Mean', linewidth=2, color='red')
-            axs[i].plot(filtered_df.index, max_values, label='Max', linewidth=0.5, color='red')
+            if bands is not None:
+                # Shade the configured percentile bands instead of min-mean-max
+                plot_bands(axs[i], mean_values, row_percentiles(filtered_df, band_percentiles(bands)), bands, 'red', 'red', max_points)
+            else:
+                # Plot min, mean, and max values on the current subplot
+                plot_line(axs[i], filtered_df.index, min_values, max_points, label='Min', linewidth=0.5, color='red')
+                plot_line(axs[i], filtered_df.index, mean_values, max_points, label='Mean', linewidth=2, color='red')
+                plot_line(axs[i], filtered_df.index, max_values, max_points, label='Max', linewidth=0.5, color='red')
 
-            # Add shadows between min and mean, and between mean and max
-            axs[i].fill_between(filtered_df.index, min_values, mean_values, facecolor='red', alpha=0.2)
-            axs[i].fill_between(filtered_df.index, mean_values, max_values, facecolor='red', alpha=0.2)
+                # Add a shadow between min and max
+                fill_band(axs[i], filtered_df.index, min_values, max_values, max_points, facecolor='red', alpha=0.2)
 
             # Set subplot title and labels
             axs[i].set_title(label)
@@ -628,7 +657,9 @@ def plot_electricity_demand_monthly(data_frames, labels, start_date, end_date):
     plt.tight_layout()
     plt.show()
 
-def create_plots_el_week(dataframes, start_date, end_date, labels):
+@instrumented
+def create_plots_el_week(dataframes, start_date, end_date, labels, max_points='auto'):
+    dataframes, labels = as_frames(dataframes, labels)  # a UEUProfileSet gives one DataFrame per class
     # Create empty lists to store minimum, mean, and maximum values for each DataFrame
     min_values = []
     mean_values = []
@@ -663,15 +694,15 @@ def create_plots_el_week(dataframes, start_date, end_date, labels):
 
     # Plot minimum values with labels
     for min_data, label in zip(min_values, labels):
-        axes[0].plot(min_data.index, min_data, label=f'{label} Daily Min')
+        plot_line(axes[0], min_data.index, min_data, max_points, label=f'{label} Daily Min')
 
     # Plot mean values with labels
     for mean_data, label in zip(mean_values, labels):
-        axes[1].plot(mean_data.index, mean_data, label=f'{label} Daily Mean')
+        plot_line(axes[1], mean_data.index, mean_data, max_points, label=f'{label} Daily Mean')
 
     # Plot maximum values with labels
     for max_data, label in zip(max_values, labels):
-        axes[2].plot(max_data.index, max_data, label=f'{label} Daily Max')
+        plot_line(axes[2], max_data.index, max_data, max_points, label=f'{label} Daily Max')
 
     # Customize the plots and set titles with date range
     for ax, title in zip(axes, titles):
@@ -691,7 +722,9 @@ def create_plots_el_week(dataframes, start_date, end_date, labels):
     # Display the plots
     plt.show()
 
-def create_plots_el_month(dataframes, start_date, end_date, labels):
+@instrumented
+def create_plots_el_month(dataframes, start_date, end_date, labels, max_points='auto'):
+    dataframes, labels = as_frames(dataframes, labels)  # a UEUProfileSet gives one DataFrame per class
     # Create empty lists to store minimum, mean, and maximum values for each DataFrame
     min_values = []
     mean_values = []
@@ -726,15 +759,15 @@ def create_plots_el_month(dataframes, start_date, end_date, labels):
 
     # Plot minimum values with labels
     for min_data, label in zip(min_values, labels):
-        axes[0].plot(min_data.index, min_data, label=f'{label} Monthly Min')
+        plot_line(axes[0], min_data.index, min_data, max_points, label=f'{label} Monthly Min')
 
     # Plot mean values with labels
     for mean_data, label in zip(mean_values, labels):
-        axes[1].plot(mean_data.index, mean_data, label=f'{label} Monthly Mean')
+        plot_line(axes[1], mean_data.index, mean_data, max_points, label=f'{label} Monthly Mean')
 
     # Plot maximum values with labels
     for max_data, label in zip(max_values, labels):
-        axes[2].plot(max_data.index, max_data, label=f'{label} Monthly Max')
+        plot_line(axes[2], max_data.index, max_data, max_points, label=f'{label} Monthly Max')
 
     # Customize the plots and set titles with date range
     for ax, title in zip(axes, titles):
@@ -3,11 +3,33 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.ticker import FuncFormatter, FixedLocator
-
-
-def plot_heat_demand_hour(data_frames, labels, target_dates, line_colors, face_colors):
+from scripts.percentiles import row_percentiles
+from scripts.profile_set import as_frames
+from scripts.instrumentation import instrumented
+from scripts.downsampling import plot_line, fill_band
+
+
+@instrumented
+def plot_bands(ax, mean, percentiles, bands, line_color, face_color, max_points='auto'):
+    # Mean line and shaded percentile bands, e.g. bands=[(5, 95), (25, 75)] (see percentiles.row_percentiles)
+    plot_line(ax, mean.index, mean, max_points, label='Mean', linewidth=2, color=line_color)
+    for low, high in bands:
+        plot_line(ax, percentiles.index, percentiles[f'P{low}'], max_points, linewidth=0.5, color=line_color)
+        plot_line(ax, percentiles.index, percentiles[f'P{high}'], max_points, linewidth=0.5, color=line_color)
+        fill_band(ax, percentiles.index, percentiles[f'P{low}'], percentiles[f'P{high}'], max_points,
+                  facecolor=face_color, alpha=0.2, label=f'P{low}-P{high}')
+
+@instrumented
+def band_percentiles(bands):
+    # Percentiles needed to draw the bands
+    return sorted({p for band in bands for p in band})
+
+
+@instrumented
+def plot_heat_demand_hour(data_frames, labels, target_dates, line_colors, face_colors, bands=None, show=True):
     # Convert target dates to datetime objects (remove this line to use the provided target_dates)
     target_dates = pd.to_datetime(target_dates)
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
 
     # Create a figure with 4 subplots for each DataFrame
     num_data_frames = len(data_frames)
@@ -23,6 +45,10 @@ def plot_heat_demand_hour(data_frames, labels, target_dates, line_colors, face_c
         hourly_max = df.max(axis=1)
         hourly_mean = df.mean(axis=1)
 
+        # Percentiles of the configured bands instead of min and max, e.g. bands=[(5, 95), (25, 75)]
+        if bands is not None:
+            hourly_bands = row_percentiles(df, band_percentiles(bands))
+
         for j, target_date in enumerate(target_dates):
             start_time = target_date
             end_time = target_date + pd.DateOffset(hours=23)
@@ -35,13 +61,16 @@ def plot_heat_demand_hour(data_frames, labels, target_dates, line_colors, face_c
 
             # Plot min, mean, and max values on the current subplot with customizable colors
             line_color = line_colors[i % len(line_colors)]  # Cycle through colors
-            ax.plot(filtered_min.index, filtered_min, label='Min', linewidth=0.5, color=line_color)
-            ax.plot(filtered_mean.index, filtered_mean, label='Mean', linewidth=2, color=line_color)
-            ax.plot(filtered_max.index, filtered_max, label='Max', linewidth=0.5, color=line_color)
-            
             face_color = face_colors[i % len(face_colors)]  # Cycle through colors
-            ax.fill_between(filtered_mean.index, filtered_min, filtered_mean, facecolor=face_color, alpha=0.2)
-            ax.fill_between(filtered_mean.index, filtered_mean, filtered_max, facecolor=face_color, alpha=0.2)
+            if bands is not None:
+                plot_bands(ax, filtered_mean, hourly_bands[start_time:end_time], bands, line_color, face_color)
+            else:
+                ax.plot(filtered_min.index, filtered_min, label='Min', linewidth=0.5, color=line_color)
+                ax.plot(filtered_mean.index, filtered_mean, label='Mean', linewidth=2, color=line_color)
+                ax.plot(filtered_max.index, filtered_max, label='Max', linewidth=0.5, color=line_color)
+
+                ax.fill_between(filtered_mean.index, filtered_min, filtered_mean, facecolor=face_color, alpha=0.2)
+                ax.fill_between(filtered_mean.index, filtered_mean, filtered_max, facecolor=face_color, alpha=0.2)
 
             ax.set_xticks(filtered_mean.index)
 
@@ -73,10 +102,14 @@ def plot_heat_demand_hour(data_frames, labels, target_dates, line_colors, face_c
     # Display the subplots
     plt.tight_layout()
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
+    if not show:
+        return fig
     plt.show()
 
 
-def plot_heat_demand_month(data_frames, labels, line_colors, face_colors, date_ranges):
+@instrumented
+def plot_heat_demand_month(data_frames, labels, line_colors, face_colors, date_ranges, bands=None, max_points='auto', show=True):
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
     if len(data_frames) != len(labels) or len(data_frames) != len(line_colors) or len(data_frames) != len(face_colors):
         raise ValueError("The number of DataFrames, labels, line_colors, and face_colors must match.")
 
@@ -99,12 +132,14 @@ def plot_heat_demand_month(data_frames, labels, line_colors, face_colors, date_r
 
             ax = axs[i, j]
 
-            ax.plot(df_filtered.index, monthly_min, label='Min', linewidth=0.5, color=line_colors[i])
-            ax.plot(df_filtered.index, monthly_mean, label='Mean', linewidth=2, color=line_colors[i])
-            ax.plot(df_filtered.index, monthly_max, label='Max', linewidth=0.5, color=line_colors[i])
+            if bands is not None:
+                plot_bands(ax, monthly_mean, row_percentiles(df_filtered, band_percentiles(bands)), bands, line_colors[i], face_colors[i], max_points)
+            else:
+                plot_line(ax, df_filtered.index, monthly_min, max_points, label='Min', linewidth=0.5, color=line_colors[i])
+                plot_line(ax, df_filtered.index, monthly_mean, max_points, label='Mean', linewidth=2, color=line_colors[i])
+                plot_line(ax, df_filtered.index, monthly_max, max_points, label='Max', linewidth=0.5, color=line_colors[i])
 
-            ax.fill_between(df_filtered.index, monthly_min, monthly_mean, facecolor=face_colors[i], alpha=0.2)
-            ax.fill_between(df_filtered.index, monthly_mean, monthly_max, facecolor=face_colors[i], alpha=0.2)
+                fill_band(ax, df_filtered.index, monthly_min, monthly_max, max_points, facecolor=face_colors[i], alpha=0.2)
 
             ax.set_xlim(start_date, end_date)
             ax.yaxis.tick_left()
@@ -130,9 +165,13 @@ def plot_heat_demand_month(data_frames, labels, line_colors, face_colors, date_r
         
     plt.tight_layout()
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
+    if not show:
+        return fig
     plt.show()
     
-def plot_heat_demand_year(data_frames, labels, start_date, end_date, line_colors, face_colors):
+@instrumented
+def plot_heat_demand_year(data_frames, labels, start_date, end_date, line_colors, face_colors, bands=None, max_points='auto', show=True):
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
     start_date = pd.to_datetime(start_date, format='%Y-%m-%d')
     end_date = pd.to_datetime(end_date, format='%Y-%m-%d')
 
@@ -163,13 +202,16 @@ def plot_heat_demand_year(data_frames, labels, start_date, end_date, line_colors
 
             # Plot min, mean, and max values on the current subplot with specified colors
             ax = axs[i]  # Get the current subplot
-            ax.plot(filtered_df.index, min_values, label='Min', linewidth=0.5, color=line_color)
-            ax.plot(filtered_df.index, mean_values, label='Mean', linewidth=2, color=line_color)
-            ax.plot(filtered_df.index, max_values, label='Max', linewidth=0.5, color=line_color)
+            if bands is not None:
+                # Shade the configured percentile bands instead of min-mean-max
+                plot_bands(ax, mean_values, row_percentiles(filtered_df, band_percentiles(bands)), bands, line_color, face_color, max_points)
+            else:
+                plot_line(ax, filtered_df.index, min_values, max_points, label='Min', linewidth=0.5, color=line_color)
+                plot_line(ax, filtered_df.index, mean_values, max_points, label='Mean', linewidth=2, color=line_color)
+                plot_line(ax, filtered_df.index, max_values, max_points, label='Max', linewidth=0.5, color=line_color)
 
-            # Add shadows between min and mean, and between mean and max with specified facecolor
-            ax.fill_between(filtered_df.index, min_values, mean_values, facecolor=face_color, alpha=0.2)
-            ax.fill_between(filtered_df.index, mean_values, max_values, facecolor=face_color, alpha=0.2)
+                # Add a shadow between min and max with specified facecolor
+                fill_band(ax, filtered_df.index, min_values, max_values, max_points, facecolor=face_color, alpha=0.2)
 
             # Set subplot title and labels
             ax.set_ylabel('Normalized heat demand')
@@ -194,11 +236,15 @@ def plot_heat_demand_year(data_frames, labels, start_date, end_date, line_colors
     # Adjust layout and display subplots
     plt.tight_layout()
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
+    if not show:
+        return fig
     plt.show()
 
-def plot_elec_demand_hour(data_frames, labels, target_dates, line_colors, face_colors):
+@instrumented
+def plot_elec_demand_hour(data_frames, labels, target_dates, line_colors, face_colors, bands=None, show=True):
 # Convert target dates to datetime objects (remove this line to use the provided target_dates)
     target_dates = pd.to_datetime(target_dates)
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
 
     # Create a figure with 4 subplots for each DataFrame
     num_data_frames = len(data_frames)
@@ -214,6 +260,10 @@ def plot_elec_demand_hour(data_frames, labels, target_dates, line_colors, face_c
         hourly_max = df.max(axis=1)
         hourly_mean = df.mean(axis=1)
 
+        # Percentiles of the configured bands instead of min and max, e.g. bands=[(5, 95), (25, 75)]
+        if bands is not None:
+            hourly_bands = row_percentiles(df, band_percentiles(bands))
+
         for j, target_date in enumerate(target_dates):
             start_time = target_date
             end_time = target_date + pd.DateOffset(hours=23)
@@ -226,13 +276,16 @@ def plot_elec_demand_hour(data_frames, labels, target_dates, line_colors, face_c
 
             # Plot min, mean, and max values on the current subplot with customizable colors
             line_color = line_colors[i % len(line_colors)]  # Cycle through colors
-            ax.plot(filtered_min.index, filtered_min, label='Min', linewidth=0.5, color=line_color)
-            ax.plot(filtered_mean.index, filtered_mean, label='Mean', linewidth=2, color=line_color)
-            ax.plot(filtered_max.index, filtered_max, label='Max', linewidth=0.5, color=line_color)
-            
             face_color = face_colors[i % len(face_colors)]  # Cycle through colors
-            ax.fill_between(filtered_mean.index, filtered_min, filtered_mean, facecolor=face_color, alpha=0.2)
-            ax.fill_between(filtered_mean.index, filtered_mean, filtered_max, facecolor=face_color, alpha=0.2)
+            if bands is not None:
+                plot_bands(ax, filtered_mean, hourly_bands[start_time:end_time], bands, line_color, face_color)
+            else:
+                ax.plot(filtered_min.index, filtered_min, label='Min', linewidth=0.5, color=line_color)
+                ax.plot(filtered_mean.index, filtered_mean, label='Mean', linewidth=2, color=line_color)
+                ax.plot(filtered_max.index, filtered_max, label='Max', linewidth=0.5, color=line_color)
+
+                ax.fill_between(filtered_mean.index, filtered_min, filtered_mean, facecolor=face_color, alpha=0.2)
+                ax.fill_between(filtered_mean.index, filtered_mean, filtered_max, facecolor=face_color, alpha=0.2)
 
             ax.set_xticks(filtered_mean.index)
 
@@ -264,9 +317,13 @@ def plot_elec_demand_hour(data_frames, labels, target_dates, line_colors, face_c
     # Display the subplots
     plt.tight_layout()
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
+    if not show:
+        return fig
     plt.show()
 
-def plot_electricity_demand_month(data_frames, labels, line_colors, face_colors, date_ranges):
+@instrumented
+def plot_electricity_demand_month(data_frames, labels, line_colors, face_colors, date_ranges, bands=None, max_points='auto', show=True):
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
     if len(data_frames) != len(labels) or len(data_frames) != len(line_colors) or len(data_frames) != len(face_colors):
         raise ValueError("The number of DataFrames, labels, line_colors, and face_colors must match.")
 
@@ -289,12 +346,14 @@ def plot_electricity_demand_month(data_frames, labels, line_colors, face_colors,
 
             ax = axs[i, j]
 
-            ax.plot(df_filtered.index, monthly_min, label='Min', linewidth=0.5, color=line_colors[i])
-            ax.plot(df_filtered.index, monthly_mean, label='Mean', linewidth=2, color=line_colors[i])
-            ax.plot(df_filtered.index, monthly_max, label='Max', linewidth=0.5, color=line_colors[i])
+            if bands is not None:
+                plot_bands(ax, monthly_mean, row_percentiles(df_filtered, band_percentiles(bands)), bands, line_colors[i], face_colors[i], max_points)
+            else:
+                plot_line(ax, df_filtered.index, monthly_min, max_points, label='Min', linewidth=0.5, color=line_colors[i])
+                plot_line(ax, df_filtered.index, monthly_mean, max_points, label='Mean', linewidth=2, color=line_colors[i])
+                plot_line(ax, df_filtered.index, monthly_max, max_points, label='Max', linewidth=0.5, color=line_colors[i])
 
-            ax.fill_between(df_filtered.index, monthly_min, monthly_mean, facecolor=face_colors[i], alpha=0.2)
-            ax.fill_between(df_filtered.index, monthly_mean, monthly_max, facecolor=face_colors[i], alpha=0.2)
+                fill_band(ax, df_filtered.index, monthly_min, monthly_max, max_points, facecolor=face_colors[i], alpha=0.2)
 
             ax.set_xlim(start_date, end_date)
             ax.yaxis.tick_left()
@@ -319,9 +378,13 @@ def plot_electricity_demand_month(data_frames, labels, line_colors, face_colors,
         
     plt.tight_layout()
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
+    if not show:
+        return fig
     plt.show()
 
-def plot_electricity_demand_year(data_frames, labels, start_date, end_date, line_colors, face_colors):
+@instrumented
+def plot_electricity_demand_year(data_frames, labels, start_date, end_date, line_colors, face_colors, bands=None, max_points='auto', show=True):
+    data_frames, labels = as_frames(data_frames, labels)  # a UEUProfileSet gives one DataFrame per class
     start_date = pd.to_datetime(start_date, format='%Y-%m-%d')
     end_date = pd.to_datetime(end_date, format='%Y-%m-%d')
 
@@ -352,13 +415,16 @@ def plot_electricity_demand_year(data_frames, labels, start_date, end_date, line
 
             # Plot min, mean, and max values on the current subplot with specified colors
             ax = axs[i]  # Get the current subplot
-            ax.plot(filtered_df.index, min_values, label='Min', linewidth=0.5, color=line_color)
-            ax.plot(filtered_df.index, mean_values, label='Mean', linewidth=2, color=line_color)
-            ax.plot(filtered_df.index, max_values, label='Max', linewidth=0.5, color=line_color)
+            if bands is not None:
+                # Shade the configured percentile bands instead of min-mean-max
+                plot_bands(ax, mean_values, row_percentiles(filtered_df, band_percentiles(bands)), bands, line_color, face_color, max_points)
+            else:
+                plot_line(ax, filtered_df.index, min_values, max_points, label='Min', linewidth=0.5, color=line_color)
+                plot_line(ax, filtered_df.index, mean_values, max_points, label='Mean', linewidth=2, color=line_color)
+                plot_line(ax, filtered_df.index, max_values, max_points, label='Max', linewidth=0.5, color=line_color)
 
-            # Add shadows between min and mean, and between mean and max with specified facecolor
-            ax.fill_between(filtered_df.index, min_values, mean_values, facecolor=face_color, alpha=0.2)
-            ax.fill_between(filtered_df.index, mean_values, max_values, facecolor=face_color, alpha=0.2)
+                # Add a shadow between min and max with specified facecolor
+                fill_band(ax, filtered_df.index, min_values, max_values, max_points, facecolor=face_color, alpha=0.2)
 
             # Set subplot title and labels
             ax.set_ylabel('Normalized electricity demand')
@@ -383,8 +449,11 @@ def plot_electricity_demand_year(data_frames, labels, start_date, end_date, line
     # Adjust layout and display subplots
     plt.tight_layout()
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
+    if not show:
+        return fig
     plt.show()
 
+@instrumented
 def separate(dataframe, column_index):
     """
     Copy and convert a specific column from a DataFrame.
@@ -401,31 +470,63 @@ def separate(dataframe, column_index):
     copied_column = copied_column.astype(float)
     return copied_column
 
-def process_data(df, label):
-    for hour in range(24):
-        hour_str = f'{hour:02}:00'
-        df[hour_str] = 0
-
-    # Create a new timestamp column if it doesn't exist
-    if 'timestamp' not in df:
-        df['timestamp'] = pd.date_range(start='2100-01-01', periods=len(df), freq='H')
+@instrumented
+def day_hour_matrix(values, index=None):
+    """
+    Arrange hourly values as one row per day and one column per hour.
 
-    # Add day of the year information
-    df['day_of_year'] = df['timestamp'].dt.dayofyear
+    A regular hourly series starting at midnight is reshaped without copying, so the
+    result is a (365, 24) view of the input (366 rows in leap years). A 2-D input
+    (time x UEU) gives a (days, 24, UEU) view. Indices that are not regular, e.g. a
+    timezone-aware index with DST shifts, are placed by their wall-clock day and hour
+    instead: the repeated hour of a 25-hour day is averaged and the skipped hour of a
+    23-hour day is NaN.
 
-    # Loop through hours from 00:00 to 23:00 and filter data
-    for hour in range(24):
-        time_str = f'{hour:02}:00:00'
-        time = pd.to_datetime(time_str).time()
-        filtered_rows = df[df['timestamp'].dt.time == time]
-        column_name = f'{hour:02}:00'
-        df[column_name] = filtered_rows[label]
+    Parameters:
+        values (pd.Series, pd.DataFrame or np.ndarray): Hourly values.
+        index (pd.DatetimeIndex, optional): Time index, taken from values if it is a pandas object.
 
-    # Drop the 'UEU1_ht' and 'timestamp' columns
-    df = df.drop([label, 'timestamp' , 'day_of_year'], axis=1)
+    Returns:
+        np.ndarray: The day x hour matrix.
+    """
+    if index is None and isinstance(values, (pd.Series, pd.DataFrame)):
+        index = values.index
+    values = np.asarray(values)
+
+    if not isinstance(index, pd.DatetimeIndex) or _is_regular_hourly(index):
+        if len(values) % 24 != 0:
+            raise ValueError("The number of hourly values must be a multiple of 24.")
+        return values.reshape((len(values) // 24, 24) + values.shape[1:])
+
+    # Wall-clock day and hour of every value
+    days = (index.normalize().tz_localize(None) - index[0].normalize().tz_localize(None)).days.to_numpy()
+    hours = index.hour.to_numpy()
+    n_days = days.max() + 1
+
+    sums = np.zeros((n_days, 24) + values.shape[1:])
+    counts = np.zeros((n_days, 24) + (1,) * (values.ndim - 1))
+    np.add.at(sums, (days, hours), values)
+    np.add.at(counts, (days, hours), 1)
+    with np.errstate(invalid='ignore'):
+        return sums / counts
+
+def _is_regular_hourly(index):
+    # Hourly steps without gaps or DST shifts, starting at midnight
+    if len(index) == 0 or index[0].hour != 0 or index[0].minute != 0:
+        return False
+    # Wall-clock steps, a DST change shows up as a 0 or 2 hour step
+    local = index.tz_localize(None) if index.tz is not None else index
+    return bool((np.diff(local.asi8) == 3_600_000_000_000).all())
+
+@instrumented
+def process_data(df, label):
+    # Day x hour layout of the hourly values of the column label (one row per day, one column per hour)
+    index = df.index if isinstance(df.index, pd.DatetimeIndex) else None
+    matrix = day_hour_matrix(df[label].to_numpy(), index)
 
-    return df
+    return pd.DataFrame(matrix, columns=[f'{hour:02}:00' for hour in range(24)])
 
+@instrumented
 def filter_dataframe(df):
     df_plot = pd.DataFrame()
     
@@ -434,7 +535,8 @@ def filter_dataframe(df):
     
     return df_plot
 
-def plot_energy_demand_distribution(data_frames, labels):
+@instrumented
+def plot_energy_demand_distribution(data_frames, labels, show=True):
     # Create a figure with rows for each DataFrame
     num_data_frames = len(data_frames)
     fig, axs = plt.subplots(num_data_frames, 1, figsize=(25, 32), sharey=True)
@@ -474,4 +576,6 @@ def plot_energy_demand_distribution(data_frames, labels):
     # Adjust layout and display subplots
     plt.tight_layout()
     plt.subplots_adjust(wspace=0.1, hspace=0.2)
+    if not show:
+        return fig
     plt.show()
\ No newline at end of file
@@ -0,0 +1,126 @@
+# Aggregation of UEU profiles into energy districts with sparse membership matrices
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scripts.profile_set import UEUProfileSet
+from scripts.profile_store import write_profile_store
+
+
+def membership_matrix(members, ueu_ids, weight=None, district='district', key='unique_identifier'):
+    """
+    Sparse (district x UEU) membership matrix from a table of district members.
+
+    Parameters:
+        members (pd.DataFrame): One row per (district, UEU) pair. A UEU can belong to several
+            districts, e.g. when several candidate layouts are evaluated at once.
+        ueu_ids (array-like): unique_identifier of every column of the profile matrix.
+        weight (str, optional): Column with the weight of every pair (e.g. 'area_ha' or the
+            number of households), 1 if None.
+        district (str): Column with the district name.
+        key (str): Column with the unique_identifier.
+
+    Returns:
+        tuple: (membership, districts) with a CSR matrix and the district names of its rows.
+    """
+    columns = pd.Index(ueu_ids).get_indexer(members[key])
+    if (columns < 0).any():
+        missing = members[key][columns < 0].unique().tolist()
+        raise KeyError(f"UEUs not found in the profiles: {missing[:10]}")
+
+    rows, districts = pd.factorize(members[district], sort=False)
+    data = np.ones(len(members)) if weight is None else members[weight].to_numpy(dtype=np.float64)
+    membership = sparse.csr_matrix((data, (rows, columns)), shape=(len(districts), len(ueu_ids)))
+    return membership, pd.Index(districts, name=district)
+
+
+def membership_from_geometries(spatial_index, geometries, ueu_ids, weights=None, predicate='intersects'):
+    """
+    Membership matrix of district polygons, using the UEUs of a UEUSpatialIndex that fall in each one.
+
+    Parameters:
+        spatial_index (UEUSpatialIndex): Index of the UEU geometries.
+        geometries (pd.Series): District polygons indexed by district name.
+        ueu_ids (array-like): unique_identifier of every column of the profile matrix.
+        weights (pd.Series, optional): Weight of every UEU, indexed by unique_identifier.
+    """
+    pairs = []
+    for name, geometry in geometries.items():
+        found = spatial_index.ueus_in(geometry, predicate)
+        pairs.append(pd.DataFrame({'district': name, spatial_index.key: found[spatial_index.key]}))
+    members = pd.concat(pairs, ignore_index=True).rename(columns={spatial_index.key: 'unique_identifier'})
+    if weights is not None:
+        members['weight'] = weights.reindex(members['unique_identifier']).to_numpy()
+    return membership_matrix(members, ueu_ids, None if weights is None else 'weight')
+
+
+def district_loads(membership, profiles, districts=None, index=None):
+    """
+    Hourly load of every district with one sparse-dense product.
+
+    With normalised profiles (e.g. per hectare) and the matching weights (e.g. the area),
+    every district gets the weighted sum of the profiles of its UEUs.
+
+    Parameters:
+        membership (scipy.sparse matrix): (district x UEU) weights, see membership_matrix.
+        profiles (UEUProfileSet, pd.DataFrame or np.ndarray): Profile matrix (time x UEU), in
+            the column order used for the membership matrix.
+        districts (array-like, optional): Names of the districts, the result columns.
+        index (pd.Index, optional): Time index, taken from profiles if None.
+
+    Returns:
+        pd.DataFrame: (time x district)
+    """
+    if isinstance(profiles, UEUProfileSet):
+        index = profiles.index if index is None else index
+        values = profiles.values
+    elif isinstance(profiles, pd.DataFrame):
+        index = profiles.index if index is None else index
+        values = profiles.to_numpy()
+    else:
+        values = np.asarray(profiles)
+
+    # (district x UEU) @ (UEU x time): the transposed column-major matrix is row-major, no copy
+    loads = membership.tocsr() @ values.T
+    return pd.DataFrame(np.asarray(loads).T, index=index, columns=districts)
+
+
+class DistrictHierarchy:
+    """
+    Materialised rollups of the profiles through several levels, e.g. UEU -> district -> city.
+
+    Every level is given by a membership matrix of its units over the units of the level
+    below; the first level is over the UEU profiles. The loads of each level are computed
+    from the level below, so the profile matrix is only read once.
+    """
+
+    def __init__(self):
+        self.levels = []
+
+    def add_level(self, name, membership, units):
+        """Add a level with its (unit x lower unit) membership matrix and the names of its units."""
+        self.levels.append((name, membership.tocsr(), pd.Index(units)))
+        return self
+
+    def rollup(self, profiles, index=None):
+        """
+        Loads of every level.
+
+        Returns:
+            dict: {level name: DataFrame (time x unit)}
+        """
+        aggregates = {}
+        lower = profiles
+        for name, membership, units in self.levels:
+            lower = district_loads(membership, lower, units, index)
+            aggregates[name] = lower
+        return aggregates
+
+    @staticmethod
+    def save(aggregates, path):
+        """Write the aggregates of rollup() as one profile store per level under path."""
+        stores = {}
+        for name, loads in aggregates.items():
+            stores[name] = write_profile_store(loads, pd.DataFrame({'unique_identifier': loads.columns.astype(str)}),
+                                               os.path.join(path, name))
+        return stores
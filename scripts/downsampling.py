@@ -0,0 +1,137 @@
+# Visually lossless downsampling of long series before plotting
+import numpy as np
+import pandas as pd
+
+METHODS = ('minmax', 'lttb')
+
+
+def minmax_indices(y, n_buckets):
+    """
+    Positions of the minimum and maximum of every bucket, in time order.
+
+    With one bucket per pixel column this draws the same vertical extent in every column
+    as the full series, so no peak or trough is lost. The first and last point are kept.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    filled = np.where(np.isnan(y), np.inf, y)
+    lowest = starts + _reduceat_arg(filled, starts, np.minimum)
+    filled = np.where(np.isnan(y), -np.inf, y)
+    highest = starts + _reduceat_arg(filled, starts, np.maximum)
+    return np.unique(np.concatenate(([0, n - 1], lowest, highest)))
+
+
+def _reduceat_arg(values, starts, ufunc):
+    # Offset of the reduced value (first occurrence) within every bucket
+    reduced = ufunc.reduceat(values, starts)
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(values))))
+    hit = values == reduced[bucket]
+    positions = np.arange(len(values)) - starts[bucket]
+    # First hit of every bucket
+    first = np.full(len(starts), np.iinfo(np.int64).max)
+    np.minimum.at(first, bucket[hit], positions[hit])
+    return first
+
+
+def lttb_indices(y, n_out, x=None):
+    """
+    Positions kept by Largest-Triangle-Three-Buckets, n_out points including the first and last.
+
+    LTTB keeps the shape of the series with fewer points than minmax, but a single spike
+    can be dropped when its bucket has a larger triangle elsewhere.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        # Average of the next bucket (the last point for the last bucket)
+        next_start, next_end = end, edges[b + 2] if b + 2 < len(edges) else n
+        next_x, next_y = x[next_start:next_end].mean(), np.nanmean(y[next_start:next_end])
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.nanargmax(areas)) if np.isfinite(areas).any() else start
+        kept[b + 1] = previous
+    return kept
+
+
+def band_indices(lower, upper, n_buckets):
+    """
+    Positions of a band between lower and upper kept for n_buckets buckets.
+
+    The minmax positions of both bounds, so the band reaches the lowest lower and the
+    highest upper value of every bucket. Both bounds are taken at the same positions, so
+    the band keeps its true shape between them instead of filling each bucket solid.
+    """
+    return np.union1d(minmax_indices(lower, n_buckets), minmax_indices(upper, n_buckets))
+
+
+def axes_buckets(ax):
+    """Width of the axes in pixels, one bucket per pixel column."""
+    return max(1, int(np.ceil(ax.get_window_extent().width)))
+
+
+def _buckets(ax, n, max_points):
+    # Number of buckets for n points, None when the series is drawn as is
+    if max_points is None:
+        return None
+    buckets = axes_buckets(ax) if max_points == 'auto' else int(max_points)
+    return buckets if n > 2 * buckets else None
+
+
+def downsample(series, n_buckets, method='minmax'):
+    """Subset of a Series (or array) keeping its visual shape, see minmax_indices and lttb_indices."""
+    values = series.to_numpy() if isinstance(series, pd.Series) else np.asarray(series)
+    if method == 'minmax':
+        positions = minmax_indices(values, n_buckets)
+    elif method == 'lttb':
+        positions = lttb_indices(values, 2 * n_buckets)
+    else:
+        raise ValueError(f"Unknown method {method}, use one of {METHODS}.")
+    return series.iloc[positions] if isinstance(series, pd.Series) else values[positions]
+
+
+def plot_line(ax, x, y, max_points='auto', method='minmax', **kwargs):
+    """
+    ax.plot(x, y) of a series reduced to about one bucket per pixel column of the axes.
+
+    max_points: 'auto' (axes width), a number of buckets, or None to draw every point.
+    """
+    y = np.asarray(y)
+    buckets = _buckets(ax, len(y), max_points)
+    if buckets is not None:
+        if method == 'minmax':
+            positions = minmax_indices(y, buckets)
+        elif method == 'lttb':
+            positions = lttb_indices(y, 2 * buckets)
+        else:
+            raise ValueError(f"Unknown method {method}, use one of {METHODS}.")
+        x, y = np.asarray(x)[positions], y[positions]
+    return ax.plot(x, y, **kwargs)
+
+
+def fill_band(ax, x, lower, upper, max_points='auto', **kwargs):
+    """
+    ax.fill_between(x, lower, upper) of a band reduced to about one bucket per pixel column (see band_indices).
+
+    Draw adjacent bands (e.g. min-mean and mean-max) as one band (min-max): reduced
+    separately, their shared bound would be kept at different positions and they would overlap.
+    """
+    lower, upper = np.asarray(lower), np.asarray(upper)
+    buckets = _buckets(ax, len(lower), max_points)
+    if buckets is not None:
+        positions = band_indices(lower, upper, buckets)
+        x, lower, upper = np.asarray(x)[positions], lower[positions], upper[positions]
+    return ax.fill_between(x, lower, upper, **kwargs)
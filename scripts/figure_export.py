@@ -0,0 +1,191 @@
+# Batch export of the report figures from precomputed class statistics, headless and in parallel
+import os
+import time
+import numpy as np
+import pandas as pd
+from scripts.grouped_stats import grouped_statistics, STATS
+from scripts.tables import window_positions, calendar_windows
+from scripts.parallel import process_pool
+from scripts.downsampling import axes_buckets, minmax_indices, band_indices
+
+# Colors of the classes, as in the notebook
+COLORS = ['red', 'blue', 'green', 'orange', 'purple', 'lightseagreen', 'magenta', 'steelblue']
+
+FORMATS = ('png', 'svg', 'pdf')
+
+
+def precompute_statistics(profiles, resolutions=('h', 'D'), labels=None, classes=None):
+    """
+    Per-class min, max and mean of the profiles at several resolutions, computed once for all figures.
+
+    The hourly statistics are taken across the hourly profiles; the coarser ones across the
+    resampled profiles (e.g. the daily sum of every UEU), as in the notebook plots.
+
+    Parameters:
+        profiles (UEUProfileSet or pd.DataFrame): Hourly profiles (time x UEU).
+        resolutions (tuple): 'h' and/or keys of resampling_fn.RESOLUTIONS.
+        labels (array-like, optional): Class of every column of a DataFrame.
+
+    Returns:
+        dict: {resolution: GroupedStatistics}
+    """
+    from scripts.profile_set import UEUProfileSet
+    from scripts.resampling_fn import resample_multi
+
+    if isinstance(profiles, UEUProfileSet):
+        labels, classes = profiles.labels, profiles.classes if classes is None else classes
+        frame = profiles.frame()
+    else:
+        frame = profiles
+    labels = np.asarray(frame.columns if labels is None else labels).astype(str)
+
+    statistics = {}
+    coarse = [r for r in resolutions if r != 'h']
+    if 'h' in resolutions:
+        statistics['h'] = grouped_statistics(frame, labels, classes)
+    if coarse:
+        # Resampling drops the columns with only zeros or NaN, keep the labels of the others
+        frame = pd.DataFrame(frame.to_numpy(), index=frame.index, columns=np.arange(frame.shape[1]), copy=False)
+        resampled = resample_multi(frame, tuple(coarse), ('sum',))
+        for resolution in coarse:
+            table = resampled[resolution]['sum']
+            statistics[resolution] = grouped_statistics(table, labels[table.columns.to_numpy()], classes)
+    return statistics
+
+
+def statistics_from_resampled(resampled, resolution='D', stat='sum'):
+    """GroupedStatistics of a resolution from {class: resample_multi result} (e.g. parallel.map_classes)."""
+    classes = list(resampled)
+    tables = [resampled[cls][resolution][stat] for cls in classes]
+    labels = np.concatenate([np.full(table.shape[1], cls) for cls, table in zip(classes, tables)])
+    return grouped_statistics(pd.concat(tables, axis=1), labels, classes)
+
+
+def report_jobs(statistics, output_path, windows=None, classes=None, formats=('png',), ylabel='Normalized energy demand'):
+    """
+    One figure job per class, resolution and time window.
+
+    Parameters:
+        statistics (dict): {resolution: GroupedStatistics}, see precompute_statistics.
+        output_path (str): Folder of the figures.
+        windows (list, optional): (name, start, end) of every window. The year and the
+            meteorological seasons of the statistics if None.
+        classes (list, optional): Classes to draw, all if None.
+        formats (tuple): Any of FORMATS, every figure is written in each of them.
+
+    Returns:
+        list: Jobs for export_figures, each with the data it draws (no frames are shared).
+    """
+    jobs = []
+    for resolution, grouped in statistics.items():
+        index = grouped.index
+        if windows is None:
+            start, end = index[0], index[-1]
+            resolution_windows = [('year', start, end)] + [
+                (f'season_{s:%Y-%m}', s, e) for s, e in calendar_windows(start, end, 'season')]
+        else:
+            resolution_windows = windows
+        for code, cls in enumerate(grouped.classes):
+            if classes is not None and cls not in classes:
+                continue
+            position = grouped.classes.index(cls)
+            for name, start, end in resolution_windows:
+                first, last = window_positions(index, start, end)
+                if last <= first:
+                    continue
+                values = grouped.values[position, :, first:last]
+                stem = os.path.join(output_path, f'{cls}_{resolution}_{name}')
+                jobs.append({'title': f'{cls} ({resolution}, {name})',
+                             'index': index[first:last].to_numpy(),
+                             'min': values[STATS.index('min')], 'max': values[STATS.index('max')],
+                             'mean': values[STATS.index('mean')],
+                             'color': COLORS[code % len(COLORS)], 'ylabel': ylabel,
+                             'paths': [f'{stem}.{fmt}' for fmt in formats]})
+    return jobs
+
+
+class FigureTemplate:
+    """
+    Figure and axes reused for every job of a worker: only the data, limits and title change.
+
+    Uses the Agg canvas directly, so no pyplot state or GUI backend is involved.
+    """
+
+    def __init__(self, figsize=(12, 4), dpi=100):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        import matplotlib.dates as mdates
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.mean_line, = self.ax.plot([], [], linewidth=2, label='Mean')
+        self.min_line, = self.ax.plot([], [], linewidth=0.5, label='Min')
+        self.max_line, = self.ax.plot([], [], linewidth=0.5, label='Max')
+        self.band = None
+        self.ax.set_xlabel('Date')
+        self.ax.grid(True)
+        locator = mdates.AutoDateLocator()
+        self.ax.xaxis.set_major_locator(locator)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+    def render(self, job):
+        x = job['index']
+        # Long windows are reduced to the min and max of every pixel column (see downsampling)
+        buckets = axes_buckets(self.ax)
+        for line, key in ((self.mean_line, 'mean'), (self.min_line, 'min'), (self.max_line, 'max')):
+            positions = minmax_indices(job[key], buckets)
+            line.set_data(x[positions], job[key][positions])
+        for line in (self.mean_line, self.min_line, self.max_line):
+            line.set_color(job['color'])
+        if self.band is not None:
+            self.band.remove()
+        positions = band_indices(job['min'], job['max'], buckets)
+        self.band = self.ax.fill_between(x[positions], job['min'][positions], job['max'][positions], facecolor=job['color'], alpha=0.2, label='Min-Max')
+
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.ax.set_title(job['title'])
+        self.ax.set_ylabel(job['ylabel'])
+        self.ax.legend(loc='upper right')
+        for path in job['paths']:
+            self.figure.savefig(path)
+
+
+def _render_batch(jobs, figsize, dpi):
+    # Runs in a worker: one template for all its jobs
+    template = FigureTemplate(figsize, dpi)
+    timings = []
+    for job in jobs:
+        start = time.perf_counter()
+        template.render(job)
+        timings.append({'title': job['title'], 'paths': job['paths'], 'seconds': time.perf_counter() - start})
+    return timings
+
+
+def export_figures(jobs, max_workers=None, figsize=(12, 4), dpi=100):
+    """
+    Render the figure jobs over a process pool and write them to disk.
+
+    The jobs are split in one batch per worker, so each worker builds its figure once.
+    max_workers=1 renders in this process.
+
+    Returns:
+        pd.DataFrame: Title, output files and render time (seconds) of every figure.
+    """
+    if not jobs:
+        return pd.DataFrame(columns=['title', 'paths', 'seconds'])
+    for path in {os.path.dirname(p) for job in jobs for p in job['paths']}:
+        if path and not os.path.exists(path):
+            os.makedirs(path)
+
+    max_workers = min(max_workers or os.cpu_count(), len(jobs))
+    if max_workers == 1:
+        timings = _render_batch(jobs, figsize, dpi)
+    else:
+        batches = [jobs[i::max_workers] for i in range(max_workers)]
+        # Spawned workers (parallel.START_METHOD), as this is called from threaded hosts
+        with process_pool(max_workers) as executor:
+            timings = [t for batch in executor.map(_render_batch, batches, [figsize] * max_workers, [dpi] * max_workers)
+                       for t in batch]
+    return pd.DataFrame(timings)
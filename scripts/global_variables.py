@@ -1,9 +1,11 @@
 import os
 
-root_path = os.path.dirname(os.path.dirname(__file__))
-database_path = root_path + "\\Database"
-input_path = root_path + '\\input'
-output_path = root_path + '\\output'
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+database_path = os.path.join(root_path, 'Database')
+input_path = os.path.join(root_path, 'input')
+output_path = os.path.join(root_path, 'output')
+# Created by the caches when they first write to it
+cache_path = os.path.join(root_path, 'cache')
 
 # #-------------------------------------------------
 # # Here I want to make a process to automatically create a folder exactly empty for the initialization of a new project
@@ -14,4 +16,4 @@ if not os.path.exists(input_path):
 #-------------------------------------------------
 # output folder
 if not os.path.exists(output_path):
-    os.mkdir(output_path)
\ No newline at end of file
+    os.mkdir(output_path)
@@ -0,0 +1,143 @@
+# Grouped statistics per UEU class
+import numpy as np
+import pandas as pd
+from scripts.profile_set import UEUProfileSet, _natural_key
+
+STATS = ('min', 'max', 'mean', 'count', 'sum')
+
+
+class GroupedStatistics:
+    """
+    Per-class, per-timestep statistics of a profile matrix.
+
+    values has the shape (class, stat, time), with the stats ordered as in STATS.
+    """
+
+    def __init__(self, values, classes, index):
+        self.values = values
+        self.classes = list(classes)
+        self.index = index
+
+    def __repr__(self):
+        return f'GroupedStatistics(classes={self.classes}, steps={len(self.index)})'
+
+    def stat(self, stat):
+        """2-D array (class, time) of one statistic."""
+        return self.values[:, STATS.index(stat), :]
+
+    def frame(self, stat, classes=None, labels=None):
+        """
+        DataFrame (time x class) of one statistic.
+
+        Parameters:
+            stat (str): One of STATS.
+            classes (list, optional): Classes to include, all classes if None.
+            labels (list, optional): Column names, the class names if None.
+        """
+        classes = self.classes if classes is None else list(classes)
+        positions = [self.classes.index(c) for c in classes]
+        data = self.values[positions, STATS.index(stat), :].T
+        return pd.DataFrame(data, index=self.index, columns=labels if labels is not None else classes)
+
+    def series(self, cls, stat):
+        """Series of one statistic of one class."""
+        return pd.Series(self.values[self.classes.index(cls), STATS.index(stat), :], index=self.index, name=cls)
+
+    def merge(self, other):
+        """Combine with the statistics of other columns (same classes and timesteps), e.g. another chunk."""
+        if self.classes != other.classes:
+            raise ValueError("Only statistics of the same classes can be merged.")
+        values = np.empty_like(self.values)
+        values[:, 0, :] = np.fmin(self.values[:, 0, :], other.values[:, 0, :])
+        values[:, 1, :] = np.fmax(self.values[:, 1, :], other.values[:, 1, :])
+        values[:, 3, :] = self.values[:, 3, :] + other.values[:, 3, :]
+        values[:, 4, :] = self.values[:, 4, :] + other.values[:, 4, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values[:, 2, :] = values[:, 4, :] / values[:, 3, :]
+        return GroupedStatistics(values, self.classes, self.index)
+
+
+def grouped_statistics(profiles, labels=None, classes=None, index=None):
+    """
+    Compute min, max, mean, count and sum per class and timestep in one vectorised pass.
+
+    Columns are matched to their class by exact label, so 'UEU10' is not part of 'UEU1'.
+    NaN values are skipped as in DataFrame.min/max/mean(axis=1).
+
+    Parameters:
+        profiles (pd.DataFrame, np.ndarray or UEUProfileSet): Profile matrix (time x UEU).
+        labels (array-like, optional): Class label of every column. Defaults to the
+            column names of the DataFrame (e.g. the 'UEU' labels of section 3.1).
+        classes (list, optional): Classes to compute, in this order. Defaults to every
+            label, naturally sorted.
+        index (pd.Index, optional): Time index. Defaults to the index of the DataFrame.
+
+    Returns:
+        GroupedStatistics
+    """
+    if isinstance(profiles, UEUProfileSet):
+        if labels is None:
+            labels = profiles.labels
+        if index is None:
+            index = profiles.index
+        values = profiles.values
+    elif isinstance(profiles, pd.DataFrame):
+        if labels is None:
+            labels = profiles.columns
+        if index is None:
+            index = profiles.index
+        values = profiles.to_numpy()
+    else:
+        values = np.asarray(profiles)
+    if index is None:
+        index = pd.RangeIndex(values.shape[0])
+
+    labels = np.asarray(labels).astype(str)
+    if classes is None:
+        classes = sorted(set(labels), key=_natural_key)
+    classes = [str(c) for c in classes]
+
+    codes = pd.Index(classes).get_indexer(labels)
+    members = np.bincount(codes[codes >= 0], minlength=len(classes))
+
+    # Bring the columns of each class next to each other and reduce every block at once
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    block = values[:, order]
+    if block.dtype.kind != 'f':
+        block = block.astype(np.float64)
+
+    starts = np.concatenate(([0], np.cumsum(members)[:-1]))
+    n_steps, n_classes = values.shape[0], len(classes)
+    result = np.full((n_classes, len(STATS), n_steps), np.nan)
+
+    # reduceat needs strictly valid start positions: reduce the classes with columns only
+    # and leave the empty classes to be filled below
+    present = members > 0
+    if present.any():
+        starts = starts[present]
+
+        missing = np.isnan(block)
+        has_missing = missing.any()
+        filled = np.where(missing, 0, block) if has_missing else block
+
+        sums = np.add.reduceat(filled, starts, axis=1, dtype=np.float64)
+        if has_missing:
+            counts = np.add.reduceat(~missing, starts, axis=1, dtype=np.float64)
+        else:
+            counts = np.broadcast_to(members[present].astype(np.float64), sums.shape)
+
+        result[present, 0, :] = np.fmin.reduceat(block, starts, axis=1).T
+        result[present, 1, :] = np.fmax.reduceat(block, starts, axis=1).T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[present, 2, :] = (sums / counts).T
+        result[present, 3, :] = counts.T
+        result[present, 4, :] = sums.T
+
+    # Classes without columns
+    empty = members == 0
+    result[empty, :, :] = np.nan
+    result[empty, 3, :] = 0
+    result[empty, 4, :] = 0
+
+    return GroupedStatistics(result, classes, index)
@@ -0,0 +1,148 @@
+# Streaming ingest of minute-resolution resLoadSIM output
+import numpy as np
+import pandas as pd
+from scripts.profile_store import create_profile_store
+from scripts.parallel import process_pool
+
+# Minutes per output interval
+INTERVALS = {'15min': 15, 'h': 60}
+
+# Per-interval statistics of the minute values: energy (sum / 60, i.e. W-minute values to Wh), peak and min
+INGEST_STATS = ('energy', 'peak', 'min')
+
+# Rows of the minute file parsed at a time
+CHUNK_ROWS = 7 * 1440
+
+
+def _separator(filepath):
+    # resLoadSIM writes whitespace separated .dat files, exported tables are comma separated
+    return ',' if filepath.endswith('.csv') else r'\s+'
+
+
+def _data_columns(filepath, time_column):
+    # Positions and names of the columns other than the time column. The header of a .dat file
+    # is not split on whitespace as a whole: the default time column 'Time (h)' contains a
+    # space, so it is taken as the first column and the rest of the header is split
+    sep = _separator(filepath)
+    if sep == ',':
+        names = list(pd.read_csv(filepath, nrows=0).columns)
+    else:
+        with open(filepath) as f:
+            header = f.readline().strip()
+        if not header.startswith(time_column):
+            raise ValueError(f"{filepath} does not start with the time column {time_column!r}.")
+        names = [time_column] + header[len(time_column):].split()
+    positions = [i for i, name in enumerate(names) if name != time_column]
+    return positions, [names[i] for i in positions]
+
+
+def read_minute_profiles(filepath, interval='h', stats=('energy',), time_column='Time (h)', start='2100-01-01 00:00:00',
+                         chunk_rows=CHUNK_ROWS):
+    """
+    Stream a minute-resolution resLoadSIM output file and aggregate it while reading.
+
+    The file is parsed CHUNK_ROWS rows at a time and every chunk is reduced to its
+    intervals right away, so the 525,600-row minute table of a year never exists in memory.
+    The first row of the file has to be the start of an interval.
+
+    Parameters:
+        filepath (str): Minute file with a time column and one column per UEU (or household).
+        interval (str): Key of INTERVALS.
+        stats (tuple): Any of INGEST_STATS.
+        time_column (str): Column with the time, it is skipped. In a .dat file it has to be the first column.
+        start (str): Timestamp of the first interval.
+        chunk_rows (int): Rows parsed at a time, rounded down to whole intervals.
+
+    Returns:
+        dict: {stat: DataFrame (interval x column)}
+    """
+    steps = INTERVALS[interval]
+    unknown = [s for s in stats if s not in INGEST_STATS]
+    if unknown:
+        raise ValueError(f"Unknown statistics {unknown}, use any of {INGEST_STATS}.")
+
+    positions, columns = _data_columns(filepath, time_column)
+
+    chunk_rows = max(steps, chunk_rows // steps * steps)
+    parts = {stat: [] for stat in stats}
+    carry = None
+    # The columns are selected by position, the header was parsed above
+    for chunk in pd.read_csv(filepath, sep=_separator(filepath), header=None, skiprows=1, usecols=positions,
+                             dtype=np.float64, chunksize=chunk_rows):
+        values = chunk[positions].to_numpy()
+        if carry is not None:
+            values = np.concatenate([carry, values])
+        # Rows of an interval that continues in the next chunk
+        n_full = len(values) // steps * steps
+        carry = values[n_full:] if n_full < len(values) else None
+        blocks = values[:n_full].reshape(-1, steps, len(columns))
+        if 'energy' in stats:
+            parts['energy'].append(blocks.sum(axis=1) / 60)
+        if 'peak' in stats:
+            parts['peak'].append(blocks.max(axis=1))
+        if 'min' in stats:
+            parts['min'].append(blocks.min(axis=1))
+
+    if carry is not None:
+        raise ValueError(f"{filepath} does not end on a whole {interval} interval.")
+
+    result = {}
+    for stat in stats:
+        data = np.concatenate(parts[stat]) if parts[stat] else np.empty((0, len(columns)))
+        index = pd.date_range(start=start, periods=len(data), freq=interval)
+        result[stat] = pd.DataFrame(data, index=index, columns=columns)
+    return result
+
+
+def ingest_minute_files(filepaths, store_path, ueus=None, interval='h', stats=('energy',), time_column='Time (h)',
+                        start='2100-01-01 00:00:00', max_workers=None):
+    """
+    Aggregate several minute-resolution files in parallel (one file per process) into profile stores.
+
+    The energy is written to store_path, in the layout read by the rest of the pipeline
+    (see profile_store.open_profile_store); the other statistics go to store_path + '_peak'
+    and store_path + '_min'. The columns keep the order of the files. The energy is already
+    in Wh, so the division by 60 of section 2 is not needed on these stores.
+
+    Parameters:
+        filepaths (list): Minute files, all covering the same period.
+        store_path (str): Folder of the energy store.
+        ueus (pd.DataFrame, optional): UEU table indexed by the column names of the files (e.g. 'fid'
+            as string) with the columns to keep in the sidecar table, as in pickle_to_store.
+        max_workers (int, optional): Number of processes, os.cpu_count() if None.
+
+    Returns:
+        dict: {stat: store path}
+    """
+    filepaths = list(filepaths)
+    if max_workers == 1:
+        results = [read_minute_profiles(f, interval, stats, time_column, start) for f in filepaths]
+    else:
+        with process_pool(max_workers) as executor:
+            results = list(executor.map(read_minute_profiles, filepaths, [interval] * len(filepaths),
+                                        [stats] * len(filepaths), [time_column] * len(filepaths),
+                                        [start] * len(filepaths)))
+
+    lengths = {len(r[stats[0]]) for r in results}
+    if len(lengths) > 1:
+        raise ValueError("The minute files do not cover the same period.")
+
+    columns = [c for r in results for c in r[stats[0]].columns]
+    if ueus is None:
+        sidecar = pd.DataFrame({'unique_identifier': columns})
+    else:
+        sidecar = ueus.loc[columns].rename_axis('fid').reset_index()
+
+    stores = {}
+    for stat in stats:
+        path = store_path if stat == 'energy' else store_path + '_' + stat
+        matrix = create_profile_store(sidecar, path, results[0][stat].index)
+        position = 0
+        for r in results:
+            block = r[stat].to_numpy()
+            matrix[:, position:position + block.shape[1]] = block
+            position += block.shape[1]
+        matrix.flush()
+        del matrix
+        stores[stat] = path
+    return stores
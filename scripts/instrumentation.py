@@ -0,0 +1,186 @@
+# Opt-in timing and memory instrumentation of the pipeline functions
+import os
+import json
+import time
+import threading
+import functools
+import tracemalloc
+
+try:
+    import resource  # not available on Windows, the peak RSS is then left empty
+except ImportError:
+    resource = None
+
+# Set URBENPROFILE_PROFILE to a .jsonl (or .json trace) path to record from the start
+PROFILE_ENV = 'URBENPROFILE_PROFILE'
+
+_enabled = False
+_settings = {'path': None, 'format': 'jsonl', 'allocations': False}
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _shapes(args, kwargs):
+    # Shapes of the array-like arguments (and of the items of list arguments)
+    shapes = []
+    for value in list(args) + list(kwargs.values()):
+        if hasattr(value, 'shape'):
+            shapes.append(list(value.shape))
+        elif hasattr(value, 'values') and hasattr(value.values, 'shape'):
+            shapes.append(list(value.values.shape))
+        elif isinstance(value, (list, tuple)) and value and hasattr(value[0], 'shape'):
+            shapes.append([list(item.shape) for item in value if hasattr(item, 'shape')])
+    return shapes
+
+
+def instrumented(func):
+    """
+    Record wall time, CPU time, peak RSS, allocated bytes and input shapes of every call of func.
+
+    Nothing is recorded, and only a flag is checked, unless enable() was called.
+    """
+    name = f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        allocations = _settings['allocations'] and tracemalloc.is_tracing()
+        span = {'children_peak': 0}
+        if allocations:
+            span['memory'], _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        stack.append(span)
+
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            stack.pop()
+            record = {'name': name, 'start': start - _origin, 'wall_s': wall, 'cpu_s': cpu,
+                      'peak_rss_mb': _peak_rss_mb(), 'allocated_bytes': None, 'shapes': _shapes(args, kwargs),
+                      'depth': len(stack), 'thread': threading.get_ident(), 'pid': os.getpid()}
+            if allocations:
+                # The peak was reset by the nested calls, so it is the max of ours and theirs
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, span['children_peak'])
+                record['allocated_bytes'] = peak - span['memory']
+                if stack:
+                    stack[-1]['children_peak'] = max(stack[-1]['children_peak'], peak)
+            _record(record)
+
+    return wrapper
+
+
+def _record(record):
+    with _lock:
+        _records.append(record)
+        if _settings['path'] and _settings['format'] == 'jsonl':
+            with open(_settings['path'], 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+
+def enable(path=None, fmt=None, allocations=False):
+    """
+    Start recording the instrumented functions.
+
+    Parameters:
+        path (str, optional): File of the records. JSON lines are appended while running; a
+            trace (Chrome trace event format, readable by Perfetto or speedscope as a flame
+            graph) is written by disable(). Records are only kept in memory if None.
+        fmt (str, optional): 'jsonl' or 'trace', from the file extension if None (.json is a trace).
+        allocations (bool): Measure the allocated bytes with tracemalloc (slows down the calls).
+            The tracemalloc peak is shared by the whole process, so the allocated bytes are only
+            valid when one thread runs instrumented functions at a time (run_pipeline runs its
+            stages one by one while allocations are traced).
+    """
+    global _enabled
+    if fmt is None:
+        fmt = 'trace' if path and path.endswith('.json') else 'jsonl'
+    _settings.update(path=path, format=fmt, allocations=allocations)
+    if allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def tracing_allocations():
+    """Whether the allocated bytes are being recorded (see enable)."""
+    return _enabled and _settings['allocations']
+
+
+def disable():
+    """Stop recording and write the trace file. Returns the records."""
+    global _enabled
+    _enabled = False
+    if _settings['allocations'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    if _settings['path'] and _settings['format'] == 'trace':
+        write_trace(_settings['path'])
+    return records()
+
+
+def records():
+    with _lock:
+        return list(_records)
+
+
+def clear():
+    with _lock:
+        _records.clear()
+
+
+def write_trace(path, recorded=None):
+    """Write records as complete ('X') events of the Chrome trace event format."""
+    recorded = records() if recorded is None else recorded
+    events = [{'name': r['name'], 'ph': 'X', 'ts': r['start'] * 1e6, 'dur': r['wall_s'] * 1e6,
+               'pid': r['pid'], 'tid': r['thread'],
+               'args': {k: r[k] for k in ('cpu_s', 'peak_rss_mb', 'allocated_bytes', 'shapes')}}
+              for r in recorded]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    return path
+
+
+def report(recorded=None):
+    """Summary per function: calls, total and max wall time, total CPU time, max peak RSS and allocations."""
+    import pandas as pd
+
+    df = pd.DataFrame(records() if recorded is None else recorded)
+    if df.empty:
+        return df
+    return (df.groupby('name')
+              .agg(calls=('wall_s', 'size'), wall_s=('wall_s', 'sum'), max_wall_s=('wall_s', 'max'),
+                   cpu_s=('cpu_s', 'sum'), peak_rss_mb=('peak_rss_mb', 'max'), allocated_bytes=('allocated_bytes', 'max'))
+              .sort_values('wall_s', ascending=False))
+
+
+class profiling:
+    """Context manager around enable() and disable(), e.g. `with profiling('run.jsonl'): ...`."""
+
+    def __init__(self, path=None, fmt=None, allocations=False):
+        self.args = path, fmt, allocations
+
+    def __enter__(self):
+        enable(*self.args)
+        return self
+
+    def __exit__(self, *exc):
+        self.records = disable()
+
+
+if os.environ.get(PROFILE_ENV):
+    enable(os.environ[PROFILE_ENV])
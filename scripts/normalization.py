@@ -0,0 +1,61 @@
+# Normalization of the load profiles
+import numpy as np
+import pandas as pd
+
+# Divisor applied to the area in hectares for every normalization per area
+AREA_UNITS = {'ha': 1.0, 'm2': 10000.0}
+
+
+def normalize_profiles(profiles, area=None, per='ha', households=None, annual_share=True,
+                       decimals=None, copy=True):
+    """
+    Normalize the profile matrix per area or household and/or to its annual share.
+
+    Works on one float64 array through broadcasting: no rows are appended to the
+    frame, the index is never touched and at most one copy of the data is made
+    (none with copy=False, which normalizes the values of a float64 frame in place).
+
+    Parameters:
+        profiles (pd.DataFrame or np.ndarray): Profile matrix (time x UEU).
+        area (array-like, optional): Area of every column in hectares ('area_ha').
+        per (str): 'ha' or 'm2' to divide by the area, 'household' to divide by households.
+        households (array-like, optional): Number of households of every column.
+        annual_share (bool): Divide every column by its sum, so each value is the share of
+            the annual demand in that timestep (as in section 3.1 of the notebook).
+        decimals (int, optional): Round the result, e.g. 10 as in the notebook.
+        copy (bool): Work on a copy of the data.
+
+    Returns:
+        Same type as profiles, with the normalized values.
+    """
+    is_frame = isinstance(profiles, pd.DataFrame)
+    if is_frame:
+        values = profiles.to_numpy(dtype=np.float64, copy=copy)
+    else:
+        values = np.array(profiles, dtype=np.float64) if copy else np.asarray(profiles, dtype=np.float64)
+
+    divisor = None
+    if per in AREA_UNITS and area is not None:
+        divisor = np.asarray(area, dtype=np.float64) * AREA_UNITS[per]
+    elif per == 'household' and households is not None:
+        divisor = np.asarray(households, dtype=np.float64)
+    elif per not in AREA_UNITS and per != 'household':
+        raise ValueError(f"Unknown normalization {per}, use 'ha', 'm2' or 'household'.")
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if divisor is not None:
+            if divisor.shape != (values.shape[1],):
+                raise ValueError("One area or household value per column is needed.")
+            values /= divisor
+
+        if annual_share:
+            values /= values.sum(axis=0)
+
+    if decimals is not None:
+        np.round(values, decimals, out=values)
+
+    if is_frame:
+        if not copy and np.shares_memory(values, profiles.values):
+            return profiles
+        return pd.DataFrame(values, index=profiles.index, columns=profiles.columns, copy=False)
+    return values
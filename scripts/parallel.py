@@ -0,0 +1,165 @@
+# Parallel execution of per-class and per-column-block work over shared memory
+import os
+import multiprocessing
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory, util
+from concurrent.futures import ProcessPoolExecutor
+
+# Start method of the worker processes. Forking while other threads hold locks (e.g. the
+# concurrent stages of the pipeline, or the service) can leave the children blocked forever
+START_METHOD = 'spawn'
+
+# Shared memory blocks attached by this worker process, closed when the worker exits
+_attached = {}
+
+
+class SharedProfiles:
+    """
+    Profile matrix placed once in shared memory, to be read by the workers without pickling.
+
+    Use it as a context manager; the shared memory is released on exit.
+
+    Parameters:
+        values (np.ndarray): Profile matrix (time x UEU).
+        index (pd.DatetimeIndex, optional): Time index, used to build the DataFrames of the workers.
+    """
+
+    def __init__(self, values, index=None):
+        values = np.asarray(values)
+        self.order = 'F' if values.flags.f_contiguous else 'C'
+        self.shape = values.shape
+        self.dtype = values.dtype.str
+        self.index = index
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        self.values = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf, order=self.order)
+        self.values[...] = values
+
+    @property
+    def descriptor(self):
+        # Everything a worker needs to attach to the matrix
+        return self.shm.name, self.shape, self.dtype, self.order, self.index
+
+    def close(self):
+        self.values = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def process_pool(max_workers=None):
+    """
+    ProcessPoolExecutor with the START_METHOD workers, safe to create from a threaded host.
+
+    Spawned workers import the main module again, so a script that reaches this has to
+    keep its top-level code under `if __name__ == '__main__':` (notebooks don't need to).
+    """
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context(START_METHOD))
+
+
+def _attach(descriptor):
+    name, shape, dtype, order, _ = descriptor
+    if name not in _attached:
+        if not _attached:
+            # Run by multiprocessing when the worker exits normally
+            util.Finalize(None, _detach_all, exitpriority=10)
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=_attached[name].buf, order=order)
+
+
+def _detach_all():
+    while _attached:
+        _, shm = _attached.popitem()
+        shm.close()
+
+
+def _run_task(descriptor, func, columns, label, as_frame, kwargs, matrix=None):
+    # The owner process passes its own matrix, only the workers attach to it by name
+    matrix = _attach(descriptor) if matrix is None else matrix
+    values = matrix[:, columns]
+    if as_frame:
+        values = pd.DataFrame(values, index=descriptor[4], columns=label, copy=False)
+    # Results must not keep pointing to the shared memory, it is released after the map
+    return _detach(func(values, **kwargs), matrix)
+
+
+def _detach(result, matrix):
+    # Copy of the arrays, frames and series of a result (also inside dicts, lists and
+    # tuples) that are views of the shared matrix
+    if isinstance(result, np.ndarray):
+        return result.copy() if np.may_share_memory(result, matrix) else result
+    if isinstance(result, pd.Series):
+        return result.copy(deep=True) if np.may_share_memory(result.to_numpy(), matrix) else result
+    if isinstance(result, pd.DataFrame):
+        shared = any(np.may_share_memory(result.iloc[:, i].to_numpy(), matrix) for i in range(result.shape[1]))
+        return result.copy(deep=True) if shared else result
+    if isinstance(result, dict):
+        return {key: _detach(value, matrix) for key, value in result.items()}
+    if isinstance(result, (list, tuple)):
+        return type(result)(_detach(value, matrix) for value in result)
+    return result
+
+
+def map_column_blocks(func, shared, blocks, labels=None, as_frame=True, max_workers=None, **kwargs):
+    """
+    Apply func to blocks of columns of a SharedProfiles matrix over a process pool.
+
+    Each task gets a view of its columns in shared memory (as a DataFrame if as_frame),
+    so the data is never pickled to the workers. The results are returned in the order
+    of the blocks, so they are identical to running the same tasks serially
+    (max_workers=1 runs them in this process).
+
+    Parameters:
+        func: Module-level function func(block, **kwargs) (it has to be importable by the workers).
+        shared (SharedProfiles): The shared profile matrix.
+        blocks (list): Column slices or column position arrays, one per task.
+        labels (list, optional): Column names of every block when as_frame.
+        max_workers (int, optional): Number of processes, os.cpu_count() if None.
+
+    Returns:
+        list: The result of every block.
+    """
+    labels = labels if labels is not None else [None] * len(blocks)
+    descriptor = shared.descriptor
+
+    if max_workers == 1:
+        return [_run_task(descriptor, func, columns, label, as_frame, kwargs, shared.values)
+                for columns, label in zip(blocks, labels)]
+
+    with process_pool(max_workers) as executor:
+        futures = [executor.submit(_run_task, descriptor, func, columns, label, as_frame, kwargs)
+                   for columns, label in zip(blocks, labels)]
+        return [future.result() for future in futures]
+
+
+def column_blocks(n_columns, block_columns):
+    # Slices of at most block_columns columns
+    return [slice(start, min(start + block_columns, n_columns)) for start in range(0, n_columns, block_columns)]
+
+
+def map_classes(func, profile_set, classes=None, max_workers=None, **kwargs):
+    """
+    Apply func to the DataFrame of every class of a UEUProfileSet over a process pool.
+
+    Example:
+        from scripts.resampling_fn import resample_dataframes
+        resampled = map_classes(resample_dataframes, ueu_set)
+
+    Returns:
+        dict: {class: result}
+    """
+    classes = profile_set.classes if classes is None else list(classes)
+    bounds = [profile_set._bounds[cls] for cls in classes]
+    blocks = [slice(start, end) for start, end in bounds]
+    labels = [profile_set.ids[start:end] for start, end in bounds]
+
+    with SharedProfiles(profile_set.values, profile_set.index) as shared:
+        results = map_column_blocks(func, shared, blocks, labels, True, max_workers, **kwargs)
+    return dict(zip(classes, results))
@@ -0,0 +1,191 @@
+# Percentile envelopes of the load profiles
+import warnings
+import numpy as np
+import pandas as pd
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class QuantileSketch:
+    """
+    Mergeable per-timestep quantile sketch of the columns of a profile matrix (KLL).
+
+    Every timestep keeps the values seen so far in levels of compactors: the points of
+    level h stand for 2**h values each. When a level exceeds its capacity it is sorted and
+    every other point, starting at a random odd or even position, moves up one level. The
+    random offset makes the rank errors of the compactions cancel out on average instead
+    of accumulating, so a sketch built from many merged blocks (from_block, merge) keeps a
+    rank error of a few tenths of a percent on average (about 2 % at worst) at size=200.
+    The capacities decrease by 2/3 per level below the top one, which holds `size` points.
+
+    levels is a list of (time, points) arrays, NaN marks an empty slot.
+    """
+
+    def __init__(self, levels, size=200, rng=None):
+        self.levels = levels
+        self.size = size
+        self.rng = np.random.default_rng(rng)
+
+    @classmethod
+    def from_block(cls, block, size=200, rng=None):
+        """
+        Sketch of a (time x columns) block, NaN values are skipped.
+
+        rng (np.random.Generator or int, optional): Source of the compaction offsets; share
+            one generator between the blocks of a matrix for reproducible results.
+        """
+        block = np.array(block, dtype=np.float64)
+        return cls([block], size, rng)._compress()
+
+    @property
+    def count(self):
+        """Number of values summarised per timestep."""
+        return sum((~np.isnan(level)).sum(axis=1) * 2.0 ** h for h, level in enumerate(self.levels))
+
+    @property
+    def values(self):
+        """Points of all levels per timestep, sorted, with NaN padding last."""
+        return self._points()[0]
+
+    @property
+    def weights(self):
+        """Number of values every point of values stands for (0 for padding)."""
+        return self._points()[1]
+
+    def _points(self):
+        values = np.concatenate(self.levels, axis=1)
+        weights = np.concatenate([np.where(np.isnan(level), 0, 2.0 ** h) for h, level in enumerate(self.levels)], axis=1)
+        order = np.argsort(values, axis=1, kind='stable')  # NaN sorted last
+        return np.take_along_axis(values, order, axis=1), np.take_along_axis(weights, order, axis=1)
+
+    def merge(self, other):
+        """Merge with the sketch of another block of columns (same timesteps)."""
+        n_steps = len(self.levels[0])
+        empty = np.empty((n_steps, 0))
+        height = max(len(self.levels), len(other.levels))
+        levels = [np.concatenate([self.levels[h] if h < len(self.levels) else empty,
+                                  other.levels[h] if h < len(other.levels) else empty], axis=1)
+                  for h in range(height)]
+        return QuantileSketch(levels, max(self.size, other.size), self.rng)._compress()
+
+    def _capacity(self, h):
+        return max(2, int(np.ceil(self.size * (2 / 3) ** (len(self.levels) - 1 - h))))
+
+    def _compress(self):
+        # One pass from the bottom: a compaction only adds points to the level above
+        h = 0
+        while h < len(self.levels):
+            level = _trim(self.levels[h])
+            counts = (~np.isnan(level)).sum(axis=1)
+            over = counts > self._capacity(h)
+            if over.any():
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty((len(level), 0)))
+                level, promoted = self._compact(level, np.where(over, counts // 2, 0))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted], axis=1)
+            self.levels[h] = level
+            h += 1
+        return self
+
+    def _compact(self, level, pairs):
+        # level is sorted per timestep; the first 2 * pairs points of every row are halved
+        # and returned for the level above, an odd point out stays
+        width = pairs.max()
+        offsets = self.rng.integers(0, 2, len(level))[:, None]
+        positions = np.minimum(offsets + 2 * np.arange(width), level.shape[1] - 1)
+        promoted = np.take_along_axis(level, positions, axis=1)
+        promoted[np.arange(width) >= pairs[:, None]] = np.nan
+
+        remaining = level.copy()
+        remaining[np.arange(level.shape[1]) < 2 * pairs[:, None]] = np.nan
+        return _trim(remaining), promoted
+
+    def quantile(self, q):
+        """Quantile q (0..1) per timestep, NaN where no values were seen."""
+        values, weights = self._points()
+        total = weights.sum(axis=1, keepdims=True)
+        # Rank of the centre of every point, interpolated linearly between the points
+        centres = np.cumsum(weights, axis=1) - weights / 2
+        target = np.full((len(total), 1), q) * total
+        upper = _rowwise_searchsorted(centres, target)[:, 0]
+
+        n_points = (weights > 0).sum(axis=1)
+        upper = np.clip(upper, 1, np.maximum(n_points - 1, 1))
+        lower = upper - 1
+        rows = np.arange(len(total))
+
+        x0, x1 = centres[rows, lower], centres[rows, upper]
+        y0, y1 = values[rows, lower], values[rows, upper]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.clip((target[:, 0] - x0) / (x1 - x0), 0, 1)
+        result = np.where(n_points > 1, y0 + fraction * (y1 - y0), values[:, 0])
+        result[n_points == 0] = np.nan
+        return result
+
+
+def _trim(level):
+    # Sort every row (empty slots last) and drop the columns that are empty in all rows
+    level = np.sort(level, axis=1)
+    return level[:, :(~np.isnan(level)).sum(axis=1).max(initial=0)]
+
+
+def _rowwise_searchsorted(sorted_rows, targets):
+    # searchsorted of every row of targets in the same row of sorted_rows, in one call
+    n_rows, n_columns = sorted_rows.shape
+    scale = np.nanmax(np.abs(sorted_rows)) + np.nanmax(np.abs(targets)) + 1 if sorted_rows.size else 1
+    offsets = np.arange(n_rows)[:, None] * 2 * scale
+    flat = (sorted_rows + offsets).ravel()
+    positions = np.searchsorted(flat, (targets + offsets).ravel()).reshape(targets.shape)
+    return positions - np.arange(n_rows)[:, None] * n_columns
+
+
+def column_sketch(values, chunk_columns=2000, size=200, seed=0):
+    """Sketch of a (time x columns) matrix built from blocks of chunk_columns columns."""
+    sketch = None
+    rng = np.random.default_rng(seed)
+    for start in range(0, values.shape[1], chunk_columns):
+        block_sketch = QuantileSketch.from_block(values[:, start:start + chunk_columns], size, rng)
+        sketch = block_sketch if sketch is None else sketch.merge(block_sketch)
+    return sketch
+
+
+def row_percentiles(df, percentiles=PERCENTILES, chunk_columns=2000, size=200):
+    """
+    Percentiles across the columns of a DataFrame for every row.
+
+    Frames with at most `size` columns get exact percentiles (np.nanpercentile), wider
+    frames are summarised with a QuantileSketch built column block by column block.
+
+    Returns:
+        pd.DataFrame: One column per percentile, named 'P5', 'P25', ...
+    """
+    values = df.to_numpy(dtype=np.float64)
+    if values.shape[1] <= size:
+        with warnings.catch_warnings():
+            # All-NaN rows give NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            data = np.nanpercentile(values, percentiles, axis=1).T if values.shape[1] else \
+                np.full((len(df), len(percentiles)), np.nan)
+    else:
+        sketch = column_sketch(values, chunk_columns, size)
+        data = np.column_stack([sketch.quantile(p / 100) for p in percentiles])
+    return pd.DataFrame(data, index=df.index, columns=[f'P{p}' for p in percentiles])
+
+
+def percentile_envelope(profiles, labels=None, percentiles=PERCENTILES, chunk_columns=2000, size=200):
+    """
+    Percentile envelope (P5/P25/P50/P75/P95 by default) per class and timestep.
+
+    Parameters:
+        profiles (pd.DataFrame): Profile matrix (time x UEU).
+        labels (array-like, optional): Class label of every column, the column names if None.
+
+    Returns:
+        dict: {class: DataFrame (time x percentile)}
+    """
+    labels = np.asarray(profiles.columns if labels is None else labels).astype(str)
+    envelope = {}
+    for cls in pd.unique(labels):
+        envelope[cls] = row_percentiles(profiles.iloc[:, np.flatnonzero(labels == cls)],
+                                        percentiles, chunk_columns, size)
+    return envelope
@@ -0,0 +1,327 @@
+# Headless, staged pipeline runner (python -m scripts.pipeline pipeline.json)
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Colors of the classes in the figures, as in the notebook
+COLORS = ['red', 'blue', 'green', 'orange', 'purple', 'lightseagreen', 'magenta', 'steelblue']
+
+DEFAULT_CONFIG = {
+    # UEU table with the columns unique_identifier, UEU, area_ha, landuse and number_of_apartments
+    # (see read.RESIDENTIAL_WHERE), as used by the notebook; not part of the repository
+    'gpkg': 'Database/ueu_oldenburg.gpkg',
+    'pickle': 'input/ueu_electricity_load_profiles.pkl',
+    'store': 'input/ueu_electricity_load_profiles',
+    # Number of UEUs of a synthetic store (synthetic.synthetic_store) used instead of the gpkg and pickle
+    'synthetic': None,
+    'output': 'output',
+    'cache': None,
+    'workers': 4,
+    'datetime_index': {'start': '2100-01-01 00:00:00', 'end': '2100-12-31 23:00:00', 'freq': '1h'},
+    'classes': None,
+    'normalise': {'per': 'ha', 'annual_share': True, 'decimals': 10},
+    'resample': {'resolutions': ['D', 'W', 'M'], 'stats': ['sum']},
+    'tables': {'freqs': ['D', 'W', 'M', 'season']},
+    'figures': {'format': 'png', 'dpi': 100, 'plots': ['hour', 'month', 'year'],
+                'target_dates': ['2100-01-15', '2100-04-16', '2100-07-16', '2100-10-15'],
+                'date_ranges': [['2100-01-01', '2100-01-31'], ['2100-04-01', '2100-04-30'],
+                                ['2100-07-01', '2100-07-31'], ['2100-10-01', '2100-10-31']]},
+    'report': {'resolutions': ['h', 'D'], 'formats': ['png'], 'dpi': 100},
+}
+
+
+def load_config(filepath):
+    """
+    Read a JSON (or TOML) pipeline config on top of DEFAULT_CONFIG.
+
+    Relative paths are taken from the folder of the config file.
+    """
+    if filepath.endswith('.toml'):
+        import tomllib
+        with open(filepath, 'rb') as f:
+            user = tomllib.load(f)
+    else:
+        with open(filepath) as f:
+            user = json.load(f)
+
+    config = {}
+    for key, value in DEFAULT_CONFIG.items():
+        config[key] = {**value, **user.get(key, {})} if isinstance(value, dict) else user.get(key, value)
+
+    base = os.path.dirname(os.path.abspath(filepath))
+    for key in ('gpkg', 'pickle', 'store', 'output', 'cache'):
+        if config[key] is not None:
+            config[key] = os.path.normpath(os.path.join(base, config[key]))
+    return config
+
+
+# ---- Stages: func(config, *upstream values) -> value -------------------------------------------
+
+def _load(config):
+    from scripts.read import read_ueu_gpkg, RESIDENTIAL_WHERE
+
+    if config['gpkg'] is None:
+        # The UEU table is only needed to convert the pickle
+        return None
+    ueus = read_ueu_gpkg(config['gpkg'], columns=['unique_identifier', 'UEU', 'area_ha'], where=RESIDENTIAL_WHERE)
+    ueus.index = ueus.index.astype(str)
+    return ueus
+
+
+def _map_ids(config, ueus):
+    from scripts.profile_store import pickle_to_store, PROFILES_FILE
+
+    store, pickle = config['store'], config['pickle']
+    profiles_file = os.path.join(store, PROFILES_FILE)
+    if config['synthetic']:
+        from scripts.synthetic import synthetic_store
+
+        if not os.path.exists(profiles_file):
+            index = config['datetime_index']
+            synthetic_store(store, config['synthetic'], freq=index['freq'], year=pd.Timestamp(index['start']).year,
+                            classes=config['classes'])
+        return store
+    if pickle is None or not os.path.exists(pickle):
+        if not os.path.exists(profiles_file):
+            raise FileNotFoundError(f"Neither the pickle {pickle} nor the store {store} exists.")
+        # Store converted before (or ingested with ingest.ingest_minute_files)
+        return store
+    if os.path.exists(profiles_file) and os.path.getmtime(profiles_file) >= os.path.getmtime(pickle):
+        # Store already converted from this pickle
+        return store
+    if ueus is None:
+        raise ValueError("Converting the pickle needs the UEU table, set gpkg in the config.")
+    index = config['datetime_index']
+    datetime_index = pd.date_range(start=index['start'], end=index['end'], freq=index['freq'])
+    pickle_to_store(pickle, ueus, store, datetime_index)
+    return store
+
+
+def _normalise(config, store_path):
+    from scripts.profile_set import UEUProfileSet
+    from scripts.normalization import normalize_profiles
+
+    profiles = UEUProfileSet.from_store(store_path, classes=config['classes'])
+    values = normalize_profiles(profiles.values, area=profiles.areas, **config['normalise'])
+    profiles.values = np.asfortranarray(values, dtype=np.float32)
+    return profiles
+
+
+def _group(config, profiles):
+    from scripts.grouped_stats import grouped_statistics
+
+    return grouped_statistics(profiles)
+
+
+def _resample(config, profiles):
+    from scripts.parallel import map_classes
+    from scripts.resampling_fn import resample_multi
+
+    return map_classes(resample_multi, profiles, max_workers=config['workers'],
+                       resolutions=tuple(config['resample']['resolutions']), stats=tuple(config['resample']['stats']))
+
+
+def _tables(config, profiles):
+    from scripts.tables import calendar_windows, window_indicators
+
+    # The 'season' windows are the meteorological seasons (December-February, ...) clipped to
+    # the data, so a single year gives five windows with two partial winters: January-February
+    # and December
+    start, end = profiles.index[0], profiles.index[-1]
+    return {freq: window_indicators(profiles, None, calendar_windows(start, end, freq))
+            for freq in config['tables']['freqs']}
+
+
+def _export(config, grouped, resampled, tables):
+    from scripts.tables import grouped_date_range
+
+    output = config['output']
+    if not os.path.exists(output):
+        os.makedirs(output)
+
+    labels = [f'{cls}_el' for cls in grouped.classes]
+    files = []
+    for stat, frame in zip(('min', 'max', 'mean'), grouped_date_range(grouped, grouped.index[0], grouped.index[-1], labels=labels)):
+        files.append(os.path.join(output, f'e_{stat}_h_year.csv'))
+        frame.to_csv(files[-1], index=False)
+    for freq, table in tables.items():
+        files.append(os.path.join(output, f'e_windows_{freq}.csv'))
+        table.to_csv(files[-1], index=False)
+    # Mean of every class at every resolution
+    for resolution in config['resample']['resolutions']:
+        for stat in config['resample']['stats']:
+            means = pd.DataFrame({cls: result[resolution][stat].mean(axis=1) for cls, result in resampled.items()})
+            files.append(os.path.join(output, f'e_mean_{resolution}_{stat}.csv'))
+            means.to_csv(files[-1])
+    return files
+
+
+def _figures(config, profiles, resampled):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from scripts import create_plots
+
+    settings = config['figures']
+    output = os.path.join(config['output'], 'figures')
+    if not os.path.exists(output):
+        os.makedirs(output)
+
+    classes = profiles.classes
+    colors = (COLORS * (len(classes) // len(COLORS) + 1))[:len(classes)]
+    daily = [resampled[cls]['D']['sum'] for cls in classes] if 'D' in config['resample']['resolutions'] else profiles
+    start, end = profiles.index[0], profiles.index[-1]
+    calls = {'hour': lambda: create_plots.plot_elec_demand_hour(profiles, None, settings['target_dates'], colors, colors,
+                                                                show=False),
+             'month': lambda: create_plots.plot_electricity_demand_month(daily, classes, colors, colors,
+                                                                         [tuple(r) for r in settings['date_ranges']],
+                                                                         show=False),
+             'year': lambda: create_plots.plot_electricity_demand_year(daily, classes, start, end, colors, colors, show=False)}
+
+    files = []
+    for name in settings['plots']:
+        fig = calls[name]()
+        files.append(os.path.join(output, f'electricity_demand_{name}.{settings["format"]}'))
+        fig.savefig(files[-1], dpi=settings['dpi'])
+        plt.close(fig)
+    return files
+
+
+def _report(config, grouped, resampled):
+    from scripts.figure_export import statistics_from_resampled, report_jobs, export_figures
+
+    settings = config['report']
+    output = os.path.join(config['output'], 'report')
+    statistics = {resolution: grouped if resolution == 'h' else statistics_from_resampled(resampled, resolution)
+                  for resolution in settings['resolutions']
+                  if resolution == 'h' or resolution in config['resample']['resolutions']}
+    jobs = report_jobs(statistics, output, formats=tuple(settings['formats']))
+    timings = export_figures(jobs, max_workers=config['workers'], dpi=settings['dpi'])
+
+    timings_file = os.path.join(output, 'render_times.csv')
+    timings.to_csv(timings_file, index=False)
+    return [path for job in jobs for path in job['paths']] + [timings_file]
+
+
+# name: (upstream stages, function, input files, config keys that change the result, writes files)
+STAGES = {
+    'load': ((), _load, ('gpkg',), (), False),
+    'map_ids': (('load',), _map_ids, ('pickle',), ('datetime_index', 'store', 'synthetic', 'classes'), True),
+    'normalise': (('map_ids',), _normalise, ('store',), ('classes', 'normalise'), False),
+    'group': (('normalise',), _group, (), (), False),
+    'resample': (('normalise',), _resample, (), ('resample',), False),
+    'tables': (('normalise',), _tables, (), ('tables',), False),
+    'export': (('group', 'resample', 'tables'), _export, (), ('output', 'resample'), True),
+    'figures': (('normalise', 'resample'), _figures, (), ('output', 'figures', 'resample'), True),
+    'report': (('group', 'resample'), _report, (), ('output', 'report', 'resample'), True),
+}
+
+
+def _written(value):
+    # Files written by a stage: its list of files, or the files of the profile store it returns
+    from scripts.profile_store import PROFILES_FILE, UEUS_FILE, META_FILE
+
+    if isinstance(value, str):
+        return [os.path.join(value, name) for name in (PROFILES_FILE, UEUS_FILE, META_FILE)]
+    return value
+
+
+def _required(stages):
+    # The requested stages and everything upstream of them
+    required = set()
+    pending = list(stages)
+    while pending:
+        stage = pending.pop()
+        if stage not in required:
+            required.add(stage)
+            pending.extend(STAGES[stage][0])
+    return required
+
+
+def run_pipeline(config, stages=None, use_cache=True, log=print):
+    """
+    Run the stages (all by default) and their upstream stages, concurrently where independent.
+
+    A stage is skipped when its result is in the StageCache under a key built from its
+    input files, config and the keys of its upstream stages (stages that write files, or
+    the profile store, are also run when one of them is missing). The stages run one at a time while
+    instrumentation traces allocations.
+
+    Returns:
+        dict: {stage: (value, seconds)} of the run, seconds is None for cached stages.
+    """
+    from scripts.stage_cache import StageCache
+    from scripts import instrumentation
+
+    cache = StageCache(config['cache']) if use_cache else None
+    # Traced allocations are process-wide, concurrent stages would mix them up
+    workers = 1 if instrumentation.tracing_allocations() else max(1, config['workers'])
+    remaining = _required(stages or STAGES)
+    values, keys, results = {}, {}, {}
+
+    def execute(stage):
+        upstream, func, inputs, params, writes = STAGES[stage]
+        if cache is not None:
+            key = cache.key(stage, [config[i] for i in inputs if config[i] is not None and os.path.exists(config[i])],
+                            {p: config[p] for p in params}, [keys[u] for u in upstream])
+            hit, value = cache.load(key)
+            if hit and (not writes or all(os.path.exists(f) for f in _written(value))):
+                return key, value, None
+        else:
+            key = None
+        start = time.perf_counter()
+        value = func(config, *[values[u] for u in upstream])
+        seconds = time.perf_counter() - start
+        if cache is not None:
+            cache.save(key, value)
+        return key, value, seconds
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while remaining or running:
+            for stage in [s for s in remaining if all(u in values for u in STAGES[s][0])]:
+                remaining.discard(stage)
+                running[executor.submit(execute, stage)] = stage
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                keys[stage], values[stage], seconds = future.result()
+                results[stage] = (values[stage], seconds)
+                log(f'{stage}: ' + ('cached' if seconds is None else f'{seconds:.2f} s'))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the UrbEnProfile pipeline without the notebook.')
+    parser.add_argument('config', help='JSON or TOML config file (see DEFAULT_CONFIG)')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), help='stages to run, all by default')
+    parser.add_argument('--no-cache', action='store_true', help='run every stage')
+    parser.add_argument('--profile', help='record the instrumented functions to a .jsonl file or a .json trace')
+    parser.add_argument('--allocations', action='store_true',
+                        help='with --profile, also record the allocated bytes (runs the stages one at a time)')
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        from scripts import instrumentation
+        instrumentation.enable(args.profile, allocations=args.allocations)
+
+    start = time.perf_counter()
+    try:
+        run_pipeline(load_config(args.config), args.stages, use_cache=not args.no_cache)
+    except Exception as error:
+        print(f'Pipeline failed: {error!r}', file=sys.stderr)
+        return 1
+    finally:
+        if args.profile:
+            instrumentation.disable()
+    print(f'Total processing time: {time.perf_counter() - start:.2f} s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
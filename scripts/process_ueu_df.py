@@ -1,5 +1,12 @@
+from scripts.instrumentation import instrumented
+
+@instrumented
 def process_ueu(df):
 
+    # Frames from the normalization stage already carry the unique_identifier as header
+    if len(df) == 0 or df.index[-1] != 'unique_identifier':
+        return df
+
     # Use the last row as the new header
     df.columns = df.iloc[-1]
 
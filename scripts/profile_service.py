@@ -0,0 +1,211 @@
+# Local HTTP service serving slices of a profile store
+import io
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from scripts.profile_store import open_profile_store
+from scripts.resampling_fn import resample_multi, RESOLUTIONS
+from scripts.grouped_stats import grouped_statistics, STATS
+
+FORMATS = {'json': 'application/json', 'npy': 'application/octet-stream'}
+
+# Default size limit of the cached response bodies
+CACHE_BYTES = 256 * 1024 ** 2
+
+
+class ProfileService:
+    """
+    Queries on a memory-mapped profile store, with an LRU cache of the encoded responses.
+
+    Parameters:
+        store_path (str): Folder of the store.
+        cache_bytes (int): Size limit of the cached response bodies, larger responses are not cached.
+        class_column (str): Sidecar column with the class of every UEU.
+    """
+
+    def __init__(self, store_path, cache_bytes=CACHE_BYTES, class_column='UEU'):
+        self.matrix, self.ueus, self.index = open_profile_store(store_path)
+        self.class_column = class_column
+        self._positions = pd.Index(self.ueus['unique_identifier'])
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def _columns(self, ids, cls):
+        if ids:
+            positions = self._positions.get_indexer(ids)
+            if (positions < 0).any():
+                raise KeyError(f"Unknown UEUs: {[i for i, p in zip(ids, positions) if p < 0]}")
+            selected = self.ueus.iloc[positions]
+        elif cls:
+            selected = self.ueus[self.ueus[self.class_column].astype(str) == cls]
+            if selected.empty:
+                raise KeyError(f"Unknown class: {cls}")
+        else:
+            raise ValueError("Give ids or cls.")
+        return selected
+
+    def _rows(self, start, end):
+        if start is not None and end is not None and pd.Timestamp(start) > pd.Timestamp(end):
+            raise ValueError(f"The start {start} is after the end {end}.")
+        return self.index.slice_indexer(start, end)
+
+    def profiles(self, ids=(), cls=None, start=None, end=None, resolution='h'):
+        """DataFrame of the profiles of some UEUs or of a class, in a time window and resolution."""
+        selected = self._columns(ids, cls)
+        rows = self._rows(start, end)
+        df = pd.DataFrame(np.asarray(self.matrix[rows, selected['column'].to_numpy()]), index=self.index[rows],
+                          columns=selected['unique_identifier'].to_numpy())
+        if resolution != 'h':
+            if resolution not in RESOLUTIONS:
+                raise ValueError(f"Unknown resolution {resolution}, use 'h' or one of {list(RESOLUTIONS)}.")
+            df = resample_multi(df, (resolution,), ('sum',))[resolution]['sum']
+        return df
+
+    def statistics(self, cls, stat='mean', start=None, end=None):
+        """Series of one statistic (see grouped_stats.STATS) of a class."""
+        if stat not in STATS:
+            raise ValueError(f"Unknown statistic {stat}, use one of {STATS}.")
+        selected = self._columns((), cls)
+        rows = self._rows(start, end)
+        values = np.asarray(self.matrix[rows, selected['column'].to_numpy()])
+        return grouped_statistics(values, np.full(values.shape[1], cls), [cls], self.index[rows]).series(cls, stat)
+
+    def query(self, *key):
+        """Encoded response of a query (the arguments of _query), from the cache when possible."""
+        with self._lock:
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+                return response
+        response = self._query(*key)
+        size = len(response[1])
+        if size <= self.cache_bytes:
+            with self._lock:
+                if key not in self._cache:
+                    self._cache[key] = response
+                    self._cached_bytes += size
+                # Evict the least recently used responses
+                while self._cached_bytes > self.cache_bytes:
+                    _, (_, body, _) = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(body)
+        return response
+
+    def _query(self, path, ids, cls, start, end, resolution, stat, fmt):
+        # Encoded response of a query; the arguments are hashable so the result can be cached
+        if path == '/profiles':
+            data = self.profiles(list(ids), cls, start, end, resolution)
+        elif path == '/statistics':
+            data = self.statistics(cls, stat, start, end).to_frame()
+        elif path == '/ueus':
+            return FORMATS['json'], self.ueus.to_json(orient='records').encode(), {}
+        else:
+            raise LookupError(path)
+        return encode(data, fmt)
+
+    def handle(self, url):
+        """Response (content type, body, headers) of a GET url such as /profiles?cls=UEU1&start=2100-01-01&format=npy."""
+        parsed = urlparse(url)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        ids = tuple(params['ids'].split(',')) if params.get('ids') else ()
+        fmt = params.get('format', 'json')
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt}, use one of {list(FORMATS)}.")
+        start, end = (_timestamp(params.get(key), key) for key in ('start', 'end'))
+        return self.query(parsed.path.rstrip('/'), ids, params.get('cls'), start, end,
+                          params.get('resolution', 'h'), params.get('stat', 'mean'), fmt)
+
+
+def _timestamp(value, name):
+    # Canonical form of a start/end parameter (also the cache key), ValueError if it isn't a date
+    if value is None:
+        return None
+    try:
+        timestamp = pd.Timestamp(value)
+    except (ValueError, TypeError, OverflowError):
+        timestamp = pd.NaT
+    if pd.isna(timestamp):
+        raise ValueError(f"Invalid {name} {value!r}, use a date such as 2100-01-01T00:00.")
+    return str(timestamp)
+
+
+def encode(df, fmt='json'):
+    """Encode a (time x column) DataFrame as JSON or as a float32 .npy array with the index and columns in headers."""
+    if fmt == 'npy':
+        buffer = io.BytesIO()
+        np.save(buffer, df.to_numpy(dtype=np.float32))
+        headers = {'X-Index-Start': str(df.index[0]) if len(df) else '',
+                   'X-Index-Freq': (df.index.freqstr or '') if isinstance(df.index, pd.DatetimeIndex) else '',
+                   'X-Columns': json.dumps([str(c) for c in df.columns])}
+        return FORMATS['npy'], buffer.getvalue(), headers
+    body = {'index': [str(i) for i in df.index], 'columns': [str(c) for c in df.columns],
+            'data': np.where(np.isnan(df.to_numpy(dtype=np.float64)), None, df.to_numpy(dtype=np.float64)).tolist()}
+    return FORMATS['json'], json.dumps(body).encode(), {}
+
+
+def _handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are written separately, don't let them wait for each other's ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            try:
+                content_type, body, headers = service.handle(self.path)
+                status = 200
+            except LookupError as error:
+                content_type, body, headers, status = FORMATS['json'], json.dumps({'error': str(error)}).encode(), {}, 404
+            except ValueError as error:
+                content_type, body, headers, status = FORMATS['json'], json.dumps({'error': str(error)}).encode(), {}, 400
+            except Exception as error:
+                # Still answer, a dropped connection would leave the client waiting
+                content_type, body, headers = FORMATS['json'], json.dumps({'error': repr(error)}).encode(), {}
+                status = 500
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Requests are not logged, the co-simulation jobs poll at a high rate
+            pass
+
+    return Handler
+
+
+def serve(store_path, host='127.0.0.1', port=8765, cache_bytes=CACHE_BYTES):
+    """
+    Serve a profile store on host:port until interrupted.
+
+    Endpoints (GET):
+        /profiles?ids=a,b | cls=UEU1 [&start=..&end=..&resolution=h|D|W|M|Q|season&format=json|npy]
+        /statistics?cls=UEU1 [&stat=mean&start=..&end=..&format=json|npy]
+        /ueus
+    """
+    server = ThreadingHTTPServer((host, port), _handler(ProfileService(store_path, cache_bytes)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve a profile store over HTTP.')
+    parser.add_argument('store_path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-mb', type=float, default=CACHE_BYTES / 1024 ** 2, help='size limit of the response cache')
+    args = parser.parse_args()
+    serve(args.store_path, args.host, args.port, int(args.cache_mb * 1024 ** 2))
@@ -0,0 +1,137 @@
+# Array-backed container of the UEU profiles
+import re
+import numpy as np
+import pandas as pd
+
+# Columns gathered at a time by from_frame
+GATHER_COLUMNS = 256
+
+
+def _natural_key(label):
+    # Sort 'UEU2' before 'UEU10'
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', str(label))]
+
+
+class UEUProfileSet:
+    """
+    One contiguous profile matrix with the time index, classes, ids and areas of its columns.
+
+    The columns are ordered by class and the matrix is stored column-major, so the
+    profiles of a class are one contiguous block: subset() and frame() return views
+    of it, not copies.
+
+    Parameters:
+        values (np.ndarray): Profile matrix (time x UEU), columns ordered by class code.
+        index (pd.DatetimeIndex): Shared time index of the rows.
+        class_codes (np.ndarray): Integer class code of every column (position in classes).
+        classes (list): Class names.
+        ids (np.ndarray): unique_identifier of every column.
+        areas (np.ndarray, optional): Area of every column in hectares.
+    """
+
+    __slots__ = ('values', 'index', 'class_codes', 'classes', 'ids', 'areas', '_bounds')
+
+    def __init__(self, values, index, class_codes, classes, ids, areas=None):
+        self.values = values
+        self.index = index
+        self.class_codes = class_codes
+        self.classes = list(classes)
+        self.ids = ids
+        self.areas = areas
+        # First and last column of every class
+        starts = np.searchsorted(class_codes, np.arange(len(self.classes)), side='left')
+        ends = np.searchsorted(class_codes, np.arange(len(self.classes)), side='right')
+        self._bounds = dict(zip(self.classes, zip(starts, ends)))
+
+    @classmethod
+    def from_frame(cls, df, labels, ids=None, areas=None, classes=None, dtype=np.float32):
+        """
+        Build the set from a (time x UEU) DataFrame, copying the data once.
+
+        Parameters:
+            df (pd.DataFrame): Profiles with a DatetimeIndex.
+            labels (array-like): Class label of every column (e.g. the 'UEU' column).
+            ids (array-like, optional): unique_identifier of every column, the column names if None.
+            areas (array-like, optional): Area of every column in hectares.
+            classes (list, optional): Classes to keep, in this order. All labels if None.
+        """
+        labels = np.asarray(labels).astype(str)
+        if classes is None:
+            classes = sorted(set(labels), key=_natural_key)
+        codes = pd.Index(classes).get_indexer(labels)
+
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0]
+
+        # Gather the columns in class order straight into the column-major matrix, a block at a
+        # time, so the only full-size copy is the result
+        source = df.to_numpy()
+        values = np.empty((len(df), len(order)), dtype=dtype, order='F')
+        for start in range(0, len(order), GATHER_COLUMNS):
+            values[:, start:start + GATHER_COLUMNS] = source[:, order[start:start + GATHER_COLUMNS]]
+        ids = np.asarray(df.columns if ids is None else ids)[order]
+        areas = None if areas is None else np.asarray(areas, dtype=np.float64)[order]
+        return cls(values, df.index, codes[order], classes, ids, areas)
+
+    @classmethod
+    def from_store(cls, store_path, class_column='UEU', area_column='area_ha', classes=None, dtype=np.float32):
+        """Build the set from a profile store (see profile_store.write_profile_store)."""
+        from scripts.profile_store import open_profile_store
+
+        matrix, ueus, time_index = open_profile_store(store_path)
+        labels = ueus[class_column].astype(str).to_numpy()
+        if classes is None:
+            classes = sorted(set(labels), key=_natural_key)
+        codes = pd.Index(classes).get_indexer(labels)
+
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0]
+
+        values = np.asfortranarray(matrix[:, ueus['column'].to_numpy()[order]], dtype=dtype)
+        areas = ueus[area_column].to_numpy(dtype=np.float64)[order] if area_column in ueus else None
+        return cls(values, time_index, codes[order], classes, ueus['unique_identifier'].to_numpy()[order], areas)
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def __repr__(self):
+        return f'UEUProfileSet(steps={self.values.shape[0]}, ueus={self.values.shape[1]}, classes={self.classes})'
+
+    @property
+    def labels(self):
+        """Class label of every column."""
+        return np.asarray(self.classes)[self.class_codes]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def subset(self, cls):
+        """Profiles of one class, sharing the memory of this set."""
+        start, end = self._bounds[cls]
+        return UEUProfileSet(self.values[:, start:end], self.index, np.zeros(end - start, dtype=self.class_codes.dtype),
+                             [cls], self.ids[start:end], None if self.areas is None else self.areas[start:end])
+
+    def frame(self, cls=None):
+        """DataFrame (time x unique_identifier) of one class or of all profiles, without copying."""
+        values, ids = self.values, self.ids
+        if cls is not None:
+            start, end = self._bounds[cls]
+            values, ids = values[:, start:end], ids[start:end]
+        return pd.DataFrame(values, index=self.index, columns=ids, copy=False)
+
+    def class_frames(self, classes=None):
+        """List of the DataFrames of every class, e.g. for the plot functions."""
+        return [self.frame(cls) for cls in (self.classes if classes is None else classes)]
+
+
+def as_frame(data):
+    # DataFrame of all profiles of a UEUProfileSet, other inputs are returned unchanged
+    return data.frame() if isinstance(data, UEUProfileSet) else data
+
+
+def as_frames(dataframes, labels=None):
+    # List of class DataFrames and their labels from a UEUProfileSet, other inputs are returned unchanged
+    if isinstance(dataframes, UEUProfileSet):
+        return dataframes.class_frames(), dataframes.classes if labels is None else labels
+    return dataframes, labels
@@ -0,0 +1,142 @@
+# Profile store
+import os
+import json
+import numpy as np
+import pandas as pd
+
+PROFILES_FILE = 'profiles.f32'
+UEUS_FILE = 'ueus.csv'
+META_FILE = 'store.json'
+
+
+def write_profile_store(profiles, ueus, store_path):
+    """
+    Write an hourly profile frame to an on-disk, memory-mappable profile store.
+
+    The profiles are kept as one float32 matrix in column-major order, so every
+    UEU profile is a contiguous block on disk and only the columns that are used
+    get paged in. The UEU ids, classes and areas are kept in a small sidecar table.
+
+    Parameters:
+        profiles (pd.DataFrame): Hourly profiles, DatetimeIndex as index and one column per UEU.
+        ueus (pd.DataFrame): One row per column of `profiles` (same order), e.g. with the
+            columns 'unique_identifier', 'UEU' and 'area_ha'.
+        store_path (str): Folder of the store. It is created if it doesn't exist.
+
+    Returns:
+        str: The store path.
+    """
+    if len(ueus) != profiles.shape[1]:
+        raise ValueError("The number of rows in ueus must match the number of profile columns.")
+
+    matrix = create_profile_store(ueus, store_path, profiles.index)
+    matrix[:] = profiles.to_numpy(dtype=np.float32)
+    matrix.flush()
+    del matrix
+
+    return store_path
+
+
+def create_profile_store(ueus, store_path, time_index):
+    """
+    Create an empty profile store to be filled block by block (e.g. one chunk of columns at a time).
+
+    Parameters:
+        ueus (pd.DataFrame): One row per column of the store.
+        store_path (str): Folder of the store. It is created if it doesn't exist.
+        time_index (pd.DatetimeIndex): Index of the rows.
+
+    Returns:
+        np.memmap: Writable float32 matrix of shape (len(time_index), len(ueus)); flush it when done.
+    """
+    if not os.path.exists(store_path):
+        os.makedirs(store_path)
+
+    n_steps, n_columns = len(time_index), len(ueus)
+    matrix = np.memmap(os.path.join(store_path, PROFILES_FILE), dtype=np.float32, mode='w+',
+                       shape=(n_steps, n_columns), order='F')
+
+    # Sidecar table with the column position of every UEU in the matrix
+    ueus = ueus.reset_index(drop=True).copy()
+    ueus.insert(0, 'column', np.arange(n_columns))
+    ueus.to_csv(os.path.join(store_path, UEUS_FILE), index=False)
+
+    meta = {'n_steps': n_steps,
+            'n_columns': n_columns,
+            'dtype': 'float32',
+            'order': 'F',
+            'start': str(time_index[0]),
+            'freq': (pd.infer_freq(time_index) if n_steps > 2 else None) or 'h'}
+    with open(os.path.join(store_path, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    return matrix
+
+
+def open_profile_store(store_path, mode='r'):
+    """
+    Open a profile store without reading the profiles into memory.
+
+    Returns:
+        tuple: (matrix, ueus, time_index) where matrix is a read-only np.memmap of
+        shape (n_steps, n_columns), ueus the sidecar table and time_index the shared
+        DatetimeIndex of the rows.
+    """
+    with open(os.path.join(store_path, META_FILE)) as f:
+        meta = json.load(f)
+
+    matrix = np.memmap(os.path.join(store_path, PROFILES_FILE), dtype=meta['dtype'], mode=mode,
+                       shape=(meta['n_steps'], meta['n_columns']), order=meta['order'])
+    ueus = pd.read_csv(os.path.join(store_path, UEUS_FILE), dtype={'unique_identifier': str})
+    time_index = pd.date_range(start=meta['start'], periods=meta['n_steps'], freq=meta['freq'])
+
+    return matrix, ueus, time_index
+
+
+def read_profiles(store_path, columns=None, key='unique_identifier', label='unique_identifier'):
+    """
+    Read a subset of the stored profiles as a DataFrame.
+
+    Parameters:
+        store_path (str): Folder of the store.
+        columns (list, optional): Values of `key` to read. All columns are read if None.
+        key (str): Sidecar column used to select the profiles.
+        label (str): Sidecar column used as header of the returned DataFrame.
+
+    Returns:
+        pd.DataFrame: The selected profiles (float32) with the stored time index.
+    """
+    matrix, ueus, time_index = open_profile_store(store_path)
+
+    if columns is None:
+        selected = ueus
+    else:
+        positions = pd.Index(ueus[key]).get_indexer(columns)
+        if (positions < 0).any():
+            missing = [c for c, p in zip(columns, positions) if p < 0]
+            raise KeyError(f"Profiles not found in the store: {missing}")
+        selected = ueus.iloc[positions]
+
+    # Fancy indexing on the memmap only touches the requested columns
+    data = np.asarray(matrix[:, selected['column'].to_numpy()])
+    return pd.DataFrame(data, index=time_index, columns=selected[label].to_numpy())
+
+
+def pickle_to_store(pickle_path, ueus, store_path, datetime_index):
+    """
+    Convert the wide resLoadSIM pickle into a profile store (one-off migration).
+
+    Parameters:
+        pickle_path (str): Path to ueu_electricity_load_profiles.pkl.
+        ueus (pd.DataFrame): UEU table indexed by 'fid' (as string) with the columns to keep
+            in the sidecar table, e.g. 'unique_identifier', 'UEU' and 'area_ha'.
+        store_path (str): Folder of the store.
+        datetime_index (pd.DatetimeIndex): Index of the hourly profiles.
+    """
+    df = pd.read_pickle(pickle_path)
+    # dropping innecesary columns
+    df = df.drop(['Time (h)'], axis=1)
+    df.index = datetime_index
+
+    sidecar = ueus.loc[df.columns].rename_axis('fid').reset_index()
+    return write_profile_store(df, sidecar, store_path)
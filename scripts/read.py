@@ -1,10 +1,30 @@
 import datetime as dt
+import numpy as np
 import pandas as pd
 import os
+import glob
+import sqlite3
 from scripts.global_variables import * # database_path, root_path, input_path, output_path
+from scripts.instrumentation import instrumented
 
+# Column names of each variable in the TMY3 and PVSYST exports of the SoDa station files
+TMY_VARIABLES = {
+    'temp_amb': {'TMY3': 'Dry-bulb (C)', 'PVSYST': 'Tamb'},
+    'wind_speed': {'TMY3': 'Wspd (m/s)', 'PVSYST': 'WindVel'},
+    'wind_direction': {'TMY3': 'Wdir (degrees)'},
+    'rel_humidity': {'TMY3': 'RHum (%)'},
+    'ghi': {'TMY3': 'GHI (W/m^2)', 'PVSYST': 'GHI'},
+    'dni': {'TMY3': 'DNI (W/m^2)', 'PVSYST': 'DNI'},
+    'dhi': {'TMY3': 'DHI (W/m^2)', 'PVSYST': 'DHI'},
+}
+
+@instrumented
 def typical_meteorological_year(filepath: str, datetime_index) -> pd.DataFrame:
 
+    # The CSV exports are parsed directly (and cached)
+    if filepath.lower().endswith('.csv'):
+        return read_tmy_csv(filepath, ['temp_amb', 'wind_speed'], datetime_index)
+
     # Load data from Excel file
     tmy_data = pd.read_excel(filepath)
     
@@ -17,3 +37,170 @@ def typical_meteorological_year(filepath: str, datetime_index) -> pd.DataFrame:
     data_dict = {'temp_amb':tmy_data['Tamb'].astype(float).values + 273.15, 'wind_speed': tmy_data['WindVel'].astype(float).values}
     df = pd.DataFrame(data = data_dict, index=datetime_index)
     return df
+
+
+@instrumented
+def tmy_csv_path(station: str, variant: str = 'P90', file_format: str = 'TMY3') -> str:
+    """
+    Find the CSV export of a station in Database/TMY_Oldenburg.
+
+    Parameters:
+        station (str): Name of the station, e.g. 'Wechloy' or 'Osternburg'.
+        variant (str): 'P90' (yearly) or 'FS50' (monthly).
+        file_format (str): 'TMY3' or 'PVSYST'.
+    """
+    pattern = os.path.join(database_path.replace('\\', os.sep), 'TMY_Oldenburg', '*', station,
+                           f'MY_{file_format}_{station}_{variant}_*.csv')
+    files = glob.glob(pattern)
+    if not files:
+        raise FileNotFoundError(f"No {file_format} {variant} file found for station {station}.")
+    return files[0]
+
+def _tmy_csv_layout(filepath: str):
+    # Returns the format, separator, header line and the lines to skip below the header
+    with open(filepath) as f:
+        for i, line in enumerate(f):
+            if line.startswith('Date (MM/DD/YYYY)'):
+                return 'TMY3', ',', i, []
+            if line.startswith('Year;Month;Day;Hour'):
+                # the PVSYST header is followed by a row of units
+                return 'PVSYST', ';', i, [i + 1]
+            if i > 50:
+                break
+    raise ValueError(f"{filepath} is not a TMY3 or PVSYST file.")
+
+@instrumented
+def read_tmy_csv(filepath: str, variables=('temp_amb', 'wind_speed'), datetime_index=None, use_cache=True) -> pd.DataFrame:
+    """
+    Read selected variables of a TMY3 or PVSYST station file.
+
+    Only the requested columns are parsed, -999 sentinels are mapped to NaN and the
+    ambient temperature is returned in Kelvin (as in typical_meteorological_year).
+    Every parsed variable is cached as a float32 .npy array in the cache folder, so
+    repeated loads skip the CSV parsing. A cache entry is refreshed when the source
+    file is newer than it.
+
+    Parameters:
+        filepath (str): Path to the CSV file (see tmy_csv_path).
+        variables (list): Keys of TMY_VARIABLES to read.
+        datetime_index (pd.DatetimeIndex, optional): Index of the returned DataFrame.
+        use_cache (bool): Read and write the binary cache.
+
+    Returns:
+        pd.DataFrame: One column per requested variable.
+    """
+    variables = list(variables)
+    file_format, sep, header, skiprows = _tmy_csv_layout(filepath)
+
+    unknown = [v for v in variables if file_format not in TMY_VARIABLES.get(v, {})]
+    if unknown:
+        raise KeyError(f"Variables not available in {file_format} files: {unknown}")
+
+    cache_dir = os.path.join(cache_path, 'tmy', os.path.splitext(os.path.basename(filepath))[0])
+    source_mtime = os.path.getmtime(filepath)
+
+    data = {}
+    missing = []
+    for variable in variables:
+        cache_file = os.path.join(cache_dir, variable + '.npy')
+        if use_cache and os.path.exists(cache_file) and os.path.getmtime(cache_file) >= source_mtime:
+            data[variable] = np.load(cache_file)
+        else:
+            missing.append(variable)
+
+    if missing:
+        columns = [TMY_VARIABLES[v][file_format] for v in missing]
+        parsed = pd.read_csv(filepath, sep=sep, header=header, skiprows=skiprows, usecols=columns,
+                             na_values=[-999, '-999', '-999.0'], dtype='float32')
+
+        for variable, column in zip(missing, columns):
+            values = parsed[column].to_numpy(dtype=np.float32)
+            if variable == 'temp_amb':
+                values = values + np.float32(273.15)
+            data[variable] = values
+
+            if use_cache:
+                if not os.path.exists(cache_dir):
+                    os.makedirs(cache_dir)
+                np.save(os.path.join(cache_dir, variable + '.npy'), values)
+
+    df = pd.DataFrame(data={v: data[v] for v in variables}, index=datetime_index)
+    return df
+
+
+# Attribute filter used in the notebook to keep the residential UEUs with apartments
+RESIDENTIAL_WHERE = "landuse = 'residential' AND number_of_apartments > 0"
+
+def _gpkg_geometries(blobs):
+    # Strip the GeoPackage binary header and decode the remaining WKB in one vectorised call
+    import shapely
+
+    envelope_sizes = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+    wkb = []
+    for blob in blobs:
+        if blob is None:
+            wkb.append(None)
+            continue
+        flags = blob[3]
+        wkb.append(bytes(blob[8 + envelope_sizes[(flags >> 1) & 0x07]:]))
+    return shapely.from_wkb(wkb)
+
+@instrumented
+def read_ueu_gpkg(filepath: str, columns=None, where=None, params=(), geometry=False, bbox=None, layer=None) -> pd.DataFrame:
+    """
+    Load UEUs from a GeoPackage pushing the column list and the attribute filter down to SQLite.
+
+    Parameters:
+        filepath (str): Path to the GeoPackage, e.g. Database/ueu_with_profiles.gpkg.
+        columns (list, optional): Attribute columns to load. All columns are loaded if None.
+        where (str, optional): SQL filter, e.g. RESIDENTIAL_WHERE. Use '?' placeholders with params.
+        params (tuple): Values of the '?' placeholders in where.
+        geometry (bool): Decode the geometries and return a GeoDataFrame. When False the
+            geometry column is never read.
+        bbox (tuple, optional): (minx, miny, maxx, maxy). Keeps the UEUs whose bounding box intersects
+            it, answered by the R-tree of the GeoPackage.
+        layer (str, optional): Name of the layer. The first feature layer is used if None.
+
+    Returns:
+        pd.DataFrame or gpd.GeoDataFrame: The selected UEUs indexed by their 'fid'.
+    """
+    con = sqlite3.connect(f'file:{filepath}?mode=ro', uri=True)
+    try:
+        if layer is None:
+            layer = con.execute("SELECT table_name FROM gpkg_contents WHERE data_type = 'features'").fetchone()[0]
+        geom_column, srs_id = con.execute("SELECT column_name, srs_id FROM gpkg_geometry_columns WHERE table_name = ?",
+                                          (layer,)).fetchone()
+
+        if columns is None:
+            columns = [c[1] for c in con.execute(f'PRAGMA table_info("{layer}")') if c[1] not in ('fid', geom_column)]
+
+        selected = ['fid'] + list(columns) + ([geom_column] if geometry else [])
+        query = 'SELECT ' + ', '.join(f'"{c}"' for c in selected) + f' FROM "{layer}"'
+
+        conditions = []
+        params = list(params)
+        if where:
+            conditions.append(f'({where})')
+        if bbox is not None:
+            # Use the spatial index of the GeoPackage instead of testing every geometry
+            conditions.append(f'fid IN (SELECT id FROM "rtree_{layer}_{geom_column}" '
+                              'WHERE maxx >= ? AND minx <= ? AND maxy >= ? AND miny <= ?)')
+            params += [bbox[0], bbox[2], bbox[1], bbox[3]]
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        rows = con.execute(query, params).fetchall()
+        crs = None
+        if geometry:
+            crs = con.execute("SELECT definition FROM gpkg_spatial_ref_sys WHERE srs_id = ?", (srs_id,)).fetchone()[0]
+    finally:
+        con.close()
+
+    df = pd.DataFrame.from_records(rows, columns=selected).set_index('fid')
+
+    if geometry:
+        import geopandas as gpd
+        geoms = _gpkg_geometries(df.pop(geom_column).to_numpy())
+        df = gpd.GeoDataFrame(df, geometry=geoms, crs=crs if crs and crs != 'undefined' else None)
+
+    return df
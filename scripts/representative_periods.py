@@ -0,0 +1,210 @@
+# Representative days and weeks of the class profiles
+import numpy as np
+import pandas as pd
+from scripts.create_plots import day_hour_matrix, _is_regular_hourly
+
+# Hours of every period length
+PERIOD_HOURS = {'day': 24, 'week': 168}
+
+METHODS = ('kmedoids', 'hierarchical')
+
+
+class RepresentativePeriods:
+    """
+    k typical periods of a profile matrix and how they rebuild the full horizon.
+
+    Parameters:
+        profiles (np.ndarray): Representative periods (period, hour, column), in the units of the input.
+        starts (pd.DatetimeIndex): First timestamp of every representative period.
+        weights (np.ndarray): Number of periods of the horizon represented by each one.
+        assignment (np.ndarray): Representative of every period of the horizon.
+        extreme (np.ndarray): True for the periods kept for their peaks.
+        columns (pd.Index): Names of the columns.
+        index (pd.DatetimeIndex): Index of the full horizon.
+        positions (np.ndarray, optional): Row of every timestamp of index in the periods laid
+            end to end, if they are not simply consecutive (wall-clock days of a DST index).
+    """
+
+    def __init__(self, profiles, starts, weights, assignment, extreme, columns, index, positions=None):
+        self.profiles = profiles
+        self.starts = starts
+        self.weights = weights
+        self.assignment = assignment
+        self.extreme = extreme
+        self.columns = columns
+        self.index = index
+        self.positions = positions
+
+    def __repr__(self):
+        return f'RepresentativePeriods(periods={len(self.starts)}, extreme={int(self.extreme.sum())})'
+
+    def frame(self):
+        """DataFrame of the representative periods one after the other, with their start and weight."""
+        hours = self.profiles.shape[1]
+        index = pd.MultiIndex.from_product([self.starts, range(hours)], names=['start', 'hour'])
+        df = pd.DataFrame(self.profiles.reshape(-1, self.profiles.shape[2]), index=index, columns=self.columns)
+        df.insert(0, 'weight', np.repeat(self.weights, hours))
+        return df
+
+    def reconstruct(self):
+        """Full horizon rebuilt from the representative of every period."""
+        values = self.profiles[self.assignment].reshape(-1, self.profiles.shape[2])
+        if self.positions is not None:
+            values = values[self.positions]
+        return pd.DataFrame(values[:len(self.index)], index=self.index[:len(values)], columns=self.columns)
+
+    def error(self, profiles):
+        """
+        Reconstruction error against the original profiles.
+
+        Returns:
+            pd.DataFrame: Per column RMSE, NRMSE (RMSE / mean), relative error of the total
+            energy and of the peak.
+        """
+        original = profiles.to_numpy(dtype=np.float64) if isinstance(profiles, pd.DataFrame) else np.asarray(profiles, dtype=np.float64)
+        rebuilt = self.reconstruct().to_numpy()
+        original = original[:len(rebuilt)]
+        rmse = np.sqrt(np.nanmean((rebuilt - original) ** 2, axis=0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({'rmse': rmse,
+                                 'nrmse': rmse / np.nanmean(original, axis=0),
+                                 'energy_error': np.nansum(rebuilt, axis=0) / np.nansum(original, axis=0) - 1,
+                                 'peak_error': np.nanmax(rebuilt, axis=0) / np.nanmax(original, axis=0) - 1},
+                                index=self.columns)
+
+
+def period_matrix(values, index, period='day'):
+    """
+    Arrange hourly values as (period, hour, column); weeks start on the first day and a trailing partial week is dropped.
+    """
+    if period == 'day':
+        matrix = day_hour_matrix(values, index)
+        return matrix if matrix.ndim == 3 else matrix[:, :, None]
+    hours = PERIOD_HOURS[period]
+    values = np.asarray(values, dtype=np.float64)
+    values = values.reshape(len(values), -1)
+    n_periods = len(values) // hours
+    return values[:n_periods * hours].reshape(n_periods, hours, values.shape[1])
+
+
+def _kmedoids(distances, k, seed=0, max_iter=100):
+    # Alternating k-medoids with a k-means++ style start (deterministic for a seed)
+    rng = np.random.default_rng(seed)
+    n = len(distances)
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    for _ in range(1, k):
+        closest = distances[:, medoids].min(axis=1) ** 2
+        if closest.sum() == 0:
+            break
+        medoids.append(int(rng.choice(n, p=closest / closest.sum())))
+    medoids = np.array(medoids)
+
+    for _ in range(max_iter):
+        labels = np.argmin(distances[:, medoids], axis=1)
+        updated = medoids.copy()
+        for c in range(len(medoids)):
+            members = np.flatnonzero(labels == c)
+            if len(members):
+                updated[c] = members[np.argmin(distances[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return medoids, np.argmin(distances[:, medoids], axis=1)
+
+
+def _hierarchical(features, distances, k):
+    # Ward clustering, the medoid of every cluster is its representative
+    from scipy.cluster.hierarchy import linkage, fcluster
+
+    labels = fcluster(linkage(features, method='ward'), k, criterion='maxclust') - 1
+    clusters = np.unique(labels)
+    medoids = np.array([members[np.argmin(distances[np.ix_(members, members)].sum(axis=1))]
+                        for members in (np.flatnonzero(labels == c) for c in clusters)])
+    return medoids, np.searchsorted(clusters, labels)
+
+
+def representative_periods(profiles, k=8, period='day', method='kmedoids', extreme_peaks=1,
+                           scale_energy=True, seed=0, index=None):
+    """
+    Select k typical days or weeks of a profile matrix, keeping the peak periods.
+
+    Every period is described by the hourly values of all columns (each column scaled by
+    its maximum so all weigh the same). The periods with the highest total peak are kept
+    as their own representatives with weight 1 (extreme_peaks of them); the others are
+    clustered into k groups by k-medoids or Ward hierarchical clustering, and the medoid
+    of each group represents it with a weight equal to the size of the group.
+
+    Parameters:
+        profiles (pd.DataFrame): Hourly profiles (time x column), e.g. the class means
+            or the profiles of one class.
+        k (int): Number of typical periods besides the extreme ones.
+        period (str): 'day' or 'week'.
+        method (str): 'kmedoids' or 'hierarchical'.
+        extreme_peaks (int): Periods kept for their peak of the summed columns.
+        scale_energy (bool): Scale the typical representative periods so the weighted periods
+            add up to the energy of every column over the horizon. The extreme periods are
+            not scaled.
+        seed (int): Seed of the k-medoids start.
+        index (pd.DatetimeIndex, optional): Time index, taken from profiles if None.
+
+    Returns:
+        RepresentativePeriods
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}, use one of {METHODS}.")
+    if index is None:
+        index = profiles.index
+    columns = profiles.columns if isinstance(profiles, pd.DataFrame) else pd.RangeIndex(np.shape(profiles)[1])
+    matrix = np.nan_to_num(period_matrix(np.asarray(profiles, dtype=np.float64), index, period))
+    n_periods, hours, _ = matrix.shape
+
+    scale = np.abs(matrix).max(axis=(0, 1))
+    features = (matrix / np.where(scale > 0, scale, 1)).reshape(n_periods, -1)
+
+    # Periods with the highest peak of the summed columns
+    extreme = np.argsort(-matrix.sum(axis=2).max(axis=1), kind='stable')[:extreme_peaks]
+    typical = np.setdiff1d(np.arange(n_periods), extreme)
+
+    squared = (features[typical] ** 2).sum(axis=1)
+    distances = np.sqrt(np.maximum(squared[:, None] + squared[None, :] - 2 * features[typical] @ features[typical].T, 0))
+    k = min(k, len(typical))
+    if method == 'kmedoids':
+        medoids, labels = _kmedoids(distances, k, seed)
+    else:
+        medoids, labels = _hierarchical(features[typical], distances, k)
+
+    representatives = np.concatenate([typical[medoids], extreme])
+    assignment = np.empty(n_periods, dtype=np.int64)
+    assignment[typical] = labels
+    assignment[extreme] = len(medoids) + np.arange(len(extreme))
+    weights = np.bincount(assignment, minlength=len(representatives)).astype(np.float64)
+
+    # Chronological order of the representatives
+    order = np.argsort(representatives)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    representatives, weights, assignment = representatives[order], weights[order], rank[assignment]
+    is_extreme = np.isin(representatives, extreme)
+
+    selected = matrix[representatives].copy()
+    if scale_energy:
+        # Only the typical periods are scaled, the extreme ones keep their peak and stand for
+        # themselves (weight 1), so the typical ones make up the rest of the energy
+        total = matrix.sum(axis=(0, 1)) - matrix[extreme].sum(axis=(0, 1))
+        weighted = (selected[~is_extreme].sum(axis=1) * weights[~is_extreme, None]).sum(axis=0)
+        factor = np.where(weighted > 0, total / np.where(weighted > 0, weighted, 1), 1)
+        selected[~is_extreme] *= factor
+
+    if period == 'day':
+        # Days are placed by their wall-clock date (see day_hour_matrix), so a day does not
+        # start 24 rows after the previous one on a DST index
+        midnight = index[0].normalize()
+        days = pd.date_range(midnight.tz_localize(None), periods=n_periods, freq='D').tz_localize(index.tz)
+        starts = days[representatives]
+        if not _is_regular_hourly(index):
+            offsets = (index.normalize().tz_localize(None) - midnight.tz_localize(None)).days.to_numpy()
+            positions = offsets * hours + index.hour.to_numpy()
+            return RepresentativePeriods(selected, starts, weights, assignment, is_extreme, columns, index, positions)
+    else:
+        starts = index[representatives * hours]
+    return RepresentativePeriods(selected, starts, weights, assignment, is_extreme, columns, index[:n_periods * hours])
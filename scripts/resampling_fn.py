@@ -1,24 +1,118 @@
-
+import numpy as np
 import pandas as pd
+from scripts.profile_set import as_frame
+from scripts.instrumentation import instrumented
+
+# pandas frequency of the labels of each resolution ('season' are the meteorological seasons DJF, MAM, JJA, SON)
+RESOLUTIONS = {'D': 'D', 'W': 'W-SUN', 'M': 'M', 'Q': 'Q-DEC', 'season': 'QS-DEC'}
 
+@instrumented
 def resample_dataframes(input_dataframe):
-    # Resample to daily sum
-       
-    df_daily = input_dataframe.resample('D').sum()
-    
-    # Resample to weekly sum
-    df_weekly = input_dataframe.resample('W').sum()
-    
-    # Resample to monthly sum
-    df_monthly = input_dataframe.resample('M').sum()
-
-    # Process the DataFrames
-    df_daily = df_daily.apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
-    df_weekly = df_weekly.apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
-    df_monthly = df_monthly.apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
-    df_daily = df_daily.loc[:, (df_daily != 0).any(axis=0)]  # Drop columns with all zeros
-    df_weekly = df_weekly.loc[:, (df_weekly != 0).any(axis=0)]  # Drop columns with all zeros
-    df_monthly = df_monthly.loc[:, (df_monthly != 0).any(axis=0)]  # Drop columns with all zeros
-
-    
-    return df_daily, df_weekly, df_monthly
\ No newline at end of file
+    # Resample to daily, weekly and monthly sum in one pass over the hourly data
+    resampled = resample_multi(input_dataframe, resolutions=('D', 'W', 'M'), stats=('sum',))
+
+    df_daily = resampled['D']['sum']
+    df_weekly = resampled['W']['sum']
+    df_monthly = resampled['M']['sum']
+
+    return df_daily, df_weekly, df_monthly
+
+@instrumented
+def clean_columns(input_dataframe):
+    # Convert to numeric and drop the columns with only NaN or zeros
+    df = as_frame(input_dataframe)
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+        df = df.apply(pd.to_numeric, errors='coerce')
+
+    values = df.to_numpy(dtype=np.float64)
+    keep = ((values != 0) & ~np.isnan(values)).any(axis=0)
+    return df.loc[:, keep]
+
+def _group_starts(keys):
+    # Start position of every run of equal keys (the keys are sorted in time)
+    return np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+
+def _period_labels(days, resolution):
+    # Label of the period each day belongs to, as used by DataFrame.resample
+    if resolution == 'D':
+        return days
+    if resolution == 'W':
+        return days + pd.to_timedelta(6 - days.dayofweek, unit='D')
+    if resolution == 'M':
+        return days + pd.offsets.MonthEnd(0)
+    if resolution == 'Q':
+        return days + pd.offsets.QuarterEnd(0, startingMonth=12)
+    if resolution == 'season':
+        # Seasons start in December, March, June and September (labelled by their first day)
+        months = days.year * 12 + (days.month - 1) - days.month % 3
+        return pd.DatetimeIndex(pd.to_datetime({'year': months // 12, 'month': months % 12 + 1, 'day': 1}), tz=days.tz)
+    raise ValueError(f"Unknown resolution {resolution}, use one of {list(RESOLUTIONS)}.")
+
+def _reduce(level, starts, stats):
+    # Combine the rows of a finer level into the periods starting at starts
+    reduced = {'sum': np.add.reduceat(level['sum'], starts, axis=0),
+               'count': np.add.reduceat(level['count'], starts, axis=0)}
+    if 'min' in stats:
+        reduced['min'] = np.fmin.reduceat(level['min'], starts, axis=0)
+    if 'max' in stats:
+        reduced['max'] = np.fmax.reduceat(level['max'], starts, axis=0)
+    return reduced
+
+@instrumented
+def resample_multi(input_dataframe, resolutions=('D', 'W', 'M', 'Q', 'season'), stats=('sum',)):
+    """
+    Resample hourly data to several resolutions walking the hourly values only once.
+
+    The columns are cleaned once up front (see clean_columns), the hourly values are reduced
+    to daily sums, counts, minima and maxima, and every coarser resolution is built from the
+    daily values.
+
+    Parameters:
+        input_dataframe (pd.DataFrame): Hourly data (time x UEU) with a sorted DatetimeIndex, or a UEUProfileSet.
+        resolutions (tuple): Keys of RESOLUTIONS.
+        stats (tuple): Any of 'sum', 'min', 'max' and 'mean'.
+
+    Returns:
+        dict: result[resolution][stat] is a DataFrame with the same index as DataFrame.resample.
+    """
+    df = clean_columns(input_dataframe)
+    values = df.to_numpy(dtype=np.float64)
+    missing = np.isnan(values)
+    filled = np.where(missing, 0, values) if missing.any() else values
+
+    # Daily level from the hourly values
+    days = df.index.normalize()
+    starts = _group_starts(days.asi8)
+    day_labels = days[starts]
+    daily = {'sum': filled, 'count': (~missing).astype(np.float64), 'min': values, 'max': values}
+    daily = _reduce(daily, starts, stats)
+
+    result = {}
+    for resolution in resolutions:
+        labels = _period_labels(day_labels, resolution)
+        if resolution == 'D':
+            level = daily
+        else:
+            period_starts = _group_starts(labels.asi8)
+            labels = labels[period_starts]
+            level = _reduce(daily, period_starts, stats)
+
+        full_index = pd.date_range(labels[0], labels[-1], freq=RESOLUTIONS[resolution])
+        frames = {}
+        for stat in stats:
+            if stat == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    data = level['sum'] / level['count']
+            else:
+                data = level[stat]
+
+            frame = pd.DataFrame(data, index=labels, columns=df.columns)
+            # Periods without data (gaps in the index), as DataFrame.resample does
+            if len(full_index) == len(labels):
+                frame.index = full_index
+            else:
+                frame = frame.reindex(full_index, fill_value=0 if stat == 'sum' else np.nan)
+            frames[stat] = frame
+        result[resolution] = frames
+
+    return result
@@ -0,0 +1,131 @@
+# Blocked correlation and cosine similarity between individual UEU profiles
+import numpy as np
+import pandas as pd
+
+METHODS = ('pearson', 'cosine')
+
+# Columns per tile of the similarity matrix
+TILE_COLUMNS = 2048
+
+
+def standardize(values, method='pearson', dtype=np.float32):
+    """
+    Scale the columns once so that the similarity of two columns is their dot product.
+
+    For 'pearson' the columns are centred and scaled to unit norm, for 'cosine' only
+    scaled to unit norm. Constant (or all-zero) columns become all NaN. The columns are
+    scaled TILE_COLUMNS at a time in float64 and written to the result, so no full-size
+    float64 copy of the matrix is made.
+
+    Parameters:
+        values (np.ndarray or pd.DataFrame): Profile matrix (time x UEU).
+        method (str): One of METHODS.
+
+    Returns:
+        np.ndarray: Column-major matrix of dtype, same shape as values.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}, use one of {METHODS}.")
+    values = values.to_numpy() if isinstance(values, pd.DataFrame) else np.asarray(values)
+    result = np.empty(values.shape, dtype=dtype, order='F')
+    # float64 buffer reused by every block of columns
+    buffer = np.empty((values.shape[0], min(TILE_COLUMNS, values.shape[1])), dtype=np.float64, order='F')
+    for start in range(0, values.shape[1], TILE_COLUMNS):
+        block = buffer[:, :min(TILE_COLUMNS, values.shape[1] - start)]
+        block[...] = values[:, start:start + TILE_COLUMNS]
+        if method == 'pearson':
+            block -= block.mean(axis=0)
+        norms = np.sqrt(np.einsum('ij,ij->j', block, block))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            block /= np.where(norms > 0, norms, np.nan)
+        result[:, start:start + block.shape[1]] = block
+    return result
+
+
+def iter_tiles(standardized, tile_columns=TILE_COLUMNS, upper=True):
+    """
+    Tiles of the similarity matrix of standardized columns, one matmul per tile.
+
+    Yields:
+        tuple: (row_start, column_start, tile); only tiles on or above the diagonal if upper.
+    """
+    n = standardized.shape[1]
+    for i in range(0, n, tile_columns):
+        left = standardized[:, i:i + tile_columns]
+        for j in range(i if upper else 0, n, tile_columns):
+            yield i, j, left.T @ standardized[:, j:j + tile_columns]
+
+
+def similarity_to_disk(values, filepath, method='pearson', tile_columns=TILE_COLUMNS):
+    """
+    Write the full (UEU x UEU) similarity matrix to a float32 memmap, one tile at a time.
+
+    Only the tiles on and above the diagonal are computed, the others are mirrored.
+
+    Returns:
+        np.memmap: The similarity matrix, read-only.
+    """
+    standardized = standardize(values, method)
+    n = standardized.shape[1]
+    matrix = np.memmap(filepath, dtype=np.float32, mode='w+', shape=(n, n))
+    for i, j, tile in iter_tiles(standardized, tile_columns):
+        matrix[i:i + tile.shape[0], j:j + tile.shape[1]] = tile
+        if i != j:
+            matrix[j:j + tile.shape[1], i:i + tile.shape[0]] = tile.T
+    matrix.flush()
+    del matrix
+    return np.memmap(filepath, dtype=np.float32, mode='r', shape=(n, n))
+
+
+def top_k_similar(values, k=10, method='pearson', tile_columns=TILE_COLUMNS, ids=None):
+    """
+    k most similar profiles of every UEU, without building the full similarity matrix.
+
+    Every block of rows is compared with all columns tile by tile and only the k best
+    candidates of each row are kept between tiles. The UEU itself is excluded.
+
+    Parameters:
+        values (np.ndarray or pd.DataFrame): Profile matrix (time x UEU).
+        k (int): Number of neighbours.
+        method (str): One of METHODS.
+        ids (array-like, optional): Id of every column, the column names of a DataFrame if None.
+
+    Returns:
+        tuple: (neighbours, scores), arrays (UEU x k) sorted from most to least similar.
+        neighbours are column positions, or DataFrames of ids and scores if ids are known.
+    """
+    if ids is None and isinstance(values, pd.DataFrame):
+        ids = values.columns
+    standardized = standardize(values, method)
+    n = standardized.shape[1]
+    k = min(k, n - 1)
+
+    neighbours = np.empty((n, k), dtype=np.int64)
+    scores = np.empty((n, k), dtype=np.float32)
+    for i in range(0, n, tile_columns):
+        left = standardized[:, i:i + tile_columns]
+        rows = np.arange(i, i + left.shape[1])
+        best_scores = np.full((len(rows), 0), -np.inf, dtype=np.float32)
+        best_columns = np.empty((len(rows), 0), dtype=np.int64)
+        for j in range(0, n, tile_columns):
+            tile = np.nan_to_num(left.T @ standardized[:, j:j + tile_columns], nan=-np.inf)
+            columns = np.arange(j, j + tile.shape[1])
+            tile[rows[:, None] == columns[None, :]] = -np.inf
+
+            candidates = np.concatenate([best_scores, tile], axis=1)
+            candidate_columns = np.concatenate([best_columns, np.broadcast_to(columns, tile.shape)], axis=1)
+            if candidates.shape[1] > k:
+                keep = np.argpartition(-candidates, k - 1, axis=1)[:, :k]
+                candidates = np.take_along_axis(candidates, keep, axis=1)
+                candidate_columns = np.take_along_axis(candidate_columns, keep, axis=1)
+            best_scores, best_columns = candidates, candidate_columns
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        scores[rows] = np.take_along_axis(best_scores, order, axis=1)
+        neighbours[rows] = np.take_along_axis(best_columns, order, axis=1)
+
+    scores[np.isinf(scores)] = np.nan
+    if ids is None:
+        return neighbours, scores
+    ids = np.asarray(ids)
+    return pd.DataFrame(ids[neighbours], index=ids), pd.DataFrame(scores, index=ids)
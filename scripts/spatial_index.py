@@ -0,0 +1,115 @@
+# Spatial index for UEU and building lookups
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.strtree import STRtree
+
+
+class UEUSpatialIndex:
+    """
+    STRtree-backed index over UEU polygons and (optionally) building footprints.
+
+    The buildings are assigned to the UEUs once when the index is built, so "which
+    buildings are in UEU X" is a dictionary lookup. Every result carries the position
+    of the UEU or building in the profile matrix ('column', -1 if it has no profile).
+
+    Parameters:
+        ueus (gpd.GeoDataFrame): UEU polygons with an id column.
+        buildings (gpd.GeoDataFrame, optional): Building footprints with an id column.
+        ueu_profiles (pd.DataFrame, optional): Sidecar table of the UEU profile store
+            (see profile_store.open_profile_store) with the id and 'column' columns.
+        building_profiles (pd.DataFrame, optional): Sidecar table of a building profile store.
+        key (str): Id column of the UEUs.
+        building_key (str): Id column of the buildings.
+    """
+
+    def __init__(self, ueus, buildings=None, ueu_profiles=None, building_profiles=None,
+                 key='unique_identifier', building_key='unique_identifier'):
+        self.key = key
+        self.building_key = building_key
+
+        self.ueu_ids = ueus[key].to_numpy()
+        self.ueu_geometries = ueus.geometry.to_numpy()
+        self.ueu_tree = STRtree(self.ueu_geometries)
+        self.ueu_columns = _profile_columns(self.ueu_ids, ueu_profiles, key)
+        self._ueu_positions = pd.Index(self.ueu_ids)
+
+        self.building_ids = None
+        self.building_columns = None
+        self._buildings_per_ueu = {}
+        if buildings is not None:
+            self.building_ids = buildings[building_key].to_numpy()
+            self.building_columns = _profile_columns(self.building_ids, building_profiles, building_key)
+
+            # Assign every building to the UEU containing its representative point
+            points = shapely.point_on_surface(buildings.geometry.to_numpy())
+            building_pos, ueu_pos = self.ueu_tree.query(points, predicate='within')
+            order = np.argsort(ueu_pos, kind='stable')
+            building_pos, ueu_pos = building_pos[order], ueu_pos[order]
+            splits = np.flatnonzero(np.diff(ueu_pos)) + 1
+            for ueu_group, building_group in zip(np.split(ueu_pos, splits), np.split(building_pos, splits)):
+                if len(ueu_group):
+                    self._buildings_per_ueu[self.ueu_ids[ueu_group[0]]] = building_group
+
+    def _ueu_result(self, positions):
+        positions = np.asarray(positions, dtype=np.intp)
+        return pd.DataFrame({self.key: self.ueu_ids[positions], 'column': self.ueu_columns[positions]})
+
+    def buildings_in(self, ueu_id):
+        """Buildings located in a UEU, with their profile column."""
+        if self.building_ids is None:
+            raise ValueError("The index was built without buildings.")
+        positions = self._buildings_per_ueu.get(ueu_id, np.empty(0, dtype=np.intp))
+        return pd.DataFrame({self.building_key: self.building_ids[positions],
+                             'column': self.building_columns[positions]})
+
+    def ueus_in(self, geometry, predicate='intersects'):
+        """
+        UEUs that intersect a polygon or a bounding box.
+
+        Parameters:
+            geometry: A shapely geometry or a (minx, miny, maxx, maxy) tuple.
+            predicate (str): Spatial predicate, e.g. 'intersects', 'within' or 'contains'.
+        """
+        if isinstance(geometry, (tuple, list)):
+            geometry = shapely.box(*geometry)
+        positions = self.ueu_tree.query(geometry, predicate=predicate)
+        return self._ueu_result(np.sort(positions))
+
+    def nearest_ueu(self, point, max_distance=None):
+        """Nearest UEU to a point (a shapely Point or an (x, y) tuple)."""
+        if isinstance(point, (tuple, list)):
+            point = shapely.Point(point)
+        positions = self.ueu_tree.query_nearest(point, max_distance=max_distance)
+        return self._ueu_result(positions[:1])
+
+    def ueu_of(self, ueu_id):
+        """Geometry and profile column of a UEU."""
+        position = self._ueu_positions.get_loc(ueu_id)
+        return self.ueu_geometries[position], self.ueu_columns[position]
+
+
+def _profile_columns(ids, profiles, key):
+    # Position of every id in the profile matrix, -1 when the id has no profile
+    if profiles is None:
+        return np.full(len(ids), -1, dtype=np.int64)
+    lookup = pd.Series(profiles['column'].to_numpy(), index=profiles[key].to_numpy())
+    return lookup.reindex(ids).fillna(-1).to_numpy(dtype=np.int64)
+
+
+def build_spatial_index(ueus, buildings=None, store_path=None, building_store_path=None,
+                        key='unique_identifier', building_key='unique_identifier'):
+    """
+    Build a UEUSpatialIndex linked to the profile stores.
+
+    Parameters:
+        ueus (gpd.GeoDataFrame): UEU polygons, e.g. read.read_ueu_gpkg(..., geometry=True).
+        buildings (gpd.GeoDataFrame, optional): Building footprints.
+        store_path (str, optional): Profile store of the UEU profiles.
+        building_store_path (str, optional): Profile store of the building profiles.
+    """
+    from scripts.profile_store import open_profile_store
+
+    ueu_profiles = open_profile_store(store_path)[1] if store_path else None
+    building_profiles = open_profile_store(building_store_path)[1] if building_store_path else None
+    return UEUSpatialIndex(ueus, buildings, ueu_profiles, building_profiles, key, building_key)
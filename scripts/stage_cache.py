@@ -0,0 +1,122 @@
+# Content-addressed cache for the intermediate pipeline stages
+import os
+import json
+import pickle
+import hashlib
+from scripts.global_variables import cache_path
+
+# Hashes of the input files, reused while the file size and modification time don't change
+_file_hashes = {}
+
+
+def file_hash(filepath, chunk_size=1 << 20):
+    """
+    Hash of the content of an input file (or of every file in a folder, e.g. a profile store).
+    """
+    if os.path.isdir(filepath):
+        h = hashlib.blake2b(digest_size=16)
+        for name in sorted(os.listdir(filepath)):
+            h.update(name.encode())
+            h.update(file_hash(os.path.join(filepath, name)).encode())
+        return h.hexdigest()
+
+    stat = os.stat(filepath)
+    memo_key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        h = hashlib.blake2b(digest_size=16)
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+        _file_hashes[memo_key] = h.hexdigest()
+    return _file_hashes[memo_key]
+
+
+class StageCache:
+    """
+    Size-bounded cache of the intermediate frames of the pipeline.
+
+    An entry is keyed by a hash of the stage name, its parameters, the content of its
+    input files and the keys of its upstream stages. Changing an input file therefore
+    changes the key of every stage that depends on it, while the other stages are still
+    found in the cache. Entries are pickled (protocol 5, numpy buffers are written as raw
+    bytes) and the least recently used ones are evicted once max_bytes is exceeded.
+
+    Parameters:
+        cache_dir (str, optional): Folder of the cache. Defaults to <cache>/stages.
+        max_bytes (int): Size limit of the cache folder.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir or os.path.join(cache_path, 'stages')
+        self.max_bytes = max_bytes
+
+    def key(self, stage, inputs=(), params=None, upstream=()):
+        """Cache key of a stage run."""
+        description = {'stage': stage,
+                       'inputs': [file_hash(path) for path in inputs],
+                       'params': params,
+                       'upstream': list(upstream)}
+        text = json.dumps(description, sort_keys=True, default=str)
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def load(self, key):
+        """Returns (True, value) on a hit and (False, None) on a miss."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return False, None
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+        # Mark the entry as recently used
+        os.utime(path)
+        return True, value
+
+    def save(self, key, value):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        path = self._path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=5)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        # The most recent entry is always kept, even if it alone exceeds the limit
+        for _, size, name in sorted(entries)[:-1]:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def run(self, stage, func, *args, inputs=(), params=None, upstream=(), **kwargs):
+        """
+        Run a stage through the cache.
+
+        func(*args, **kwargs) is only called on a miss. The parameters that change the
+        result have to be given in params (the frames passed in args are represented by
+        the keys of the stages that produced them, given in upstream).
+
+        Returns:
+            tuple: (value, key). Pass the key as upstream of the following stages.
+        """
+        key = self.key(stage, inputs, params, upstream)
+        hit, value = self.load(key)
+        if not hit:
+            value = func(*args, **kwargs)
+            self.save(key, value)
+        return value, key
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.cache_dir, name))
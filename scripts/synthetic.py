@@ -0,0 +1,93 @@
+# Deterministic synthetic residential load profiles for benchmarks and examples
+import numpy as np
+import pandas as pd
+from scripts.profile_store import create_profile_store
+
+# Relative demand level of every synthetic UEU class
+CLASS_LEVELS = {'UEU1': 1.0, 'UEU2': 1.3, 'UEU3': 0.8, 'UEU4': 1.1, 'UEU5': 0.9, 'UEU7': 1.5, 'UEU8': 0.7, 'UEU9': 1.2}
+
+# Columns generated at a time
+BLOCK_COLUMNS = 5000
+
+
+def _daily_shape(hours):
+    # Residential day: low at night, morning peak around 7:00 and evening peak around 19:30
+    return (0.35 + 0.45 * np.exp(-0.5 * ((hours - 7.0) / 1.2) ** 2)
+            + 0.9 * np.exp(-0.5 * ((hours - 19.5) / 2.0) ** 2) + 0.15 * np.exp(-0.5 * ((hours - 13.0) / 2.5) ** 2))
+
+
+def synthetic_ueus(n_columns, seed=0, classes=None):
+    """UEU table (unique_identifier, UEU, area_ha) of n_columns synthetic units."""
+    rng = np.random.default_rng([seed, 0])
+    classes = list(CLASS_LEVELS) if classes is None else list(classes)
+    return pd.DataFrame({'unique_identifier': [f'SYN{i:07d}' for i in range(n_columns)],
+                         'UEU': np.asarray(classes)[rng.integers(0, len(classes), n_columns)],
+                         'area_ha': rng.lognormal(0.0, 0.6, n_columns).round(4)})
+
+
+def synthetic_block(index, ueus, seed=0, block=0):
+    """
+    Profiles (time x UEU) of the rows of ueus, as float32.
+
+    Every profile is its class level x area x a daily shape shifted by up to an hour (in
+    quarter hours), a winter peak, lower weekday daytime demand and lognormal noise. The
+    result only depends on seed and block, so the same matrix is produced every run.
+    """
+    rng = np.random.default_rng([seed, 1, block])
+    n = len(ueus)
+    hours = (index.hour + index.minute / 60).to_numpy()[:, None]
+    day_of_year = index.dayofyear.to_numpy()[:, None]
+    weekend = np.asarray(index.dayofweek >= 5)[:, None]
+
+    # The few shifted shapes are computed once and gathered per column
+    shifts = np.linspace(-1, 1, 9)
+    shapes = _daily_shape(hours - shifts)
+    shapes *= 1 + 0.35 * np.cos(2 * np.pi * (day_of_year - 15) / 365)
+    shapes *= np.where(weekend, 1.1, 1 - 0.15 * np.exp(-0.5 * ((hours - 12) / 3) ** 2))
+    profile = shapes.astype(np.float32)[:, rng.integers(0, len(shifts), n)]
+
+    noise = rng.standard_normal((len(index), n), dtype=np.float32)
+    noise *= np.float32(0.25)
+    profile *= np.exp(noise, out=noise)
+
+    levels = ueus['UEU'].map(CLASS_LEVELS).fillna(1.0).to_numpy()
+    profile *= (levels * ueus['area_ha'].to_numpy() * 1000).astype(np.float32)
+    return profile
+
+
+def synthetic_profiles(n_columns, freq='h', year=2100, seed=0, classes=None):
+    """
+    Synthetic profile frame and UEU table, e.g. for benchmarks at realistic sizes.
+
+    Parameters:
+        n_columns (int): Number of UEUs.
+        freq (str): 'h' for 8760 hourly rows, 'min' for 525,600 minute rows, or any pandas frequency.
+        year (int): Year of the index (2100 as in the notebook, not a leap year).
+        seed (int): Seed of the generator.
+
+    Returns:
+        tuple: (profiles, ueus) with the profiles as a float32 DataFrame (time x unique_identifier).
+    """
+    index = pd.date_range(f'{year}-01-01', f'{year + 1}-01-01', freq=freq, inclusive='left')
+    ueus = synthetic_ueus(n_columns, seed, classes)
+    values = np.empty((len(index), n_columns), dtype=np.float32, order='F')
+    _fill(values, index, ueus, seed)
+    return pd.DataFrame(values, index=index, columns=ueus['unique_identifier'].to_numpy(), copy=False), ueus
+
+
+def _fill(matrix, index, ueus, seed, block_columns=BLOCK_COLUMNS):
+    # Same blocks in memory and on disk, so a store holds the same profiles as the frame
+    for block, start in enumerate(range(0, len(ueus), block_columns)):
+        rows = ueus.iloc[start:start + block_columns]
+        matrix[:, start:start + len(rows)] = synthetic_block(index, rows, seed, block)
+
+
+def synthetic_store(store_path, n_columns, freq='h', year=2100, seed=0, classes=None):
+    """Write a synthetic profile store block by block, for sizes that don't fit in memory (e.g. 500,000 UEUs)."""
+    index = pd.date_range(f'{year}-01-01', f'{year + 1}-01-01', freq=freq, inclusive='left')
+    ueus = synthetic_ueus(n_columns, seed, classes)
+    matrix = create_profile_store(ueus, store_path, index)
+    _fill(matrix, index, ueus, seed)
+    matrix.flush()
+    del matrix
+    return store_path
@@ -1,21 +1,36 @@
 # Tables
+import numpy as np
 import pandas as pd
-
+from scripts.profile_set import as_frame, as_frames
+from scripts.instrumentation import instrumented
+
+@instrumented
+def window_positions(index, start_date, end_date):
+    # Positions [start, end) of the rows between start_date and end_date (both included),
+    # found by binary search in the sorted index
+    if not index.is_monotonic_increasing:
+        positions = np.flatnonzero((index >= start_date) & (index <= end_date))
+        return (positions[0], positions[-1] + 1) if len(positions) else (0, 0)
+    start = index.searchsorted(pd.Timestamp(start_date), side='left')
+    end = index.searchsorted(pd.Timestamp(end_date), side='right')
+    return start, max(start, end)
+
+@instrumented
 def process_date_range(dataframes, labels, start_date, end_date):
+    dataframes, labels = as_frames(dataframes, labels)  # a UEUProfileSet gives one DataFrame per class
     min_results = []  # Store minimum value DataFrames
     max_results = []  # Store maximum value DataFrames
     mean_results = []  # Store mean value DataFrames
 
     for i, df in enumerate(dataframes):
-        # Calculate min, max, and mean values for each row in the input DataFrame
-        hourly_min = df.min(axis=1)
-        hourly_max = df.max(axis=1)
-        hourly_mean = df.mean(axis=1)
+        # Slice the date range first, so only the rows in it are reduced
+        start, end = window_positions(df.index, start_date, end_date)
+        df_range = df.iloc[start:end]
 
-        # Filter data by the specified date range for all dataframes
-        filtered_min = hourly_min[(hourly_min.index >= start_date) & (hourly_min.index <= end_date)]
-        filtered_max = hourly_max[(hourly_max.index >= start_date) & (hourly_max.index <= end_date)]
-        filtered_mean = hourly_mean[(hourly_mean.index >= start_date) & (hourly_mean.index <= end_date)]
+        # Calculate min, max, and mean values for each row in the date range
+        filtered_min = df_range.min(axis=1)
+        filtered_max = df_range.max(axis=1)
+        filtered_mean = df_range.mean(axis=1)
 
         # Create DataFrames for the indicator
         min_df = pd.DataFrame({f'{labels[i]}': filtered_min})
@@ -34,26 +49,26 @@ def process_date_range(dataframes, labels, start_date, end_date):
 
     return min_hourly_indicators, max_hourly_indicators, mean_hourly_indicators
 
+@instrumented
 def daily_indicators(df, df_name, date_ranges):
     
+    df = as_frame(df)
     df = df.apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
     df = df.loc[:, (df != 0).any(axis=0)]  # Drop columns with all zeros
     
-        # Calculate min, max, and mean values for each row in the input DataFrame
-    daily_min = df.min(axis=1)
-    daily_max = df.max(axis=1)
-    daily_mean = df.mean(axis=1)
-
     # Create empty DataFrames to store the results for each date range
     min_results = []
     max_results = []
     mean_results = []
 
     for start_date, end_date in date_ranges:
-        # Filter data by the current date range
-        filtered_min = daily_min[(daily_min.index >= start_date) & (daily_min.index <= end_date)]
-        filtered_max = daily_max[(daily_max.index >= start_date) & (daily_max.index <= end_date)]
-        filtered_mean = daily_mean[(daily_mean.index >= start_date) & (daily_mean.index <= end_date)]
+        # Slice the current date range and calculate min, max, and mean values for each row in it
+        start, end = window_positions(df.index, start_date, end_date)
+        df_range = df.iloc[start:end]
+
+        filtered_min = df_range.min(axis=1)
+        filtered_max = df_range.max(axis=1)
+        filtered_mean = df_range.mean(axis=1)
 
         # Create DataFrames for the current date range and indicator
         min_df = pd.DataFrame({'Min': filtered_min})
@@ -78,4 +93,88 @@ def daily_indicators(df, df_name, date_ranges):
     return min_daily_indicators, max_daily_indicators, mean_daily_indicators
 
 
-
+@instrumented
+def grouped_date_range(grouped, start_date, end_date, classes=None, labels=None):
+    # Same tables as process_date_range, read from the precomputed grouped statistics
+    # (see grouped_stats.grouped_statistics) instead of reducing every DataFrame again
+    min_hourly_indicators = grouped.frame('min', classes, labels)
+    max_hourly_indicators = grouped.frame('max', classes, labels)
+    mean_hourly_indicators = grouped.frame('mean', classes, labels)
+
+    # Filter data by the specified date range
+    start, end = window_positions(grouped.index, start_date, end_date)
+
+    return min_hourly_indicators.iloc[start:end], max_hourly_indicators.iloc[start:end], mean_hourly_indicators.iloc[start:end]
+
+@instrumented
+def calendar_windows(start_date, end_date, freq='D'):
+    # (start, end) of every day ('D'), week ('W'), month ('M') or meteorological season ('season')
+    # between start_date and end_date, e.g. calendar_windows('2100-01-01', '2100-12-31 23:00', 'W').
+    # The first and last windows are clipped to the dates, so the seasons of one calendar year
+    # are two partial winters (January-February and December) around spring, summer and autumn
+    offsets = {'D': 'D', 'W': 'W-MON', 'M': 'MS', 'season': 'QS-DEC'}
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
+
+    starts = pd.date_range(start_date.normalize(), end_date, freq=offsets[freq])
+    if len(starts) == 0 or starts[0] > start_date:
+        starts = starts.insert(0, start_date)
+    ends = list(starts[1:] - pd.Timedelta(1, 'ns')) + [end_date]
+    return list(zip(starts, ends))
+
+@instrumented
+def window_indicators(dataframes, labels, windows):
+    """
+    Min, max and mean of many date windows for many DataFrames in one call.
+
+    The hourly min, max and mean across the columns are calculated once over the rows
+    covered by the windows, and every window is then reduced with ufunc.reduceat.
+
+    Parameters:
+        dataframes (list): DataFrames (time x UEU) with a sorted DatetimeIndex, or a UEUProfileSet.
+        labels (list): Label of every DataFrame (the classes of a UEUProfileSet if None).
+        windows (list): (start_date, end_date) pairs, both included, e.g. from calendar_windows.
+
+    Returns:
+        pd.DataFrame: Tidy table with one row per label and window and the columns
+        'label', 'start', 'end', 'min', 'max' and 'mean' (mean of the hourly means).
+    """
+    dataframes, labels = as_frames(dataframes, labels)
+    # Through a DatetimeIndex, numpy would truncate the Timestamps to microseconds
+    starts = pd.DatetimeIndex([start for start, _ in windows]).to_numpy()
+    ends = pd.DatetimeIndex([end for _, end in windows]).to_numpy()
+    results = []
+
+    for df, label in zip(dataframes, labels):
+        first = df.index.searchsorted(starts.min(), side='left')
+        last = df.index.searchsorted(ends.max(), side='right')
+        df_range = df.iloc[first:last]
+
+        hourly = np.column_stack([df_range.min(axis=1), df_range.max(axis=1), df_range.mean(axis=1)])
+        # A trailing NaN row lets windows end at the last row
+        hourly = np.vstack([hourly, np.full((1, 3), np.nan)])
+
+        lo = df_range.index.searchsorted(starts, side='left')
+        hi = np.maximum(lo, df_range.index.searchsorted(ends, side='right'))
+        # reduceat over [lo0, hi0, lo1, hi1, ...] reduces every window at the even positions
+        bounds = np.column_stack([lo, hi]).ravel()
+
+        valid = ~np.isnan(hourly[:, 2])
+        sums = np.add.reduceat(np.where(valid, hourly[:, 2], 0), bounds)[::2]
+        counts = np.add.reduceat(valid.astype(np.float64), bounds)[::2]
+        window_min = np.fmin.reduceat(hourly[:, 0], bounds)[::2]
+        window_max = np.fmax.reduceat(hourly[:, 1], bounds)[::2]
+
+        # Empty windows (reduceat returns the element at lo)
+        empty = hi == lo
+        sums[empty] = 0
+        counts[empty] = 0
+        window_min[empty] = np.nan
+        window_max[empty] = np.nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            window_mean = sums / counts
+
+        results.append(pd.DataFrame({'label': label, 'start': starts, 'end': ends,
+                                     'min': window_min, 'max': window_max, 'mean': window_mean}))
+
+    return pd.concat(results, ignore_index=True)
@@ -0,0 +1,5 @@
+# The scripts are imported as in the notebook, from the root of the repository
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.chunked import process_store_chunked
+from scripts.grouped_stats import grouped_statistics
+from scripts.normalization import normalize_profiles
+from scripts.profile_store import write_profile_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Classes in contiguous runs, so blocks of a few columns hold only some of them
+    rng = np.random.default_rng(0)
+    labels = np.repeat(['UEU1', 'UEU2', 'UEU3', 'UEU10'], [5, 3, 6, 4])
+    index = pd.date_range('2100-01-01', periods=72, freq='h')
+    values = rng.random((len(index), len(labels))).astype(np.float32)
+    values[::5, 2] = np.nan
+    ueus = pd.DataFrame({'unique_identifier': [f'ID{i}' for i in range(len(labels))],
+                         'UEU': labels, 'area_ha': rng.uniform(0.5, 2, len(labels))})
+    profiles = pd.DataFrame(values, index=index, columns=ueus['unique_identifier'])
+    return write_profile_store(profiles, ueus, str(tmp_path / 'store')), profiles, ueus
+
+
+@pytest.mark.parametrize('columns', [1, 4, 7, 100])
+@pytest.mark.parametrize('normalize', [False, True])
+def test_matches_in_memory(store, columns, normalize):
+    store_path, profiles, ueus = store
+    values = profiles.to_numpy(dtype=np.float64)
+    if normalize:
+        values = normalize_profiles(values, area=ueus['area_ha'].to_numpy())
+    expected = grouped_statistics(values, ueus['UEU'], index=profiles.index)
+
+    result = process_store_chunked(store_path, columns=columns, normalize=normalize, resolutions=())
+    assert result['statistics'].classes == expected.classes
+    np.testing.assert_allclose(result['statistics'].values, expected.values, rtol=1e-10)
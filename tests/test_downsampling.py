@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from scripts.downsampling import minmax_indices, lttb_indices, band_indices
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    return np.cumsum(rng.standard_normal(100_000))
+
+
+def test_minmax_keeps_bucket_extremes(series):
+    positions = minmax_indices(series, 500)
+    assert len(positions) <= 2 * 500 + 2
+    assert positions[0] == 0 and positions[-1] == len(series) - 1
+    buckets = np.array_split(series, 500)
+    kept = series[positions]
+    assert kept.max() == series.max() and kept.min() == series.min()
+    edges = np.cumsum([0] + [len(b) for b in buckets])
+    for start, end in zip(edges[:-1], edges[1:]):
+        inside = positions[(positions >= start) & (positions < end)]
+        assert series[inside].max() == series[start:end].max()
+        assert series[inside].min() == series[start:end].min()
+
+
+def test_short_series_unchanged():
+    np.testing.assert_array_equal(minmax_indices(np.arange(10.0), 5), np.arange(10))
+
+
+def test_minmax_skips_nan(series):
+    series[:1000] = np.nan
+    positions = minmax_indices(series, 100)
+    assert np.nanmax(series[positions]) == np.nanmax(series)
+
+
+def test_lttb(series):
+    positions = lttb_indices(series, 1000)
+    assert len(positions) == 1000
+    assert (np.diff(positions) > 0).all()
+    assert positions[0] == 0 and positions[-1] == len(series) - 1
+
+
+def test_band_keeps_both_bounds(series):
+    lower, upper = series - 1, series + np.abs(series)
+    positions = band_indices(lower, upper, 300)
+    assert (np.diff(positions) > 0).all()
+    assert lower[positions].min() == lower.min() and upper[positions].max() == upper.max()
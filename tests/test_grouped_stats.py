@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.grouped_stats import grouped_statistics, STATS
+
+
+def _reference(values, labels, classes):
+    # Column-wise pandas statistics of every class, as in the notebook
+    df = pd.DataFrame(values)
+    expected = np.full((len(classes), len(STATS), values.shape[0]), np.nan)
+    for i, cls in enumerate(classes):
+        part = df.loc[:, labels == cls]
+        expected[i, STATS.index('count')] = part.count(axis=1)
+        expected[i, STATS.index('sum')] = part.sum(axis=1)
+        if part.shape[1]:
+            expected[i, STATS.index('min')] = part.min(axis=1)
+            expected[i, STATS.index('max')] = part.max(axis=1)
+            expected[i, STATS.index('mean')] = part.mean(axis=1)
+    return expected
+
+
+@pytest.fixture
+def profiles():
+    rng = np.random.default_rng(0)
+    labels = np.array(['UEU1', 'UEU10', 'UEU2', 'UEU1', 'UEU2', 'UEU10', 'UEU2'])
+    return rng.random((24, len(labels))), labels
+
+
+def test_matches_pandas(profiles):
+    values, labels = profiles
+    grouped = grouped_statistics(values, labels)
+    assert grouped.classes == ['UEU1', 'UEU2', 'UEU10']
+    np.testing.assert_allclose(grouped.values, _reference(values, labels, grouped.classes))
+
+
+def test_skips_nan(profiles):
+    values, labels = profiles
+    values[::3, 0] = np.nan
+    values[:, 1] = np.nan
+    grouped = grouped_statistics(values, labels)
+    np.testing.assert_allclose(grouped.values, _reference(values, labels, grouped.classes))
+
+
+@pytest.mark.parametrize('classes', [
+    ['UEU1', 'UEU2', 'UEU10', 'UEU9'],          # missing last class
+    ['UEU9', 'UEU1', 'UEU2', 'UEU10'],          # missing first class
+    ['UEU1', 'UEU9', 'UEU2', 'UEU8', 'UEU10'],  # missing classes in between
+])
+def test_classes_without_columns(profiles, classes):
+    values, labels = profiles
+    grouped = grouped_statistics(values, labels, classes)
+    np.testing.assert_allclose(grouped.values, _reference(values, labels, classes))
+    for cls in ('UEU8', 'UEU9'):
+        if cls in classes:
+            assert np.isnan(grouped.series(cls, 'mean')).all()
+            assert (grouped.series(cls, 'count') == 0).all()
+
+
+def test_no_columns():
+    grouped = grouped_statistics(np.empty((5, 0)), np.array([], dtype=str), ['UEU1', 'UEU2'])
+    assert np.isnan(grouped.stat('min')).all()
+    assert (grouped.stat('count') == 0).all()
+
+
+def test_merge_equals_single_pass(profiles):
+    values, labels = profiles
+    classes = ['UEU1', 'UEU2', 'UEU10']
+    merged = grouped_statistics(values[:, :3], labels[:3], classes).merge(
+        grouped_statistics(values[:, 3:], labels[3:], classes))
+    np.testing.assert_allclose(merged.values, grouped_statistics(values, labels, classes).values)
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from scripts.ingest import read_minute_profiles, ingest_minute_files
+from scripts.profile_store import open_profile_store
+
+
+def write_minutes(folder, name, values, columns):
+    # Minute file as written by resLoadSIM (.dat) or exported (.csv), with the time in hours first
+    path = os.path.join(folder, name)
+    time = np.arange(len(values)) / 60
+    if name.endswith('.csv'):
+        df = pd.DataFrame(values, columns=columns)
+        df.insert(0, 'Time (h)', time)
+        df.to_csv(path, index=False)
+    else:
+        with open(path, 'w') as f:
+            f.write('Time (h)  ' + '  '.join(columns) + '\n')
+            for t, row in zip(time, values):
+                f.write(f'{t:.5f} ' + ' '.join(repr(float(v)) for v in row) + '\n')
+    return path
+
+
+@pytest.fixture
+def minutes():
+    return np.random.default_rng(0).random((3 * 60, 3)) * 100
+
+
+@pytest.mark.parametrize('name', ['a.dat', 'a.csv'])
+@pytest.mark.parametrize('chunk_rows', [100, 10_000])
+def test_read_minute_profiles(tmp_path, minutes, name, chunk_rows):
+    path = write_minutes(str(tmp_path), name, minutes, ['101', '102', '103'])
+    result = read_minute_profiles(path, stats=('energy', 'peak', 'min'), chunk_rows=chunk_rows)
+    blocks = minutes.reshape(3, 60, 3)
+    assert list(result['energy'].columns) == ['101', '102', '103']
+    assert result['energy'].index[1] == pd.Timestamp('2100-01-01 01:00')
+    np.testing.assert_allclose(result['energy'].to_numpy(), blocks.sum(axis=1) / 60)
+    np.testing.assert_allclose(result['peak'].to_numpy(), blocks.max(axis=1))
+    np.testing.assert_allclose(result['min'].to_numpy(), blocks.min(axis=1))
+
+
+def test_partial_interval(tmp_path, minutes):
+    path = write_minutes(str(tmp_path), 'a.dat', minutes[:150], ['101', '102', '103'])
+    with pytest.raises(ValueError):
+        read_minute_profiles(path)
+
+
+def test_ingest_minute_files(tmp_path, minutes):
+    paths = [write_minutes(str(tmp_path), 'a.dat', minutes[:, :2], ['101', '102']),
+             write_minutes(str(tmp_path), 'b.csv', minutes[:, 2:], ['103'])]
+    stores = ingest_minute_files(paths, str(tmp_path / 'store'), interval='15min', stats=('energy', 'peak'),
+                                 max_workers=1)
+    matrix, ueus, index = open_profile_store(stores['energy'])
+    assert list(ueus['unique_identifier']) == ['101', '102', '103']
+    assert len(index) == 12
+    np.testing.assert_allclose(matrix, minutes.reshape(12, 15, 3).sum(axis=1) / 60, rtol=1e-6)
+    peak, _, _ = open_profile_store(stores['peak'])
+    np.testing.assert_allclose(peak, minutes.reshape(12, 15, 3).max(axis=1), rtol=1e-6)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.normalization import normalize_profiles
+
+
+@pytest.fixture
+def profiles():
+    index = pd.date_range('2100-01-01', periods=48, freq='h')
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(rng.random((48, 4)) * 10, index=index, columns=['a', 'b', 'c', 'd'])
+
+
+def test_annual_share(profiles):
+    result = normalize_profiles(profiles, area=[1.0, 2.0, 0.5, 4.0])
+    np.testing.assert_allclose(result.sum(axis=0), 1.0)
+    # The share does not depend on the area
+    pd.testing.assert_frame_equal(result, profiles / profiles.sum(axis=0))
+    assert result.index.equals(profiles.index) and list(result.columns) == list(profiles.columns)
+
+
+@pytest.mark.parametrize('per, factor', [('ha', 1.0), ('m2', 10000.0)])
+def test_per_area(profiles, per, factor):
+    area = np.array([1.0, 2.0, 0.5, 4.0])
+    result = normalize_profiles(profiles, area=area, per=per, annual_share=False)
+    pd.testing.assert_frame_equal(result, profiles / (area * factor))
+
+
+def test_per_household(profiles):
+    households = np.array([3, 1, 12, 5])
+    result = normalize_profiles(profiles.to_numpy(), per='household', households=households, annual_share=False)
+    np.testing.assert_allclose(result, profiles.to_numpy() / households)
+
+
+def test_in_place(profiles):
+    expected = profiles / profiles.sum(axis=0)
+    result = normalize_profiles(profiles, copy=False, decimals=10)
+    assert result is profiles
+    pd.testing.assert_frame_equal(profiles, expected.round(10))
+
+
+def test_copy_leaves_input(profiles):
+    before = profiles.copy()
+    normalize_profiles(profiles, area=[1.0, 2.0, 0.5, 4.0])
+    pd.testing.assert_frame_equal(profiles, before)
+
+
+def test_errors(profiles):
+    with pytest.raises(ValueError):
+        normalize_profiles(profiles, per='acre')
+    with pytest.raises(ValueError):
+        normalize_profiles(profiles, area=[1.0, 2.0])
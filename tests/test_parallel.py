@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.parallel import SharedProfiles, map_column_blocks, column_blocks, map_classes
+from scripts.process_ueu_df import process_ueu
+from scripts.profile_set import UEUProfileSet
+from scripts.resampling_fn import resample_multi
+from scripts.synthetic import synthetic_profiles
+
+
+@pytest.fixture(scope='module')
+def profile_set():
+    df, ueus = synthetic_profiles(60, classes=['UEU1', 'UEU2', 'UEU3'])
+    return UEUProfileSet.from_frame(df, ueus['UEU'])
+
+
+def test_serial_results_outlive_the_shared_memory(profile_set):
+    # process_ueu returns its input, a view of the shared memory
+    result = map_classes(process_ueu, profile_set, max_workers=1)
+    for cls in profile_set.classes:
+        np.testing.assert_array_equal(result[cls].to_numpy(), profile_set.frame(cls).to_numpy())
+
+    heads = map_classes(lambda df: {'head': df.iloc[:10], 'first': df.iloc[:, 0]}, profile_set, max_workers=1)
+    np.testing.assert_array_equal(heads['UEU2']['head'].to_numpy(), profile_set.frame('UEU2').iloc[:10].to_numpy())
+    np.testing.assert_array_equal(heads['UEU2']['first'].to_numpy(), profile_set.frame('UEU2').iloc[:, 0].to_numpy())
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_map_classes_matches_direct(profile_set, max_workers):
+    result = map_classes(resample_multi, profile_set, max_workers=max_workers, resolutions=('D', 'M'), stats=('sum',))
+    assert list(result) == profile_set.classes
+    for cls in profile_set.classes:
+        expected = resample_multi(profile_set.frame(cls), ('D', 'M'), ('sum',))
+        for resolution in ('D', 'M'):
+            pd.testing.assert_frame_equal(result[cls][resolution]['sum'], expected[resolution]['sum'])
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_map_column_blocks_order(max_workers):
+    values = np.random.default_rng(0).random((48, 25))
+    with SharedProfiles(values) as shared:
+        sums = map_column_blocks(np.sum, shared, column_blocks(25, 4), as_frame=False, max_workers=max_workers, axis=0)
+    np.testing.assert_allclose(np.concatenate(sums), values.sum(axis=0))
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.percentiles import QuantileSketch, column_sketch, row_percentiles
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def _rank_errors(values, sketch):
+    # Distance between the rank of every sketch quantile and its target rank
+    n = (~np.isnan(values)).sum(axis=1)
+    return np.array([np.abs(np.nansum(values < sketch.quantile(q)[:, None], axis=1) / n - q) for q in QUANTILES])
+
+
+@pytest.mark.parametrize('ordered', [False, True])
+def test_rank_error_after_many_merges(ordered):
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(0, 1, (200, 4000))
+    if ordered:
+        values = np.sort(values, axis=1)
+    sketch = column_sketch(values, chunk_columns=20, size=200)  # 199 merges
+    np.testing.assert_allclose(sketch.count, values.shape[1])
+    errors = _rank_errors(values, sketch)
+    assert errors.mean() < 0.005
+    assert errors.max() < 0.03
+
+
+def test_size_stays_bounded():
+    values = np.random.default_rng(2).random((10, 20000))
+    sketch = column_sketch(values, chunk_columns=100, size=200)
+    assert sum(level.shape[1] for level in sketch.levels) <= 3 * 200
+
+
+def test_exact_below_size():
+    values = np.random.default_rng(3).random((50, 120))
+    sketch = QuantileSketch.from_block(values)
+    for q in QUANTILES:
+        np.testing.assert_allclose(sketch.quantile(q), np.percentile(values, q * 100, axis=1, method='hazen'))
+
+
+def test_nan_skipped():
+    values = np.random.default_rng(4).random((30, 1000))
+    values[:, ::4] = np.nan
+    values[0] = np.nan
+    sketch = column_sketch(values, chunk_columns=50)
+    assert np.isnan(sketch.quantile(0.5)[0])
+    np.testing.assert_allclose(sketch.count[1:], 750)
+    assert _rank_errors(values[1:], QuantileSketch([level[1:] for level in sketch.levels])).max() < 0.03
+
+
+def test_row_percentiles_wide_frame():
+    values = np.random.default_rng(5).random((24, 3000))
+    result = row_percentiles(pd.DataFrame(values), (5, 95))
+    exact = np.nanpercentile(values, (5, 95), axis=1).T
+    np.testing.assert_allclose(result.to_numpy(), exact, atol=0.03)
@@ -0,0 +1,96 @@
+import io
+import json
+import threading
+import http.client
+import numpy as np
+import pytest
+from http.server import ThreadingHTTPServer
+from scripts.profile_store import write_profile_store
+from scripts.profile_service import ProfileService, _handler
+from scripts.synthetic import synthetic_profiles
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    store_path = str(tmp_path_factory.mktemp('store'))
+    profiles, ueus = synthetic_profiles(12, classes=['UEU1', 'UEU2'])
+    write_profile_store(profiles, ueus, store_path)
+    service = ProfileService(store_path, cache_bytes=200_000)
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _handler(service))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, service, profiles, ueus
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(server, url):
+    connection = http.client.HTTPConnection(*server[0].server_address, timeout=10)
+    connection.request('GET', url)
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response.status, dict(response.getheaders()), body
+
+
+def test_profiles_json(server):
+    _, _, profiles, ueus = server
+    ids = list(ueus['unique_identifier'][:2])
+    status, _, body = get(server, f"/profiles?ids={','.join(ids)}&start=2100-01-02&end=2100-01-02T05:00")
+    assert status == 200
+    body = json.loads(body)
+    assert body['columns'] == ids
+    assert len(body['index']) == 6
+    np.testing.assert_allclose(body['data'], profiles.loc['2100-01-02':'2100-01-02 05:00', ids].to_numpy(), rtol=1e-6)
+
+
+def test_profiles_npy_of_class(server):
+    _, _, profiles, ueus = server
+    ids = list(ueus.loc[ueus['UEU'] == 'UEU1', 'unique_identifier'])
+    status, headers, body = get(server, '/profiles?cls=UEU1&resolution=D&format=npy')
+    assert status == 200
+    assert json.loads(headers['X-Columns']) == ids
+    assert headers['X-Index-Freq'] == 'D'
+    values = np.load(io.BytesIO(body))
+    np.testing.assert_allclose(values, profiles[ids].resample('D').sum().to_numpy(), rtol=1e-5)
+
+
+def test_statistics(server):
+    _, _, profiles, ueus = server
+    ids = list(ueus.loc[ueus['UEU'] == 'UEU2', 'unique_identifier'])
+    status, _, body = get(server, '/statistics?cls=UEU2&stat=max&end=2100-01-31T23:00')
+    assert status == 200
+    body = json.loads(body)
+    np.testing.assert_allclose(np.ravel(body['data']), profiles.loc[:'2100-01-31 23:00', ids].max(axis=1), rtol=1e-6)
+
+
+@pytest.mark.parametrize('url, status', [
+    ('/profiles?cls=UEU9', 404),
+    ('/statistics?cls=UEU9', 404),
+    ('/profiles?ids=nope', 404),
+    ('/unknown', 404),
+    ('/profiles?cls=UEU1&start=yesterday', 400),
+    ('/profiles?cls=UEU1&start=2100-02-01&end=2100-01-01', 400),
+    ('/statistics?cls=UEU1&start=2100-02-01&end=2100-01-01', 400),
+    ('/profiles?cls=UEU1&format=csv', 400),
+    ('/profiles?cls=UEU1&resolution=5min', 400),
+    ('/statistics?cls=UEU1&stat=median', 400),
+    ('/profiles', 400),
+])
+def test_errors(server, url, status):
+    code, _, body = get(server, url)
+    assert code == status
+    assert 'error' in json.loads(body)
+
+
+def test_cache_is_bounded_by_bytes(server):
+    _, service, _, ueus = server
+    for uid in ueus['unique_identifier']:
+        assert get(server, f'/profiles?ids={uid}&format=npy')[0] == 200
+    assert 0 < service._cached_bytes <= service.cache_bytes
+    assert service._cached_bytes == sum(len(body) for _, body, _ in service._cache.values())
+    assert len(service._cache) < len(ueus)
+    # Responses larger than the limit are served but not cached
+    status, _, body = get(server, '/profiles?cls=UEU1')
+    assert status == 200 and len(body) > service.cache_bytes
+    assert all(key[2] != 'UEU1' for key in service._cache)
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.profile_store import write_profile_store, open_profile_store, read_profiles, pickle_to_store
+from scripts.synthetic import synthetic_profiles
+
+
+@pytest.fixture
+def profiles():
+    return synthetic_profiles(20, classes=['UEU1', 'UEU2'])
+
+
+def test_round_trip(tmp_path, profiles):
+    df, ueus = profiles
+    write_profile_store(df, ueus, str(tmp_path))
+    matrix, sidecar, index = open_profile_store(str(tmp_path))
+    assert matrix.dtype == np.float32 and matrix.flags.f_contiguous
+    pd.testing.assert_index_equal(index, df.index, check_exact=True)
+    pd.testing.assert_frame_equal(sidecar.drop(columns='column'), ueus)
+    np.testing.assert_array_equal(matrix, df.to_numpy())
+    pd.testing.assert_frame_equal(read_profiles(str(tmp_path)), df, check_freq=False)
+
+
+def test_read_columns(tmp_path, profiles):
+    df, ueus = profiles
+    write_profile_store(df, ueus, str(tmp_path))
+    ids = list(ueus['unique_identifier'][[7, 2, 11]])
+    result = read_profiles(str(tmp_path), ids)
+    pd.testing.assert_frame_equal(result, df[ids], check_freq=False)
+    assert list(read_profiles(str(tmp_path), ids, label='UEU').columns) == list(ueus['UEU'][[7, 2, 11]])
+    with pytest.raises(KeyError):
+        read_profiles(str(tmp_path), ['missing'])
+
+
+def test_mismatched_ueus(tmp_path, profiles):
+    df, ueus = profiles
+    with pytest.raises(ValueError):
+        write_profile_store(df, ueus.iloc[1:], str(tmp_path))
+
+
+def test_pickle_to_store(tmp_path, profiles):
+    df, ueus = profiles
+    # Wide resLoadSIM pickle: a time column and one column per fid, in another order than the UEU table
+    fids = [str(100 + i) for i in range(len(ueus))]
+    wide = pd.DataFrame(df.to_numpy()[:, ::-1], columns=fids[::-1]).astype(np.float64)
+    wide.insert(0, 'Time (h)', np.arange(len(wide)))
+    wide.to_pickle(str(tmp_path / 'profiles.pkl'))
+
+    table = ueus.set_index(pd.Index(fids))
+    pickle_to_store(str(tmp_path / 'profiles.pkl'), table, str(tmp_path / 'store'), df.index)
+    result = read_profiles(str(tmp_path / 'store'))
+    pd.testing.assert_frame_equal(result[list(ueus['unique_identifier'])], df, check_freq=False)
+    assert list(open_profile_store(str(tmp_path / 'store'))[1]['fid'].astype(str)) == fids[::-1]
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.representative_periods import representative_periods
+
+
+def hourly(tz):
+    # Hour of the wall-clock day plus a small daily trend, so every day is different
+    index = pd.date_range('2023-01-01', '2024-01-01', freq='h', inclusive='left', tz=tz)
+    local = index.tz_localize(None) if tz else index
+    return pd.DataFrame({'a': local.hour + local.dayofyear * 0.01, 'b': np.cos(local.hour / 4.0) + 2}, index=index)
+
+
+@pytest.mark.parametrize('tz', [None, 'Europe/Berlin'])
+def test_every_day_its_own_representative(tz):
+    df = hourly(tz)
+    periods = representative_periods(df, k=365, extreme_peaks=0, scale_energy=False)
+    # Starts at the wall-clock midnights, also after the DST changes
+    assert periods.starts.equals(df.index[df.index.hour == 0].unique())
+    rebuilt = periods.reconstruct()
+    assert rebuilt.index.equals(df.index)
+    # The repeated hour of the autumn change is the mean of both
+    repeated = df.index.tz_localize(None).duplicated(keep=False) if tz else np.zeros(len(df), dtype=bool)
+    np.testing.assert_allclose(rebuilt.to_numpy()[~repeated], df.to_numpy()[~repeated])
+
+
+@pytest.mark.parametrize('tz', [None, 'Europe/Berlin'])
+def test_energy_is_kept(tz):
+    df = hourly(tz)
+    periods = representative_periods(df, k=6, extreme_peaks=2)
+    assert len(periods.starts) == 8 and periods.weights.sum() == 365
+    assert (periods.starts.hour == 0).all()
+    # On the DST index the day matrix averages the repeated hour and leaves the skipped one out
+    np.testing.assert_allclose(periods.error(df)['energy_error'], 0, atol=1e-9 if tz is None else 1e-3)
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.resampling_fn import resample_multi, RESOLUTIONS
+
+STATISTICS = ('sum', 'min', 'max', 'mean')
+
+
+@pytest.fixture(params=[None, 'Europe/Berlin'])
+def hourly(request):
+    index = pd.date_range('2100-01-01', '2101-01-01', freq='h', inclusive='left', tz=request.param)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.random((len(index), 4)), index=index, columns=['a', 'b', 'c', 'd'])
+    df.iloc[rng.integers(0, len(df), 300), 1] = np.nan
+    # Two missing weeks, a day of NaN in one column
+    df = df.drop(df.index[2000:2336])
+    df.loc['2100-05-05', 'c'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('resolution', list(RESOLUTIONS))
+def test_matches_pandas(hourly, resolution):
+    result = resample_multi(hourly, (resolution,), STATISTICS)[resolution]
+    for stat in STATISTICS:
+        expected = hourly.resample(RESOLUTIONS[resolution]).agg(stat)
+        pd.testing.assert_frame_equal(result[stat], expected, check_freq=False, rtol=1e-9)
+
+
+def test_drops_empty_columns(hourly):
+    hourly = hourly.assign(zeros=0.0, empty=np.nan)
+    result = resample_multi(hourly, ('D', 'M'), ('sum',))
+    assert list(result['M']['sum'].columns) == ['a', 'b', 'c', 'd']
@@ -0,0 +1,53 @@
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts import similarity
+from scripts.similarity import standardize, top_k_similar
+
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(0)
+    values = rng.random((200, 50)).astype(np.float32)
+    values[:, 7] = 3.0
+    return values
+
+
+@pytest.mark.parametrize('tile_columns', [16, similarity.TILE_COLUMNS])
+def test_pearson_matches_corrcoef(monkeypatch, values, tile_columns):
+    monkeypatch.setattr(similarity, 'TILE_COLUMNS', tile_columns)
+    standardized = standardize(pd.DataFrame(values))
+    assert standardized.dtype == np.float32 and standardized.flags.f_contiguous
+    assert np.isnan(standardized[:, 7]).all()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = np.corrcoef(values.astype(np.float64), rowvar=False)
+    np.testing.assert_allclose(standardized.T @ standardized, expected, atol=1e-5)
+
+
+def test_cosine(monkeypatch, values):
+    monkeypatch.setattr(similarity, 'TILE_COLUMNS', 16)
+    standardized = standardize(values, 'cosine')
+    unit = values / np.linalg.norm(values.astype(np.float64), axis=0)
+    np.testing.assert_allclose(standardized, unit, rtol=1e-6)
+
+
+def test_no_float64_copy():
+    values = np.ones((1000, 20000), dtype=np.float32)
+    tracemalloc.start()
+    standardize(values, 'cosine')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # The float32 result and one float64 block of columns
+    assert peak < values.nbytes + 1.1 * 1000 * similarity.TILE_COLUMNS * 8
+
+
+def test_top_k(values):
+    neighbours, scores = top_k_similar(values, k=3, tile_columns=16)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = np.corrcoef(values.astype(np.float64), rowvar=False)
+    np.fill_diagonal(expected, -np.inf)
+    expected = np.nan_to_num(expected, nan=-np.inf)
+    for row in (0, 20, 49):
+        np.testing.assert_array_equal(neighbours[row], np.argsort(-expected[row])[:3])
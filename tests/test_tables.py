@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.profile_set import UEUProfileSet
+from scripts.tables import calendar_windows, window_indicators
+
+
+def _brute_force(dataframes, labels, windows):
+    # Every window sliced and reduced on its own
+    rows = []
+    for df, label in zip(dataframes, labels):
+        for start, end in windows:
+            part = df.loc[pd.Timestamp(start):pd.Timestamp(end)]
+            rows.append({'label': label, 'start': pd.Timestamp(start), 'end': pd.Timestamp(end),
+                         'min': part.min(axis=1).min(), 'max': part.max(axis=1).max(),
+                         'mean': part.mean(axis=1).mean()})
+    return pd.DataFrame(rows)
+
+
+def assert_same(result, expected):
+    pd.testing.assert_frame_equal(result[['label', 'start', 'end']], expected[['label', 'start', 'end']],
+                                  check_exact=True)
+    pd.testing.assert_frame_equal(result[['min', 'max', 'mean']], expected[['min', 'max', 'mean']])
+
+
+@pytest.fixture
+def frames():
+    index = pd.date_range('2100-01-01', '2100-12-31 23:00', freq='h')
+    rng = np.random.default_rng(0)
+    a = pd.DataFrame(rng.random((len(index), 3)), index=index)
+    b = pd.DataFrame(rng.random((len(index), 2)), index=index)
+    b.iloc[rng.integers(0, len(b), 500), 0] = np.nan
+    b.loc['2100-03-03'] = np.nan
+    return [a, b], ['UEU1', 'UEU2']
+
+
+@pytest.mark.parametrize('freq', ['D', 'W', 'M', 'season'])
+def test_calendar_windows(frames, freq):
+    dataframes, labels = frames
+    windows = calendar_windows('2100-01-01', '2100-12-31 23:00', freq)
+    result = window_indicators(dataframes, labels, windows)
+    assert_same(result, _brute_force(dataframes, labels, windows))
+
+
+def test_overlapping_and_empty_windows(frames):
+    dataframes, labels = frames
+    windows = [('2100-06-01', '2100-06-30'), ('2100-06-15 12:00', '2100-07-02 03:00'), ('2100-03-03', '2100-03-03 23:00'),
+               ('2100-02-10', '2100-02-01'), ('2100-12-31 23:00', '2101-01-05'), ('2099-12-01', '2099-12-31')]
+    result = window_indicators(dataframes, labels, windows)
+    assert_same(result, _brute_force(dataframes, labels, windows))
+
+
+def test_profile_set(frames):
+    dataframes, _ = frames
+    df = pd.concat(dataframes, axis=1, ignore_index=True)
+    profiles = UEUProfileSet.from_frame(df, ['UEU1'] * 3 + ['UEU2'] * 2, dtype=np.float64)
+    windows = calendar_windows('2100-01-01', '2100-12-31 23:00', 'M')
+    assert_same(window_indicators(profiles, None, windows), _brute_force(dataframes, ['UEU1', 'UEU2'], windows))